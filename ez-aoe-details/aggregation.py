@@ -0,0 +1,443 @@
+import json
+import math
+import typing
+import numpy as np
+from player import Player, STATE_METRICS
+from units import MainType, FilterType, BuildingType, Technology
+from metrics import METRICS, SUMMED_METRICS
+
+STATISTICS = {'mean': np.nanmean, 'median': np.nanmedian, 'std': np.nanstd, 'min': np.nanmin, 'max': np.nanmax, 'sum': np.nansum}
+EAPM_BIN_WIDTH = 1 # resolution of the eAPM sketch
+RESEARCH_TIME_BIN_WIDTH = 10 # resolution of the research time sketches in seconds
+AGGREGATE_FORMAT_VERSION = 2 # increase whenever the serialised aggregates change
+STATE_KEYS = {str(key): key for key in (MainType.ECO, MainType.MIL, BuildingType.WALL)}
+
+class HistogramSketch():
+    """This class holds a mergeable histogram of values with a fixed bin width, which approximates percentiles in constant memory per bin. The error of a percentile is at most one bin width.
+    """
+    def __init__(self, bin_width: float):
+        self.bin_width = bin_width
+        self.count = 0
+        self.bins = {}
+
+    def add(self, value: float) -> None:
+        index = math.floor(value / self.bin_width)
+        self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+
+    def merge(self, other: 'HistogramSketch') -> None:
+        """Adds the values of another sketch
+
+        Args:
+            other (HistogramSketch): the other sketch, it has to have the same bin width
+        """
+        if other.bin_width != self.bin_width:
+            raise ValueError(f'cannot merge sketches with bin widths {self.bin_width} and {other.bin_width}')
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += other.count
+
+    def get_percentile(self, q: float) -> typing.Optional[float]:
+        """Approximates a percentile by interpolating linearly within its bin
+
+        Args:
+            q (float): the percentile between 0 and 100
+
+        Returns:
+            typing.Optional[float]: the approximated percentile or None if no value has been added
+        """
+        if self.count == 0:
+            return None
+        rank = q / 100 * self.count
+        cumulative_count = 0
+        for index in sorted(self.bins):
+            count = self.bins[index]
+            if cumulative_count + count >= rank:
+                return (index + (rank - cumulative_count) / count) * self.bin_width
+            cumulative_count += count
+        return (max(self.bins) + 1) * self.bin_width
+
+    def to_dict(self) -> typing.Dict[str, any]:
+        return {'bin_width': self.bin_width, 'count': self.count, 'bins': {str(index): count for index, count in sorted(self.bins.items())}}
+
+    def load_dict(self, values: typing.Dict[str, any]) -> None:
+        self.bin_width = values['bin_width']
+        self.count = values['count']
+        self.bins = {int(index): count for index, count in values['bins'].items()}
+
+class SkillLevelAggregate():
+    """This class holds the running sums and counts of all players of a skill level, i.e. the total eAPM, the summed up states for all timestamps, the total technology research times, the average action coordinates and the totals of additional metrics. The eAPM and the research times are also kept in a HistogramSketch to approximate their percentiles.
+    Players are folded in one by one, which allows releasing their replay right afterwards. The averages are only computed on request, i.e. aggregates of separate runs, shards or days can be merged and serialised, see merge(), to_dict() and write_aggregates().
+    """
+    def __init__(self, interval: typing.Optional[int] = None):
+        """Constructor
+
+        Args:
+            interval (typing.Optional[int], optional): the bucket interval of the player states which are summed up, see bucketing.BucketConfig. Defaults to None, i.e. the primary interval.
+        """
+        self.interval = interval
+        self.replay_count = 0
+        self.total_gameduration = 0
+        self.player_count = 0
+        self.total_eAPM = 0
+        self.timestamps = {}
+        self.technologies = {MainType.ECO: {}, MainType.MIL: {}}
+        self.action_move_coordinates = {'x': 0, 'y': 0}
+        self.action_unit_coordinates = {'x': 0, 'y': 0}
+        self.eAPM_sketch = HistogramSketch(EAPM_BIN_WIDTH)
+        self.technology_sketches = {MainType.ECO: {}, MainType.MIL: {}}
+        self.metric_totals = {} # totals of the additional metrics, see metrics.register_metric()
+
+    def add_gameduration(self, gameduration: int) -> None:
+        """Adds the game duration of a replay
+
+        Args:
+            gameduration (int): game duration in min
+        """
+        self.total_gameduration += gameduration
+        self.replay_count += 1
+
+    def add_player(self, player: Player) -> None:
+        """Adds the eAPM, the states for all timestamps, the technology research times and the average action coordinates of a player to the running sums
+
+        Args:
+            player (Player): the player, also accepts player.PlayerResult
+        """
+        self.player_count += 1
+        eAPM = player.get_average_eAPM()
+        self.total_eAPM += eAPM
+        self.eAPM_sketch.add(eAPM)
+        # sum up units, buildings and action coordinates for timestamps
+        for timestamp, values in player.get_state_for_timestamps(self.interval).items():
+            values_for_timestamp = self.timestamps.setdefault(timestamp, {
+                FilterType.UNITS: {MainType.ECO: 0, MainType.MIL: 0},
+                FilterType.BUILDINGS: {MainType.ECO: 0, MainType.MIL: 0, BuildingType.WALL: 0},
+                FilterType.ACTION_MOVE_COORDINATES: {'x': 0, 'y': 0, 'count': 0},
+                FilterType.ACTION_UNIT_COORDINATES: {'x': 0, 'y': 0, 'count': 0},
+                'count': 0})
+            for key, value in values.items():
+                for value_key in value.keys():
+                    values_for_timestamp[key][value_key] += value[value_key]
+            values_for_timestamp['count'] += 1
+        # sum up technology research times
+        for main_type, technologies in player.get_technologies().items():
+            technologies_for_type = self.technologies[main_type]
+            sketches_for_type = self.technology_sketches[main_type]
+            for technology, timestamp in technologies.items():
+                total_technology = technologies_for_type.setdefault(technology, {'timestamp': 0, 'count': 0})
+                total_technology['timestamp'] += timestamp
+                total_technology['count'] += 1
+                sketch = sketches_for_type.get(technology)
+                if sketch is None:
+                    sketch = sketches_for_type[technology] = HistogramSketch(RESEARCH_TIME_BIN_WIDTH)
+                sketch.add(timestamp)
+        # add coordinates
+        action_coordinates = player.get_average_move_action_coordinates()
+        self.action_move_coordinates['x'] += action_coordinates[0]
+        self.action_move_coordinates['y'] += action_coordinates[1]
+
+        action_unit_coordinates = player.get_average_unit_coordinates()
+        self.action_unit_coordinates['x'] += action_unit_coordinates[0]
+        self.action_unit_coordinates['y'] += action_unit_coordinates[1]
+        # add additional metrics
+        for name, value in player.get_metric_values().items():
+            self.metric_totals[name] = self.metric_totals.get(name, 0) + value
+
+    def merge(self, other: 'SkillLevelAggregate') -> None:
+        """Adds the running sums, counts and sketches of another aggregate, e.g. of another run or shard of the same skill level. Up to floating point rounding, the averages do not depend on how the players have been split up.
+
+        Args:
+            other (SkillLevelAggregate): the other aggregate, it has to be based on the same bucket interval
+        """
+        if other.interval != self.interval:
+            raise ValueError(f'cannot merge aggregates of the bucket intervals {self.interval} and {other.interval}')
+        self.replay_count += other.replay_count
+        self.total_gameduration += other.total_gameduration
+        self.player_count += other.player_count
+        self.total_eAPM += other.total_eAPM
+        self.eAPM_sketch.merge(other.eAPM_sketch)
+        for timestamp, values in other.timestamps.items():
+            values_for_timestamp = self.timestamps.get(timestamp)
+            if values_for_timestamp is None:
+                self.timestamps[timestamp] = {key: dict(value) if isinstance(value, dict) else value for key, value in values.items()}
+                continue
+            for key, value in values.items():
+                if isinstance(value, dict):
+                    for value_key in value.keys():
+                        values_for_timestamp[key][value_key] += value[value_key]
+            values_for_timestamp['count'] += values['count']
+        self.timestamps = dict(sorted(self.timestamps.items()))
+        for main_type, technologies in other.technologies.items():
+            for technology, values in technologies.items():
+                total_technology = self.technologies[main_type].setdefault(technology, {'timestamp': 0, 'count': 0})
+                total_technology['timestamp'] += values['timestamp']
+                total_technology['count'] += values['count']
+                self.technology_sketches[main_type].setdefault(technology, HistogramSketch(RESEARCH_TIME_BIN_WIDTH)).merge(other.technology_sketches[main_type][technology])
+        for key in ('x', 'y'):
+            self.action_move_coordinates[key] += other.action_move_coordinates[key]
+            self.action_unit_coordinates[key] += other.action_unit_coordinates[key]
+        for name, total in other.metric_totals.items():
+            self.metric_totals[name] = self.metric_totals.get(name, 0) + total
+
+    def to_dict(self) -> typing.Dict[str, any]:
+        """Serialises the aggregate into JSON compatible values, units and technologies are stored by name
+
+        Returns:
+            typing.Dict[str, any]: the serialised aggregate, see from_dict()
+        """
+        return {
+            'interval': self.interval,
+            'replay_count': self.replay_count,
+            'total_gameduration': self.total_gameduration,
+            'player_count': self.player_count,
+            'total_eAPM': self.total_eAPM,
+            'timestamps': {str(timestamp): {str(key): {str(value_key): entry for value_key, entry in value.items()} if isinstance(value, dict) else value for key, value in values.items()} for timestamp, values in self.timestamps.items()},
+            'technologies': {str(main_type): {str(technology): values for technology, values in technologies.items()} for main_type, technologies in self.technologies.items()},
+            'action_move_coordinates': self.action_move_coordinates,
+            'action_unit_coordinates': self.action_unit_coordinates,
+            'eAPM_sketch': self.eAPM_sketch.to_dict(),
+            'technology_sketches': {str(main_type): {str(technology): sketch.to_dict() for technology, sketch in sketches.items()} for main_type, sketches in self.technology_sketches.items()},
+            'metric_totals': self.metric_totals}
+
+    def get_average_gameduration(self) -> int:
+        return math.ceil(self.total_gameduration / self.replay_count)
+
+    def get_average_eAPM(self) -> float:
+        return self.total_eAPM / self.player_count
+
+    def get_average_action_move_coordinates(self) -> typing.Dict[str, float]:
+        return {'x': self.action_move_coordinates['x'] / self.player_count, 'y': self.action_move_coordinates['y'] / self.player_count}
+
+    def get_average_action_unit_coordinates(self) -> typing.Dict[str, float]:
+        return {'x': self.action_unit_coordinates['x'] / self.player_count, 'y': self.action_unit_coordinates['y'] / self.player_count}
+
+    def get_average_technologies(self) -> typing.Dict[MainType, typing.Dict[Technology, float]]:
+        """Gets the average research time of all technologies based on the number of players who have researched them
+
+        Returns:
+            typing.Dict[MainType, typing.Dict[Technology, float]]: average research times in seconds, e.g. {Economy: {Loom: 367.25, Feudal Age: 463.6}, Military: {}}
+        """
+        return {main_type: {technology: values['timestamp'] / values['count'] for technology, values in technologies.items()} for main_type, technologies in self.technologies.items()}
+
+    def get_average_metrics(self) -> typing.Dict[str, float]:
+        """Gets the additional metrics aggregated over all players, players without a value count as zero
+
+        Returns:
+            typing.Dict[str, float]: the mean or sum of every additional metric, see metrics.Metric
+        """
+        return {name: total / self.player_count if METRICS[name].aggregation == 'mean' else float(total) for name, total in self.metric_totals.items() if name in METRICS}
+
+    def get_eAPM_percentile(self, q: float) -> typing.Optional[float]:
+        return self.eAPM_sketch.get_percentile(q)
+
+    def get_technology_percentiles(self, q: float) -> typing.Dict[MainType, typing.Dict[Technology, float]]:
+        """Approximates a percentile of the research time of all technologies based on the players who have researched them, see HistogramSketch
+
+        Args:
+            q (float): the percentile between 0 and 100, e.g. 50 for the median
+
+        Returns:
+            typing.Dict[MainType, typing.Dict[Technology, float]]: research times in seconds, e.g. {Economy: {Loom: 365.0, Feudal Age: 460.5}, Military: {}}
+        """
+        return {main_type: {technology: sketch.get_percentile(q) for technology, sketch in sketches.items()} for main_type, sketches in self.technology_sketches.items()}
+
+    def get_average_timestamp_results(self) -> typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]:
+        """Gets the average units and buildings as well as the average action coordinates for all timestamps based on the number of players who reached the timestamp. The state columns of metrics with aggregation sum, i.e. the action counts, are not averaged.
+
+        Returns:
+            typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]: the average results for all timestamps, see visualisation.AoEGraphs
+        """
+        average_timestamp_results = {}
+        for timestamp, results in self.timestamps.items():
+            count = results['count']
+            average_results = {}
+            for index, (key, value_key) in enumerate(STATE_METRICS):
+                entry = results[key][value_key]
+                average_results.setdefault(key, {})[value_key] = entry if index in SUMMED_METRICS else entry / count
+            average_timestamp_results[timestamp] = average_results
+        return average_timestamp_results
+
+def from_dict(values: typing.Dict[str, any]) -> SkillLevelAggregate:
+    """Deserialises an aggregate
+
+    Args:
+        values (typing.Dict[str, any]): the serialised aggregate, see SkillLevelAggregate.to_dict()
+
+    Returns:
+        SkillLevelAggregate: the aggregate
+    """
+    aggregate = SkillLevelAggregate(values['interval'])
+    aggregate.replay_count = values['replay_count']
+    aggregate.total_gameduration = values['total_gameduration']
+    aggregate.player_count = values['player_count']
+    aggregate.total_eAPM = values['total_eAPM']
+    aggregate.timestamps = {int(timestamp): {key: {STATE_KEYS.get(value_key, value_key): entry for value_key, entry in value.items()} if isinstance(value, dict) else value for key, value in values_for_timestamp.items()} for timestamp, values_for_timestamp in values['timestamps'].items()}
+    main_types = {str(main_type): main_type for main_type in MainType}
+    aggregate.technologies = {main_types[main_type]: {Technology(technology): dict(technology_values) for technology, technology_values in technologies.items()} for main_type, technologies in values['technologies'].items()}
+    aggregate.action_move_coordinates = dict(values['action_move_coordinates'])
+    aggregate.action_unit_coordinates = dict(values['action_unit_coordinates'])
+    aggregate.eAPM_sketch.load_dict(values['eAPM_sketch'])
+    for main_type, sketches in values['technology_sketches'].items():
+        for technology, sketch_values in sketches.items():
+            sketch = HistogramSketch(RESEARCH_TIME_BIN_WIDTH)
+            sketch.load_dict(sketch_values)
+            aggregate.technology_sketches[main_types[main_type]][Technology(technology)] = sketch
+    aggregate.metric_totals = dict(values['metric_totals'])
+    return aggregate
+
+def write_aggregates(filename: str, aggregates: typing.Dict[str, SkillLevelAggregate], metadata: typing.Optional[typing.Dict[str, any]] = None) -> None:
+    """Writes the aggregates of all skill levels as JSON
+
+    Args:
+        filename (str): path of the JSON file
+        aggregates (typing.Dict[str, SkillLevelAggregate]): the aggregates mapped by skill level type
+        metadata (typing.Optional[typing.Dict[str, any]], optional): JSON compatible metadata of the run, e.g. the analyzer version. Defaults to None.
+    """
+    with open(filename, 'w', encoding='UTF8') as file:
+        json.dump({'version': AGGREGATE_FORMAT_VERSION, 'metadata': metadata or {}, 'aggregates': {type: aggregate.to_dict() for type, aggregate in aggregates.items()}}, file)
+
+def read_aggregates(filename: str) -> typing.Tuple[typing.Dict[str, SkillLevelAggregate], typing.Dict[str, any]]:
+    """Reads the aggregates written by write_aggregates()
+
+    Args:
+        filename (str): path of the JSON file
+
+    Returns:
+        typing.Tuple[typing.Dict[str, SkillLevelAggregate], typing.Dict[str, any]]: the aggregates mapped by skill level type and the metadata
+    """
+    with open(filename, encoding='UTF8') as file:
+        values = json.load(file)
+    if values.get('version') != AGGREGATE_FORMAT_VERSION:
+        raise ValueError(f'{filename} has aggregate format version {values.get("version")}, expected {AGGREGATE_FORMAT_VERSION}')
+    return {type: from_dict(aggregate) for type, aggregate in values['aggregates'].items()}, values['metadata']
+
+class PlayerStateMatrix():
+    """This class holds the states of all players of a skill level in a dense array of shape (players, timestamps, metrics), see STATE_METRICS. Timestamps a player has not reached, i.e. the game ended earlier, are NaN. The eAPM, the action coordinates and the technology research times are held in arrays of shape (players,) respectively (players, technologies), technologies a player has not researched are NaN as well.
+    All statistics are vectorised reductions over the player axis which ignore NaN, i.e. each timestamp and technology is based on the players who reached or researched it. The averages match SkillLevelAggregate, which is used instead when the players are not kept in memory.
+    """
+    def __init__(self, players: typing.Sequence[Player], interval: typing.Optional[int] = None):
+        """Constructor
+
+        Args:
+            players (typing.Sequence[Player]): the players, also accepts player.PlayerResult
+            interval (typing.Optional[int], optional): the bucket interval of the player states, see bucketing.BucketConfig. Defaults to None, i.e. the primary interval.
+        """
+        states_for_players = [player.get_bucket_states(interval).get_matrix() for player in players]
+        self.timestamps = sorted({timestamp for timestamps, _ in states_for_players for timestamp in timestamps})
+        timestamp_indices = {timestamp: index for index, timestamp in enumerate(self.timestamps)}
+        # fill all reached timestamps with a single assignment
+        player_indices = [player_index for player_index, (timestamps, _) in enumerate(states_for_players) for _ in timestamps]
+        rows = [timestamp_indices[timestamp] for timestamps, _ in states_for_players for timestamp in timestamps]
+        self.states = np.full((len(players), len(self.timestamps), len(STATE_METRICS)), np.nan)
+        if len(rows) > 0:
+            self.states[player_indices, rows] = np.concatenate([values for _, values in states_for_players])
+
+        self.eAPM = np.array([player.get_average_eAPM() for player in players], dtype=np.float64)
+        self.action_move_coordinates = np.array([player.get_average_move_action_coordinates() for player in players], dtype=np.float64).reshape(-1, 2)
+        self.action_unit_coordinates = np.array([player.get_average_unit_coordinates() for player in players], dtype=np.float64).reshape(-1, 2)
+        metric_names = dict.fromkeys(name for player in players for name in player.get_metric_values())
+        self.metric_values = {name: np.array([player.get_metric_values().get(name, 0) for player in players], dtype=np.float64) for name in metric_names}
+
+        technologies_for_players = [player.get_technologies() for player in players]
+        self.technologies = {}
+        self.technology_research_times = {}
+        for main_type in (MainType.ECO, MainType.MIL):
+            # technologies in order of their first research
+            technology_indices = {}
+            player_indices = []
+            columns = []
+            research_times = []
+            for player_index, technologies_for_player in enumerate(technologies_for_players):
+                for technology, research_time in technologies_for_player.get(main_type, {}).items():
+                    player_indices.append(player_index)
+                    columns.append(technology_indices.setdefault(technology, len(technology_indices)))
+                    research_times.append(research_time)
+            self.technologies[main_type] = list(technology_indices)
+            self.technology_research_times[main_type] = np.full((len(players), len(technology_indices)), np.nan)
+            self.technology_research_times[main_type][player_indices, columns] = research_times
+
+    def get_player_count(self) -> int:
+        return self.states.shape[0]
+
+    def get_average_eAPM(self) -> float:
+        return float(np.mean(self.eAPM))
+
+    def get_average_action_move_coordinates(self) -> typing.Dict[str, float]:
+        x, y = np.mean(self.action_move_coordinates, axis=0)
+        return {'x': float(x), 'y': float(y)}
+
+    def get_average_action_unit_coordinates(self) -> typing.Dict[str, float]:
+        x, y = np.mean(self.action_unit_coordinates, axis=0)
+        return {'x': float(x), 'y': float(y)}
+
+    def get_average_metrics(self) -> typing.Dict[str, float]:
+        return {name: float(np.mean(values) if METRICS[name].aggregation == 'mean' else np.sum(values)) for name, values in self.metric_values.items() if name in METRICS}
+
+    def get_average_technologies(self) -> typing.Dict[MainType, typing.Dict[Technology, float]]:
+        return self.get_technology_statistics('mean')
+
+    def get_technology_statistics(self, statistic: str = 'mean', q: typing.Optional[float] = None) -> typing.Dict[MainType, typing.Dict[Technology, float]]:
+        """Gets a statistic of the research time of all technologies based on the players who have researched them
+
+        Args:
+            statistic (str, optional): one of STATISTICS or 'percentile'. Defaults to 'mean'.
+            q (typing.Optional[float], optional): the percentile between 0 and 100, only used for statistic 'percentile'. Defaults to None.
+
+        Returns:
+            typing.Dict[MainType, typing.Dict[Technology, float]]: research times in seconds, e.g. {Economy: {Loom: 367.25, Feudal Age: 463.6}, Military: {}}
+        """
+        technology_statistics = {}
+        for main_type, technologies in self.technologies.items():
+            values = reduce_players(self.technology_research_times[main_type], statistic, q) if len(technologies) > 0 else []
+            technology_statistics[main_type] = {technology: float(value) for technology, value in zip(technologies, values)}
+        return technology_statistics
+
+    def get_average_timestamp_results(self) -> typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]:
+        """Gets the average units and buildings as well as the average action coordinates for all timestamps based on the number of players who reached the timestamp. The action counts are not averaged.
+
+        Returns:
+            typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]: the average results for all timestamps, see visualisation.AoEGraphs
+        """
+        values = reduce_players(self.states, 'mean')
+        values[:, SUMMED_METRICS] = reduce_players(self.states[:, :, SUMMED_METRICS], 'sum')
+        return self.create_timestamp_results(values, SUMMED_METRICS)
+
+    def get_timestamp_statistics(self, statistic: str = 'median', q: typing.Optional[float] = None) -> typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]:
+        """Gets a statistic of all metrics for all timestamps based on the players who reached the timestamp, e.g. the median number of villagers or the 90th percentile of the walls built
+
+        Args:
+            statistic (str, optional): one of STATISTICS or 'percentile'. Defaults to 'median'.
+            q (typing.Optional[float], optional): the percentile between 0 and 100, only used for statistic 'percentile'. Defaults to None.
+
+        Returns:
+            typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]: the statistic for all timestamps in the structure of get_average_timestamp_results(self)
+        """
+        return self.create_timestamp_results(reduce_players(self.states, statistic, q))
+
+    def create_timestamp_results(self, values: np.ndarray, integer_metrics: typing.Sequence[int] = ()) -> typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]:
+        timestamp_results = {}
+        for timestamp, values_for_timestamp in zip(self.timestamps, values.tolist()):
+            results = {}
+            for index, ((key, value_key), value) in enumerate(zip(STATE_METRICS, values_for_timestamp)):
+                results.setdefault(key, {})[value_key] = int(value) if index in integer_metrics else value
+            timestamp_results[timestamp] = results
+        return timestamp_results
+
+def reduce_players(values: np.ndarray, statistic: str, q: typing.Optional[float] = None) -> np.ndarray:
+    """Reduces an array over its first axis, i.e. the players, ignoring NaN
+
+    Args:
+        values (np.ndarray): array of shape (players, ...)
+        statistic (str): one of STATISTICS or 'percentile'
+        q (typing.Optional[float], optional): the percentile between 0 and 100, only used for statistic 'percentile'. Defaults to None.
+
+    Returns:
+        np.ndarray: the reduced array of shape (...)
+    """
+    if statistic == 'percentile':
+        if q is None:
+            raise ValueError('statistic percentile requires q')
+        return np.nanpercentile(values, q, axis=0)
+    if statistic not in STATISTICS:
+        raise ValueError(f'unknown statistic {statistic}, expected one of {", ".join(STATISTICS)} or percentile')
+    return STATISTICS[statistic](values, axis=0)
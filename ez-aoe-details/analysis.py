@@ -1,26 +1,116 @@
 import os
 import math
 import csv
+import mmap
 import time
+import signal
 import typing
+import threading
+import argparse
+import functools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from mgz import header, fast
 from mgz.summary.objects import TC_IDS
 from datetime import datetime
-from player import Player
+from player import Player, PlayerResult, NO_ACTION
+from cache import AnalysisCache, get_content_hash
+from store import ResultsStore
+from report import BulkReportWriter, REPORT_FORMATS
+from aggregation import SkillLevelAggregate, PlayerStateMatrix, write_aggregates, read_aggregates
+from bucketing import BucketConfig, BucketClock, DEFAULT_BUCKETS
+from replaytrace import TraceWriter, TraceReader, SYNC_RECORD
 from units import MainType, SkillLevel, FilterType, TECHNOLOGY_IDS, UNIT_IDS, BuildingType
-from visualisation import AoEGraphs
+from instrumentation import Instrumentation, write_report
+from journal import RunJournal
+from heatmap import Heatmap, create_player_heatmap, write_heatmaps, FRAMES
+from metrics import MOVEMENT_ACTIONS, METRICS, BUILTIN_METRICS, get_metrics
+
+ANALYZER_VERSION = 4 # increase whenever the analysis results change, cached results of other versions are ignored
+
+ID_KEYS = {fast.Action.DE_QUEUE: 'unit_id', fast.Action.RESEARCH: 'technology_id', fast.Action.BUILD: 'building_id', fast.Action.WALL: 'building_id'}
+ACTIONS = {action.value: action for action in fast.Action}
+ACTION_HANDLERS = {} # handlers registered by register_action_handler()
+
+def register_action_handler(action: fast.Action, handler: typing.Callable[['Analysis', int, typing.Dict[str, any], fast.Action], None]) -> None:
+    """Registers an additional handler for an action type, e.g. to collect additional data, selectable metrics are registered with metrics.register_metric(). The handler is called with the analysis, the player id, the details and the action type for every action of the type, after the built-in handler of the type (if any). Analyses created afterwards use the handler, also in worker processes as long as the registration happens at import time.
+    As for movement actions, the player id passed for other action types is the one of the last queue, research or build action, details['player_id'] holds the actual player id if the action has one. Trace files only keep the player id, the id and the coordinates of actions, i.e. analyses with registered handlers parse the replay file instead of loading trace files, see start().
+
+    Args:
+        action (fast.Action): the action type
+        handler (typing.Callable[[Analysis, int, typing.Dict[str, any], fast.Action], None]): the handler
+    """
+    ACTION_HANDLERS.setdefault(action, []).append(handler)
+
+def chain_action_handlers(handlers: list[typing.Callable[[int, typing.Dict[str, any], fast.Action], None]]) -> typing.Callable[[int, typing.Dict[str, any], fast.Action], None]:
+    def chained_handler(player_id: int, details: typing.Dict[str, any], action: fast.Action) -> None:
+        for handler in handlers:
+            handler(player_id, details, action)
+    return chained_handler
+
+def skip_action(player_id: int, details: typing.Dict[str, any], action: fast.Action) -> None:
+    pass # the action only attributes the following movement actions to its player
+
+def is_trace_up_to_date(trace_path: str, actions: list[int]) -> bool:
+    """Checks whether a trace file exists, has the current format and holds the given action types, see Analysis.start()
+
+    Args:
+        trace_path (str): path of the trace file
+        actions (list[int]): the dispatched action types, see Analysis.get_dispatched_actions()
+
+    Returns:
+        bool: True if the trace file can be loaded
+    """
+    if not os.path.exists(trace_path):
+        return False
+    try:
+        return TraceReader(trace_path).get_metadata().get('actions') == actions
+    except ValueError: # written by another version of TraceWriter
+        return False
+
+class AnalysisResult():
+    """This class holds the compact results of a parsed replay, i.e. the game time, the map dimensions and a player.PlayerResult for each player. It is returned by worker processes instead of the full Analysis, together with the instrumentation.Instrumentation of the analysis if it was instrumented.
+    """
+    def __init__(self, replayfile: str, time: int, map_dimensions: int, players: typing.Dict[int, PlayerResult], instrumentation: typing.Optional[Instrumentation] = None):
+        self.replayfile = replayfile
+        self.time = time
+        self.map_dimensions = map_dimensions
+        self.players = players
+        self.instrumentation = instrumentation
 
 class Analysis():
     """This class holds all the relevant information for a specific replay. It also contains instances of player.Player to hold player specific information. It relies on mgz.fast for parsing the replay file data.
     """
-    def __init__(self, replayfile: str):
+    def __init__(self, replayfile: str, buckets: BucketConfig = DEFAULT_BUCKETS, metrics: typing.Optional[typing.Sequence[str]] = None):
+        """Constructor
+
+        Args:
+            replayfile (str): path of the replay file
+            buckets (BucketConfig, optional): the time buckets the player states are calculated for. Defaults to DEFAULT_BUCKETS.
+            metrics (typing.Optional[typing.Sequence[str]], optional): names of the metrics which are recorded, see metrics.METRICS. Metrics which are not selected read as zero. Defaults to None, i.e. all metrics.
+        """
         self.replayfile = replayfile
+        self.buckets = buckets
+        self.metrics = get_metrics(metrics)
+        state_keys = {key for metric in self.metrics for key, _ in metric.state}
+        results = {metric.result for metric in self.metrics}
+        self.count_units = FilterType.UNITS in state_keys
+        self.count_buildings = FilterType.BUILDINGS in state_keys
+        self.record_technologies = FilterType.TECHNOLOGIES in results
+        self.count_eAPM = FilterType.EAPM in results
+        self.coordinate_actions = frozenset(action for metric in self.metrics for action in metric.coordinates)
+        self.create_heatmaps = any(metric.name == 'heatmap' for metric in self.metrics)
+        self.clock = BucketClock(buckets)
         self.time = 0
+        self.operation_count = 0
         self.players = {}
         self.summary_players = []
-        self.added_timestamps = []
         self.map_dimensions = 0
+        self.instrumentation = None
+        self.action_handlers = self.create_action_handlers()
+        self.traceable = len(ACTION_HANDLERS) == 0 and all(metric.handler is None for metric in self.metrics) # additional handlers may read details trace files do not hold
 
     def find_player(self, player_id: int) -> Player:
         """Finds a player given a specific id
@@ -33,14 +123,78 @@ class Analysis():
         """
         return self.players[player_id]
 
-    def start_analysis(self) -> None:
+    def create_action_handlers(self) -> typing.Dict[fast.Action, typing.Callable[[int, typing.Dict[str, any], fast.Action], None]]:
+        """Creates the dispatch table of the parse loop, which maps the relevant action types to their handler. Actions of all other types are skipped.
+        The built-in handlers only run for action types consumed by a selected metric. The other built-in action types are still dispatched, i.e. the attribution of movement actions and the trace files do not depend on the selected metrics.
+
+        Returns:
+            typing.Dict[fast.Action, typing.Callable[[int, typing.Dict[str, any], fast.Action], None]]: the built-in handlers, the handlers of the selected metrics and the handlers registered by register_action_handler(), called with the player id, the details and the action type
+        """
+        builtin_handlers = {fast.Action.DE_QUEUE: self.process_queue, fast.Action.RESEARCH: self.process_research, fast.Action.BUILD: self.process_building, fast.Action.WALL: self.process_building}
+        builtin_handlers.update((action, self.process_movement) for action in MOVEMENT_ACTIONS)
+        consumed_actions = {action for metric in self.metrics if metric.handler is None for action in metric.actions}
+        action_handlers = {action: handler if action in consumed_actions else skip_action for action, handler in builtin_handlers.items()}
+        additional_handlers = {}
+        [additional_handlers.setdefault(action, []).append(metric.handler) for metric in self.metrics if metric.handler is not None for action in metric.actions]
+        [additional_handlers.setdefault(action, []).extend(handlers) for action, handlers in ACTION_HANDLERS.items()]
+        for action, handlers in additional_handlers.items():
+            handlers = [functools.partial(handler, self) for handler in handlers]
+            if action_handlers.get(action, skip_action) is not skip_action:
+                handlers.insert(0, action_handlers[action])
+            action_handlers[action] = handlers[0] if len(handlers) == 1 else chain_action_handlers(handlers)
+        return action_handlers
+
+    def get_dispatched_actions(self) -> list[int]:
+        """Gets the action types the parse loop dispatches, which are the action types written to trace files
+
+        Returns:
+            list[int]: the sorted fast.Action values of the dispatch table
+        """
+        return sorted(action.value for action in self.action_handlers)
+
+    def set_instrumentation(self, instrumentation: Instrumentation) -> None:
+        """Enables the instrumentation of this analysis, i.e. operations and actions are counted and the header parsing, the decoding, the action handlers and the bucket computations are timed. Has to be called before the analysis is started.
+
+        Args:
+            instrumentation (Instrumentation): collects the counts and times
+        """
+        self.instrumentation = instrumentation
+        self.action_handlers = {action: instrumentation.time_section(f'handler.{action.name}', handler) for action, handler in self.action_handlers.items()}
+        self.calculate_states = instrumentation.time_section('bucket', self.calculate_states)
+
+    def start_analysis(self, trace_path: typing.Optional[str] = None) -> None:
         """This function invokes the analysis of the given replay data. The game data is iterated over and parsed accordingly.
+
+        Args:
+            trace_path (typing.Optional[str], optional): path of a trace file the relevant operations are written to, see replaytrace.TraceWriter. Defaults to None.
         """
         start = time.time()
         print("Parsing Data ...")
-        with open(self.replayfile, 'rb') as data:
+        trace = TraceWriter(trace_path) if trace_path is not None else None
+        read_operation = fast.operation if self.instrumentation is None else self.instrumentation.read_operation
+        try:
+            self.parse_replay(trace, read_operation)
+        except BaseException:
+            if trace is not None:
+                trace.discard() # a partial trace file must not be loaded later on
+            raise
+
+        if trace is not None:
+            trace.close()
+        self.finish_analysis()
+        print(f'Parsed file {self.replayfile} in {time.time() - start} seconds')
+
+    def parse_replay(self, trace: typing.Optional[TraceWriter], read_operation: typing.Callable[[typing.BinaryIO], typing.Tuple[fast.Operation, any]]) -> None:
+        """Parses the header and the game data of the replay file, see start_analysis(self, trace_path)
+
+        Args:
+            trace (typing.Optional[TraceWriter]): writer of the trace file or None
+            read_operation (typing.Callable[[typing.BinaryIO], typing.Tuple[fast.Operation, any]]): decodes the next operation, i.e. fast.operation or Instrumentation.read_operation
+        """
+        with map_replay(self.replayfile) as data:
             # parse game metadata
-            eof = os.fstat(data.fileno()).st_size
+            eof = len(data)
+            header_start = time.perf_counter()
             _header = header.parse_stream(data)
             self.map_dimensions = _header.map_info.size_x # map size
             for player in _header.initial.players:
@@ -49,51 +203,161 @@ class Analysis():
                     if player_id != obj.player_id:
                         player_id = obj.player_id
                     if obj.object_type in TC_IDS:
-                        self.players[player_id] = Player(player_id, (obj.x, obj.y))
+                        self.players[player_id] = Player(player_id, (obj.x, obj.y), self.buckets)
                 if player_id not in self.players and player_id > 0: # in case of nomad: starting position will be set later
-                    self.players[player_id] = Player(player_id)
+                    self.players[player_id] = Player(player_id, buckets=self.buckets)
             fast.meta(data)
+            if self.instrumentation is not None:
+                self.instrumentation.add_time('header', time.perf_counter() - header_start)
+            if trace is not None:
+                trace.write_header({'map_dimensions': self.map_dimensions, 'players': [[id, list(player.get_starting_position())] for id, player in self.players.items()], 'actions': self.get_dispatched_actions(), 'player_id': player_id})
 
             # parse game data
+            action_handlers = self.action_handlers
             while data.tell() < eof:
-                operation = fast.operation(data)
+                operation = read_operation(data)
+                self.operation_count += 1
                 if operation[0] == fast.Operation.ACTION:
-                    action = operation[1][0]
-                    details = operation[1][1]
-                    if action == fast.Action.DE_QUEUE:
-                        player_id = details['player_id']
-                        unit_id = details['unit_id']
-                        self.get_and_prepare_player(player_id, details).add_unit(unit_id)
-                    elif action == fast.Action.RESEARCH:
-                        player_id = details['player_id']
-                        technology_id = details['technology_id']
-                        seconds = math.floor((self.time / 1000))
-                        self.get_and_prepare_player(player_id, details).add_technology(technology_id, seconds)
-                    elif action == fast.Action.BUILD or action == fast.Action.WALL:
+                    action, details = operation[1]
+                    handler = action_handlers.get(action)
+                    if handler is None:
+                        continue
+                    if action in ID_KEYS:
                         player_id = details['player_id']
-                        building_id = details['building_id']
-                        player = self.get_and_prepare_player(player_id, details)
-                        if building_id in TC_IDS and player.get_starting_position() == (0, 0):
-                            player.set_starting_position((details['x'], details['y']))
-                        player.add_building(building_id)
-                    elif action == fast.Action.TOWN_BELL or action == fast.Action.PATROL or action == fast.Action.FORMATION or action == fast.Action.DE_ATTACK_MOVE or action == fast.Action.MOVE or action == fast.Action.ATTACK_GROUND:
-                        self.get_and_prepare_player(player_id, details, action)
+                    # movement actions are attributed to the player of the last queue, research or build action
+                    handler(player_id, details, action)
+                    if trace is not None: # the attribution of movement actions is repeated when the trace is loaded
+                        if 'x' in details and 'y' in details:
+                            trace.add_action(action.value, details.get('player_id', -1), details.get(ID_KEYS.get(action), -1), details['x'], details['y'])
+                        else:
+                            trace.add_action(action.value, details.get('player_id', -1), details.get(ID_KEYS.get(action), -1))
                 elif operation[0] == fast.Operation.SYNC:
-                    self.time += operation[1][0]
-                    minutes = math.floor((self.time / (1000 * 60)))
-                    # update player values every two min
-                    if minutes not in self.added_timestamps and minutes % 2 == 0:
-                        seconds = minutes * 60
-                        self.added_timestamps.append(minutes)
-                        [player.calculate_state_for_timestamp(seconds) for _, player in self.players.items()]
+                    self.process_sync(operation[1][0])
+                    if trace is not None:
+                        trace.add_sync(operation[1][0])
+
+    def start(self, trace_directory: typing.Optional[str] = None) -> None:
+        """Starts the analysis. If a trace directory is given, an up-to-date trace file of the replay is loaded instead of parsing the replay file. Otherwise, the trace file is written while parsing.
+        Trace files are named after the content hash of their replay file, i.e. replay files of the same name in different directories do not share a trace file and a changed replay file is parsed again. A trace file is only up-to-date if it holds the same action types as the dispatch table. Trace files only hold the player id, the id and the coordinates of an action, i.e. analyses with handlers registered by register_action_handler() or metrics with a handler always parse the replay file.
+
+        Args:
+            trace_directory (typing.Optional[str], optional): directory holding the trace files. Defaults to None, i.e. the replay file is parsed without trace.
+        """
+        if trace_directory is None or not self.traceable:
+            self.start_analysis()
+            return
+        trace_path = f'{trace_directory}/{get_content_hash(self.replayfile)}.trace'
+        if is_trace_up_to_date(trace_path, self.get_dispatched_actions()):
+            self.start_trace_analysis(trace_path)
+        else:
+            os.makedirs(trace_directory, exist_ok=True)
+            self.start_analysis(trace_path)
+
+    def start_trace_analysis(self, trace_path: str) -> None:
+        """This function invokes the analysis of the given replay based on a trace file written by start_analysis(self, trace_path). The replay file itself is not read.
+
+        Args:
+            trace_path (str): path of the trace file
+        """
+        start = time.time()
+        header_start = time.perf_counter()
+        trace = TraceReader(trace_path)
+        metadata = trace.get_metadata()
+        self.map_dimensions = metadata['map_dimensions']
+        for player_id, starting_position in metadata['players']:
+            self.players[player_id] = Player(player_id, tuple(starting_position), self.buckets)
+        if self.instrumentation is not None:
+            self.instrumentation.add_time('header', time.perf_counter() - header_start)
+
+        player_id = metadata['player_id']
+        for action, action_player_id, id, x, y in trace.iterate_records():
+            self.operation_count += 1
+            if action == SYNC_RECORD:
+                self.process_sync(id)
+                continue
+            action = ACTIONS[action]
+            details = {}
+            if action in ID_KEYS:
+                player_id = action_player_id # movement actions are attributed as in the parse loop
+                details[ID_KEYS[action]] = id
+            if action_player_id >= 0: # -1 if the action has no player id
+                details['player_id'] = action_player_id
+            if x == x: # NaN if the action has no coordinates
+                details['x'] = x
+                details['y'] = y
+            self.process_action(action, player_id, details)
+
+        self.finish_analysis()
+        print(f'Loaded trace {trace_path} in {time.time() - start} seconds')
+
+    def process_action(self, action: fast.Action, player_id: int, details: typing.Dict[str, any]) -> None:
+        """Dispatches an action to its handler, see create_action_handlers()
+
+        Args:
+            action (fast.Action): action type
+            player_id (int): id of the player the action is attributed to
+            details (typing.Dict[str, any]): details of replay step
+        """
+        handler = self.action_handlers.get(action)
+        if handler is not None:
+            handler(player_id, details, action)
+
+    def process_queue(self, player_id: int, details: typing.Dict[str, any], action: fast.Action) -> None:
+        player = self.get_and_prepare_player(player_id, details, action)
+        if self.count_units:
+            player.add_unit(details['unit_id'])
 
-            minutes = math.ceil((self.time / (1000 * 60)))
-            [player.set_gameduration(minutes) for player in self.players.values()]
+    def process_research(self, player_id: int, details: typing.Dict[str, any], action: fast.Action) -> None:
+        player = self.get_and_prepare_player(player_id, details, action)
+        if self.record_technologies:
+            player.add_technology(details['technology_id'], math.floor((self.time / 1000)))
+
+    def process_building(self, player_id: int, details: typing.Dict[str, any], action: fast.Action) -> None:
+        """Adds a build or wall action to its player, the first town center of a nomad player sets the starting position
+
+        Args:
+            player_id (int): id of the player the action is attributed to
+            details (typing.Dict[str, any]): details of replay step
+            action (fast.Action): action type
+        """
+        building_id = details['building_id']
+        player = self.get_and_prepare_player(player_id, details, action)
+        if building_id in TC_IDS and player.get_starting_position() == (0, 0):
+            player.set_starting_position((details['x'], details['y']))
+        if self.count_buildings:
+            player.add_building(building_id)
+
+    def process_movement(self, player_id: int, details: typing.Dict[str, any], action: fast.Action) -> None:
+        self.get_and_prepare_player(player_id, details, action)
+
+    def process_sync(self, increment: int) -> None:
+        """Advances the game time and calculates the player states whenever a bucket is reached, see bucketing.BucketClock
+
+        Args:
+            increment (int): time increment in ms
+        """
+        self.time += increment
+        bucket = self.clock.advance(self.time)
+        if bucket is not None:
+            self.calculate_states(*bucket)
+
+    def calculate_states(self, timestamp: int, intervals: list[int]) -> None:
+        """Calculates the states of all players for a bucket, see player.Player.calculate_state_for_timestamp()
+
+        Args:
+            timestamp (int): timestamp in seconds
+            intervals (list[int]): bucket intervals ending at the timestamp
+        """
+        [player.calculate_state_for_timestamp(timestamp, intervals) for player in self.players.values()]
 
-            print(f'Parsed file {self.replayfile} in {time.time() - start} seconds')
+    def finish_analysis(self) -> None:
+        minutes = math.ceil((self.time / (1000 * 60)))
+        [player.set_gameduration(minutes) for player in self.players.values()]
+        if self.create_heatmaps:
+            [player.set_heatmap(create_player_heatmap(player.get_actions(), self.map_dimensions, player.get_starting_position(), self.buckets.primary_interval)) for player in self.players.values()]
 
     def get_and_prepare_player(self, player_id: int, details: typing.Dict[str, any], action: fast.Action = -1) -> Player:
-        """Gets a player based on the id, increases the action count and adds an action given x and y coordinates are given.
+        """Gets a player based on the id, increases the action count and adds an action given x and y coordinates are given. Both only happen if a selected metric needs them, see metrics.Metric.
 
         Args:
             player_id (int): player id
@@ -104,15 +368,41 @@ class Analysis():
             Player: the player
         """
         player = self.find_player(player_id)
-        player.increase_eAPM()
-        if 'x' in details and 'y' in details:
+        if self.count_eAPM:
+            player.increase_eAPM()
+        if action in self.coordinate_actions and 'x' in details and 'y' in details:
             # calculate with starting position of player -> differrence -> final result: relative to map size -> %
-            player.add_action({'x': details['x'], 'y': details['y'], 'timestamp': self.get_gameduration() * 60, 'action': action})
+            player.add_action(details['x'], details['y'], self.buckets.get_slot_timestamp(self.time), action if action in MOVEMENT_ACTIONS else NO_ACTION)
         return player
 
     def get_players(self) -> typing.Dict[int, Player]:
         return self.players
+
+    def get_result(self) -> AnalysisResult:
+        """Creates the compact results of this analysis, see AnalysisResult.
+
+        Returns:
+            AnalysisResult: the analysis results
+        """
+        return AnalysisResult(self.replayfile, self.time, self.map_dimensions, {player_id: player.get_result() for player_id, player in self.players.items()})
+
+    def load_result(self, result: AnalysisResult) -> None:
+        """Loads the results of an analysis which has been run elsewhere, e.g. in a worker process. The players are replaced by their player.PlayerResult.
+
+        Args:
+            result (AnalysisResult): the analysis results
+        """
+        self.time = result.time
+        self.map_dimensions = result.map_dimensions
+        self.players = result.players
+        if result.instrumentation is not None:
+            self.instrumentation = result.instrumentation
     
+    def release_players(self) -> None:
+        """Releases all players including their recorded actions once their results have been processed
+        """
+        self.players = {}
+
     def get_map_dimensions(self) -> int:
         return self.map_dimensions
 
@@ -137,8 +427,11 @@ class Analysis():
                 header.append(entry)
         return header
 
-    def create_analysis_report(self) -> None:
+    def create_analysis_report(self, output_path: typing.Optional[str] = None) -> None:
         """Creates an analysis report aka CSV files containing technology research time, unit counts, villager timestamps and military unit timestamps.
+
+        Args:
+            output_path (typing.Optional[str], optional): directory the reports are written to. Defaults to None, i.e. the output directory next to this file.
         """
         header_units = self.create_header_with_types(UNIT_IDS)
         header_technologies = self.create_header_with_types(TECHNOLOGY_IDS)
@@ -174,8 +467,11 @@ class Analysis():
 
         folder_timestamp = datetime.now().strftime('%Y-%m-%d_%H_%M')
 
-        base_path = Path(__file__).parent
-        general_path = str((base_path / 'output').resolve())
+        if output_path is None:
+            base_path = Path(__file__).parent
+            general_path = str((base_path / 'output').resolve())
+        else:
+            general_path = output_path
         replayfile_name = os.path.basename(self.replayfile)
         file_path = general_path + f'/{folder_timestamp}/{replayfile_name}'
         os.makedirs(file_path, exist_ok=True)
@@ -209,129 +505,539 @@ class Analysis():
                 writer.writerow(header)
             writer.writerows(rows)
 
+@contextlib.contextmanager
+def map_replay(replayfile: str) -> typing.Iterator[mmap.mmap]:
+    """Memory-maps a replay file read-only. The map is used as the stream of header.parse_stream and fast.operation: reads are copied straight from the page cache without a read syscall per buffer refill, and tell() is a plain offset lookup.
+    The replay file must not be truncated while it is mapped, see watch.py for replay files which are still being written.
+
+    Args:
+        replayfile (str): path of the replay file
+
+    Yields:
+        mmap.mmap: the mapped replay file positioned at its start
+    """
+    with open(replayfile, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise EOFError(f'{replayfile} is empty') # an empty file cannot be mapped
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+class AnalysisTimeoutError(BaseException): # not an Exception, construct would wrap it into a parsing error
+    pass
+
+@contextlib.contextmanager
+def time_limit(seconds: typing.Optional[float]) -> typing.Iterator[None]:
+    """Raises an AnalysisTimeoutError in the enclosed block once it has run for the given number of seconds. The limit relies on SIGALRM, i.e. it is only applied in the main thread of a process on Unix.
+
+    Args:
+        seconds (typing.Optional[float]): the time limit, None for no limit
+    """
+    if seconds is None or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    def raise_timeout(signum, frame):
+        raise AnalysisTimeoutError(f'analysis exceeded the timeout of {seconds} seconds')
+    previous_handler = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+def run_analysis(replayfile: str, trace_directory: typing.Optional[str] = None, buckets: BucketConfig = DEFAULT_BUCKETS, instrument: bool = False, timeout: typing.Optional[float] = None, metrics: typing.Optional[typing.Sequence[str]] = None) -> AnalysisResult:
+    """Parses a single replay file and returns its compact results. Used as entry point for worker processes.
+
+    Args:
+        replayfile (str): path of the replay file
+        trace_directory (typing.Optional[str], optional): directory holding trace files, see Analysis.start_trace_analysis(self, trace_path). Defaults to None.
+        buckets (BucketConfig, optional): the time buckets the player states are calculated for. Defaults to DEFAULT_BUCKETS.
+        instrument (bool, optional): whether the analysis is instrumented, see Analysis.set_instrumentation(). Defaults to False.
+        timeout (typing.Optional[float], optional): maximum number of seconds the analysis may take, see time_limit(). Defaults to None.
+        metrics (typing.Optional[typing.Sequence[str]], optional): names of the recorded metrics, see metrics.METRICS. Defaults to None, i.e. all metrics.
+
+    Returns:
+        AnalysisResult: the analysis results
+    """
+    analysis = Analysis(replayfile, buckets, metrics)
+    if instrument:
+        analysis.set_instrumentation(Instrumentation())
+    with time_limit(timeout):
+        analysis.start(trace_directory)
+    result = analysis.get_result()
+    result.instrumentation = analysis.instrumentation
+    return result
+
 class MultipleAnalyses():
     """This class contains all Analysis instances segmented for each specific unit.SkillLevel. Additionally, it relies on visualisation.AoEGraphs to visualise the results, as well as on helper classes from units.* to not rely on hardcoded values.
     """
-    def __init__(self, paths_to_segmented_replayfiles: typing.Dict[SkillLevel, str]):
-        self.analyses = {k: [] for k in paths_to_segmented_replayfiles}
+    def __init__(self, paths_to_segmented_replayfiles: typing.Dict[SkillLevel, str], buckets: BucketConfig = DEFAULT_BUCKETS, metrics: typing.Optional[typing.Sequence[str]] = None):
+        """Constructor
+
+        Args:
+            paths_to_segmented_replayfiles (typing.Dict[SkillLevel, str]): directory of the replay files of every skill level
+            buckets (BucketConfig, optional): the time buckets the player states are calculated for. Defaults to DEFAULT_BUCKETS.
+            metrics (typing.Optional[typing.Sequence[str]], optional): names of the metrics which are recorded, averaged and visualised, see metrics.METRICS. Defaults to None, i.e. all metrics.
+        """
+        self.buckets = buckets
+        self.metrics = [metric.name for metric in get_metrics(metrics)]
+        replayfiles = {k: [] for k in paths_to_segmented_replayfiles}
 
         for type, path in paths_to_segmented_replayfiles.items():
             with os.scandir(path) as entries:
                 for entry in entries:
                     if entry.is_file():
-                        analysis = Analysis(f'{path}/{entry.name}')
-                        self.analyses[type].append(analysis)
+                        replayfiles[type].append(f'{path}/{entry.name}')
+        self.set_replayfiles(replayfiles)
+
+    def set_replayfiles(self, replayfiles: typing.Dict[SkillLevel, list[str]]) -> None:
+        """Replaces all analyses and results by analyses of the given replay files, e.g. of a shard of the corpus, see shard.py
+
+        Args:
+            replayfiles (typing.Dict[SkillLevel, list[str]]): paths of the replay files for each skill level
+        """
+        self.analyses = {type: [Analysis(replayfile, self.buckets, self.metrics) for replayfile in replayfiles_for_type] for type, replayfiles_for_type in replayfiles.items()}
         self.combined_analyses = []
         [self.combined_analyses.extend(analysis_list) for analysis_list in self.analyses.values()]
 
         self.results = {k: [] for k in self.analyses}
+        self.unknown_ids = {FilterType.UNITS: {}, FilterType.BUILDINGS: {}, FilterType.TECHNOLOGIES: {}}
+        self.streaming = False
+        self.aggregates = {type: SkillLevelAggregate() for type in self.analyses}
+        self.merged_aggregates = {}
+        self.failures = {}
+        self.heatmaps = {}
+        self.instrumentation = {}
+        self.state_matrices = {}
         self.average_timestamp_results = {k: {} for k in self.analyses}
-        self.average_results = {FilterType.EAPM: {}, FilterType.TECHNOLOGIES: {k: {MainType.ECO: {}, MainType.MIL: {}} for k in self.analyses}, FilterType.GAMEDURATION: {}, FilterType.ACTION_UNIT_COORDINATES: {k: {'x': 0, 'y': 0} for k in self.analyses}, FilterType.ACTION_MOVE_COORDINATES: {k: {'x': 0, 'y': 0} for k in self.analyses}}
+        self.average_results = {FilterType.EAPM: {}, FilterType.TECHNOLOGIES: {k: {MainType.ECO: {}, MainType.MIL: {}} for k in self.analyses}, FilterType.GAMEDURATION: {}, FilterType.ACTION_UNIT_COORDINATES: {k: {'x': 0, 'y': 0} for k in self.analyses}, FilterType.ACTION_MOVE_COORDINATES: {k: {'x': 0, 'y': 0} for k in self.analyses}, FilterType.METRICS: {}}
 
-    def start_analyses(self) -> None:
-        """Starts all game analyses, also invokes compute_average_results()
+    def start_analyses(self, workers: int = 1, cache: typing.Optional[AnalysisCache] = None, trace_directory: typing.Optional[str] = None, streaming: bool = False, instrument: bool = False, store: typing.Optional[ResultsStore] = None, report_writer: typing.Optional[BulkReportWriter] = None, timeout: typing.Optional[float] = None, journal: typing.Optional[RunJournal] = None) -> None:
+        """Starts all game analyses, also invokes compute_average_results(). Replay files which cannot be analysed are skipped and reported at the end, see run_analyses().
+
+        Args:
+            workers (int, optional): number of worker processes parsing the replay files. Defaults to 1, i.e. all replay files are parsed in the current process.
+            cache (typing.Optional[AnalysisCache], optional): cache holding the results of already parsed replay files, only new or changed replay files are parsed. Defaults to None.
+            trace_directory (typing.Optional[str], optional): directory holding the trace files of the replay files, see Analysis.start(self, trace_directory). Defaults to None.
+            streaming (bool, optional): whether the players of each replay are folded into the running sums of their skill level right after parsing. The players are released afterwards, i.e. peak memory does not depend on the number of replays, but create_analyses_report() is not available. Defaults to False.
+            instrument (bool, optional): whether the parsed replay files are instrumented, see get_run_instrumentation(). Results loaded from the cache are not instrumented. Defaults to False.
+            store (typing.Optional[ResultsStore], optional): results store the results of all analyses are written to. Defaults to None.
+            report_writer (typing.Optional[BulkReportWriter], optional): writer of the consolidated reports of all analyses, written in the same pass and also in streaming mode. Has to be closed by the caller. Defaults to None.
+            timeout (typing.Optional[float], optional): maximum number of seconds parsing a replay file may take. Defaults to None, i.e. no timeout.
+            journal (typing.Optional[RunJournal], optional): journal of the completed and failed replay files, which allows resuming an interrupted run. Has to be closed by the caller. Defaults to None.
         """
-        [analysis.start_analysis() for analysis in self.combined_analyses]
+        self.streaming = streaming
+        self.aggregates = {type: SkillLevelAggregate() for type in self.analyses}
+        types = {analysis: type for type, analyses_for_type in self.analyses.items() for analysis in analyses_for_type}
+        for analysis in self.run_analyses(self.combined_analyses, workers, cache, trace_directory, instrument, timeout, journal):
+            self.add_analysis(types[analysis], analysis, store, report_writer)
+        if store is not None:
+            store.flush()
+        self.report_failures()
+
         # calculate average game duration for skill level
-        for type, analyses_for_type in self.analyses.items():
-            total_gameduration = 0
-            for analysis in analyses_for_type:
-                total_gameduration += analysis.get_gameduration()
-                self.results[type].extend([player for player in analysis.get_players().values()])
-            average_gameduration = math.ceil(total_gameduration / len(analyses_for_type))
-            self.average_results['gameduration'][type] = average_gameduration
+        for type, aggregate in self.aggregates.items():
+            if aggregate.replay_count == 0:
+                print(f'No replay files analysed for Skill Level {type}')
+                continue
+            average_gameduration = aggregate.get_average_gameduration()
+            self.average_results[FilterType.GAMEDURATION][type] = average_gameduration
             print(f'Average Game Duration for Skill Level {type}: {average_gameduration} min')
-        self.compute_average_results()
-    
+        self.report_unknown_ids()
+        if streaming:
+            [self.set_average_results(type, aggregate) for type, aggregate in self.aggregates.items() if aggregate.replay_count > 0]
+        else:
+            self.compute_average_results()
+
+    def add_analysis(self, type: str, analysis: Analysis, store: typing.Optional[ResultsStore] = None, report_writer: typing.Optional[BulkReportWriter] = None) -> None:
+        """Adds the results of a finished analysis to the running sums of its skill level, in streaming mode its players are folded in and released afterwards. Call update_average_results() to refresh the averages.
+
+        Args:
+            type (str): skill level type
+            analysis (Analysis): the finished analysis
+            store (typing.Optional[ResultsStore], optional): results store the results are written to. Defaults to None.
+            report_writer (typing.Optional[BulkReportWriter], optional): writer of the consolidated reports. Defaults to None.
+        """
+        if analysis.instrumentation is not None:
+            self.instrumentation[analysis.replayfile] = analysis.instrumentation
+        if store is not None:
+            store.add_analysis(analysis, type, ANALYZER_VERSION)
+        if report_writer is not None:
+            report_writer.add_analysis(analysis)
+        self.aggregates[type].add_gameduration(analysis.get_gameduration())
+        players = analysis.get_players().values()
+        self.add_unknown_ids(players)
+        heatmap = self.heatmaps.setdefault(type, Heatmap(self.buckets.primary_interval))
+        [heatmap.add_player(player.get_heatmap()) for player in players if player.get_heatmap() is not None]
+        if self.streaming:
+            [self.aggregates[type].add_player(player) for player in players]
+            analysis.release_players()
+        else:
+            self.results[type].extend(players)
+
+    def update_average_results(self, types: typing.Iterable[str]) -> None:
+        """Refreshes the average game duration and the average results of the given types after analyses have been added, see add_analysis(). Types without replays are skipped.
+
+        Args:
+            types (typing.Iterable[str]): skill level types
+        """
+        for type in types:
+            if self.aggregates[type].replay_count == 0:
+                continue
+            self.average_results[FilterType.GAMEDURATION][type] = self.aggregates[type].get_average_gameduration()
+            if self.streaming:
+                self.set_average_results(type, self.aggregates[type])
+            else:
+                self.compute_average_results_for_type(type, self.results[type])
+
+    def get_aggregates(self) -> typing.Dict[str, SkillLevelAggregate]:
+        """Gets the running sums of all types including the merged running sums of other runs, see merge_aggregates(). Outside of streaming mode the players are folded in on request.
+
+        Returns:
+            typing.Dict[str, SkillLevelAggregate]: new aggregates mapped by skill level type
+        """
+        aggregates = {}
+        for type in dict.fromkeys([*self.aggregates, *self.merged_aggregates]):
+            aggregate = SkillLevelAggregate()
+            if type in self.aggregates:
+                if self.streaming:
+                    aggregate.merge(self.aggregates[type])
+                else:
+                    aggregate.replay_count = self.aggregates[type].replay_count
+                    aggregate.total_gameduration = self.aggregates[type].total_gameduration
+                    [aggregate.add_player(player) for player in self.results[type]]
+            if type in self.merged_aggregates:
+                aggregate.merge(self.merged_aggregates[type])
+            aggregates[type] = aggregate
+        return aggregates
+
+    def save_aggregates(self, filename: str, metadata: typing.Optional[typing.Dict[str, any]] = None) -> None:
+        """Writes the running sums of all types as JSON, which can be merged into other runs, see merge_aggregates()
+
+        Args:
+            filename (str): path of the JSON file
+            metadata (typing.Optional[typing.Dict[str, any]], optional): additional JSON compatible metadata, e.g. the shard of the corpus. Defaults to None.
+        """
+        replayfiles = {type: [analysis.replayfile for analysis in analyses_for_type] for type, analyses_for_type in self.analyses.items()}
+        write_aggregates(filename, self.get_aggregates(), dict(metadata or {}, analyzer_version=ANALYZER_VERSION, buckets=str(self.buckets), metrics=self.metrics, replayfiles=replayfiles))
+
+    def merge_aggregates(self, filename: str) -> None:
+        """Merges the running sums saved by another run, shard or day into the results of this run, see save_aggregates(). The averages of all types are recomputed from the merged running sums, i.e. get_timestamp_statistics() still only covers the players of this run.
+
+        Args:
+            filename (str): path of the JSON file
+        """
+        self.add_aggregates(filename, *read_aggregates(filename))
+        self.update_merged_average_results()
+
+    def add_aggregates(self, filename: str, aggregates: typing.Dict[str, SkillLevelAggregate], metadata: typing.Dict[str, any]) -> None:
+        """Merges running sums which have already been read, see aggregation.read_aggregates(). The averages are not recomputed, i.e. update_merged_average_results() has to be called once all running sums have been added.
+
+        Args:
+            filename (str): path of the JSON file the running sums were read from
+            aggregates (typing.Dict[str, SkillLevelAggregate]): the running sums mapped by skill level type
+            metadata (typing.Dict[str, any]): the metadata saved with the running sums
+
+        Raises:
+            ValueError: if the running sums were saved by another analyzer version or with other buckets or metrics
+        """
+        if metadata.get('analyzer_version') != ANALYZER_VERSION or metadata.get('buckets') != str(self.buckets):
+            raise ValueError(f'{filename} was saved by analyzer version {metadata.get("analyzer_version")} with buckets {metadata.get("buckets")}, expected version {ANALYZER_VERSION} with buckets {self.buckets}')
+        if metadata.get('metrics') != self.metrics:
+            raise ValueError(f'{filename} was saved with the metrics {", ".join(metadata.get("metrics", []))}, expected {", ".join(self.metrics)}')
+        for type, aggregate in aggregates.items():
+            self.merged_aggregates.setdefault(type, SkillLevelAggregate(aggregate.interval)).merge(aggregate)
+
+    def update_merged_average_results(self) -> None:
+        """Recomputes the averages of all types from the running sums of this run and the merged running sums, see add_aggregates()
+        """
+        for type, aggregate in self.get_aggregates().items():
+            if aggregate.replay_count == 0:
+                continue
+            self.average_results[FilterType.GAMEDURATION][type] = aggregate.get_average_gameduration()
+            self.set_average_results(type, aggregate)
+
+    def run_analyses(self, analyses: list[Analysis], workers: int = 1, cache: typing.Optional[AnalysisCache] = None, trace_directory: typing.Optional[str] = None, instrument: bool = False, timeout: typing.Optional[float] = None, journal: typing.Optional[RunJournal] = None) -> typing.Iterator[Analysis]:
+        """Parses the replay files of the given analyses or loads their cached results. The analyses are yielded one by one in the given order as soon as their results are available.
+        Every replay file is isolated, i.e. an analysis which raises or exceeds the timeout is recorded in self.failures instead of aborting the run. Failed analyses are not yielded and are removed from self.analyses once all analyses have been run.
+
+        Args:
+            analyses (list[Analysis]): the analyses to run
+            workers (int, optional): number of worker processes parsing the replay files. Defaults to 1, i.e. all replay files are parsed in the current process.
+            cache (typing.Optional[AnalysisCache], optional): cache holding the results of already parsed replay files. Defaults to None.
+            trace_directory (typing.Optional[str], optional): directory holding the trace files of the replay files. Defaults to None.
+            instrument (bool, optional): whether the parsed replay files are instrumented. Defaults to False.
+            timeout (typing.Optional[float], optional): maximum number of seconds parsing a replay file may take, see time_limit(). Defaults to None, i.e. no timeout.
+            journal (typing.Optional[RunJournal], optional): journal the completed and failed replay files are recorded in. Replay files which failed in a previous run are skipped. Defaults to None.
+
+        Yields:
+            typing.Iterator[Analysis]: the finished analyses
+        """
+        keys = {}
+        pending_analyses = []
+        journaled_failures = 0
+        for analysis in analyses:
+            error = journal.get_failure(analysis.replayfile) if journal is not None else None
+            if error is not None:
+                self.failures[analysis.replayfile] = f'{error} (journaled)'
+                journaled_failures += 1
+                continue
+            if cache is not None:
+                keys[analysis] = cache.get_key(analysis.replayfile, self.get_cache_variant())
+                if cache.contains(keys[analysis]):
+                    continue
+            pending_analyses.append(analysis)
+        if cache is not None:
+            print(f'Loading {len(keys) - len(pending_analyses)} analyses from cache, parsing {len(pending_analyses)} replay files')
+        if journal is not None:
+            print(f'Resuming: {sum(analysis.replayfile in journal.completed for analysis in analyses)} replay files have been completed before, skipping {journaled_failures} replay files which have failed before')
+
+        with ProcessPoolExecutor(max_workers=workers) if workers > 1 else contextlib.nullcontext() as executor:
+            futures = {}
+            if executor is not None:
+                # results are collected in the order of the replay files -> averaging stays deterministic
+                futures = {analysis: executor.submit(run_analysis, analysis.replayfile, trace_directory, self.buckets, instrument, timeout, self.metrics) for analysis in pending_analyses}
+            pending = set(pending_analyses)
+            for analysis in analyses:
+                if analysis.replayfile in self.failures:
+                    continue
+                try:
+                    if analysis in pending:
+                        if analysis in futures:
+                            result = futures.pop(analysis).result()
+                            analysis.load_result(result)
+                            result.instrumentation = None # not cached
+                        else:
+                            result = None
+                            if instrument:
+                                analysis.set_instrumentation(Instrumentation())
+                            with time_limit(timeout):
+                                analysis.start(trace_directory)
+                        if cache is not None:
+                            cache.store(keys[analysis], result if result is not None else analysis.get_result())
+                    else:
+                        result = cache.load(keys[analysis])
+                        if result is not None:
+                            analysis.load_result(result)
+                        else: # entry has been evicted in the meantime
+                            with time_limit(timeout):
+                                analysis.start(trace_directory)
+                except (Exception, AnalysisTimeoutError) as error:
+                    self.failures[analysis.replayfile] = f'{type(error).__name__}: {error}' if str(error) else type(error).__name__
+                    print(f'Failed to analyse {analysis.replayfile}: {self.failures[analysis.replayfile]}')
+                    if journal is not None and not isinstance(error, BrokenProcessPool): # the replay file may not be at fault
+                        journal.add_failure(analysis.replayfile, self.failures[analysis.replayfile])
+                    continue
+                if journal is not None:
+                    journal.add_completed(analysis.replayfile)
+                yield analysis
+        if cache is not None:
+            cache.evict()
+        self.remove_failed_analyses()
+
+    def get_cache_variant(self) -> str:
+        """Gets the variant of the cache keys, the results depend on the buckets and the selected metrics
+
+        Returns:
+            str: the variant, see cache.AnalysisCache.get_key()
+        """
+        if tuple(self.metrics) == BUILTIN_METRICS:
+            return str(self.buckets)
+        return f'{self.buckets} metrics={",".join(self.metrics)}'
+
+    def remove_failed_analyses(self) -> None:
+        self.analyses = {type: [analysis for analysis in analyses_for_type if analysis.replayfile not in self.failures] for type, analyses_for_type in self.analyses.items()}
+        self.combined_analyses = [analysis for analysis in self.combined_analyses if analysis.replayfile not in self.failures]
+
+    def report_failures(self) -> None:
+        """Prints the replay files which could not be analysed together with their error
+        """
+        if len(self.failures) > 0:
+            print(f'{len(self.failures)} replay files could not be analysed:')
+            [print(f'{replayfile}: {error}') for replayfile, error in self.failures.items()]
+
+    def get_run_instrumentation(self) -> Instrumentation:
+        """Merges the instrumentation of all instrumented analyses
+
+        Returns:
+            Instrumentation: the instrumentation of the whole run
+        """
+        run_instrumentation = Instrumentation()
+        [run_instrumentation.merge(instrumentation) for instrumentation in self.instrumentation.values()]
+        return run_instrumentation
+
+    def write_instrumentation_report(self, filename: str) -> None:
+        """Writes the instrumentation report of every parsed replay and of the whole run as JSON and prints the sections of the run
+
+        Args:
+            filename (str): path of the JSON file
+        """
+        run_instrumentation = self.get_run_instrumentation()
+        write_report(filename, self.instrumentation, run_instrumentation)
+        for section, values in run_instrumentation.get_report()['sections'].items():
+            print(f'{section}: {values["seconds"]:.3f} s in {values["calls"]} calls')
+
+    def add_unknown_ids(self, players: typing.Iterable[Player]) -> None:
+        """Adds the unknown ids of the given players to the totals of all analysed replays, see report_unknown_ids()
+
+        Args:
+            players (typing.Iterable[Player]): the players
+        """
+        for player in players:
+            for type, ids in player.get_unknown_ids().items():
+                for id, count in ids.items():
+                    self.unknown_ids[type][id] = self.unknown_ids[type].get(id, 0) + count
+
+    def report_unknown_ids(self) -> None:
+        """Prints the ids of all analysed replays which are missing in units.UNIT_IDS, units.BUILDING_IDS and units.TECHNOLOGY_IDS together with their occurence
+        """
+        for type, ids in self.unknown_ids.items():
+            if len(ids) > 0:
+                print(f'Unknown {type} ids (id: occurence): {dict(sorted(ids.items()))}')
+
     def compute_average_results(self) -> None:
         """Invokes compute_average_results_for_type results for all different types (Skill Levels)
         """
-        [self.compute_average_results_for_type(type, players) for type, players in self.results.items()]
+        [self.compute_average_results_for_type(type, players) for type, players in self.results.items() if len(players) > 0]
 
     def compute_average_results_for_type(self, type: str, players: list[Player]) -> None:
-        """Computes the average results for all players of a certain type
+        """Computes the average results for all players of a certain type. The states of the players are loaded into an aggregation.PlayerStateMatrix, which also offers other statistics, see get_timestamp_statistics().
 
         Args:
             type (str): skill level type
             players (list[Player]): list holding all players
         """
-        values_for_timestamps_type_avg = self.average_timestamp_results[type]
-        total_eAPM = 0
-        average_action_move_coordinates = self.average_results[FilterType.ACTION_MOVE_COORDINATES][type]
-        average_action_unit_coordinates = self.average_results[FilterType.ACTION_UNIT_COORDINATES][type]
-        average_technologies = self.average_results[FilterType.TECHNOLOGIES][type]
+        state_matrix = PlayerStateMatrix(players)
+        self.state_matrices[type] = state_matrix
+        self.set_average_results(type, state_matrix)
 
-        for player in players:
-            total_eAPM += player.get_average_eAPM()
-            # calculate average units and buildings for timestamps
-            for timestamp, values in player.get_state_for_timestamps().items():
-                values_for_timestamp = values_for_timestamps_type_avg.setdefault(timestamp, {
-                    FilterType.UNITS: {MainType.ECO: 0, MainType.MIL: 0}, 
-                    FilterType.BUILDINGS: {MainType.ECO: 0, MainType.MIL: 0, BuildingType.WALL: 0},
-                    FilterType.ACTION_MOVE_COORDINATES: {'x': 0, 'y': 0, 'count': 0},
-                    FilterType.ACTION_UNIT_COORDINATES: {'x': 0, 'y': 0, 'count': 0},
-                    'count': 0})
-                for key, value in values.items():
-                    for value_key in value.keys():
-                        values_for_timestamp[key][value_key] += value[value_key]
-                values_for_timestamp['count'] += 1
-            # calculate average technology research time
-            for main_type, technologies in player.get_technologies().items():
-                average_technologies_for_type = average_technologies[main_type]
-                for technology, timestamp in technologies.items():
-                    average_technology = average_technologies_for_type.setdefault(technology, {'timestamp': 0, 'count': 0})
-                    average_technology['timestamp'] += timestamp
-                    average_technology['count'] += 1
-            # add coordinates
-            action_coordinates = player.get_average_move_action_coordinates()
-            average_action_move_coordinates['x'] += action_coordinates[0]
-            average_action_move_coordinates['y'] += action_coordinates[1]
-
-            action_unit_coordinates = player.get_average_unit_coordinates()
-            average_action_unit_coordinates['x'] += action_unit_coordinates[0]
-            average_action_unit_coordinates['y'] += action_unit_coordinates[1]
-        
-        # average coordinate and eAPM values based on player count
-        player_count = len(players)
-        average_action_move_coordinates['x'] /= player_count
-        average_action_move_coordinates['y'] /= player_count
-
-        average_action_unit_coordinates['x'] /= player_count
-        average_action_unit_coordinates['y'] /= player_count
-
-        self.average_results[FilterType.EAPM][type] = total_eAPM / player_count
-
-        # average technology, military and eco values based on frequency of timestamp 
-        for main_type, technologies in average_technologies.items():
-            for technology, values in technologies.items():
-                average_technologies[main_type][technology] = values['timestamp'] / values['count']
-        for timestamp, results in values_for_timestamps_type_avg.items():
-            count = results['count']
-            for value in results.values():
-                if isinstance(value, dict):
-                    if MainType.ECO in value:
-                        for key in value.keys():
-                            value[key] /= count
-                    elif 'x' in value:
-                        value['x'] /= count
-                        value['y'] /= count
-            results.pop('count', None)
-
-    def output_results(self) -> None:
+    def get_timestamp_statistics(self, type: str, statistic: str = 'median', q: typing.Optional[float] = None) -> typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]:
+        """Gets a statistic of the units, buildings and action coordinates of all players of a certain type for all timestamps, see aggregation.PlayerStateMatrix.get_timestamp_statistics(). Not available in streaming mode.
+
+        Args:
+            type (str): skill level type
+            statistic (str, optional): mean, median, std, min, max, sum or percentile. Defaults to 'median'.
+            q (typing.Optional[float], optional): the percentile between 0 and 100, only used for statistic 'percentile'. Defaults to None.
+
+        Returns:
+            typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]: the statistic for all timestamps
+        """
+        return self.state_matrices[type].get_timestamp_statistics(statistic, q)
+
+    def set_average_results(self, type: str, aggregate: typing.Union[SkillLevelAggregate, PlayerStateMatrix]) -> None:
+        """Sets the average eAPM, technology research times, action coordinates, additional metrics and timestamp results of a certain type. Only the results of the selected metrics are set.
+
+        Args:
+            type (str): skill level type
+            aggregate (typing.Union[SkillLevelAggregate, PlayerStateMatrix]): running sums or state matrix of all players of the type
+        """
+        results = {metric.result for metric in get_metrics(self.metrics)}
+        if FilterType.EAPM in results:
+            self.average_results[FilterType.EAPM][type] = aggregate.get_average_eAPM()
+        if FilterType.TECHNOLOGIES in results:
+            self.average_results[FilterType.TECHNOLOGIES][type] = aggregate.get_average_technologies()
+        if FilterType.ACTION_MOVE_COORDINATES in results:
+            self.average_results[FilterType.ACTION_MOVE_COORDINATES][type] = aggregate.get_average_action_move_coordinates()
+        if FilterType.ACTION_UNIT_COORDINATES in results:
+            self.average_results[FilterType.ACTION_UNIT_COORDINATES][type] = aggregate.get_average_action_unit_coordinates()
+        average_metrics = aggregate.get_average_metrics()
+        for metric in get_metrics(self.metrics):
+            if metric.handler is not None:
+                self.average_results[FilterType.METRICS].setdefault(metric.name, {})[type] = average_metrics.get(metric.name, 0)
+        self.average_timestamp_results[type] = aggregate.get_average_timestamp_results()
+
+    def output_results(self, directory: typing.Optional[str] = None, formats: typing.Sequence[str] = ('png',), workers: int = 1) -> None:
         """This invokes an visualisation.AoEGraphs instance to visualise the analaysis results.
+
+        Args:
+            directory (typing.Optional[str], optional): directory the graphs are saved to without showing them, see visualisation.AoEGraphs.save_results(). Defaults to None, i.e. the graphs are shown interactively.
+            formats (typing.Sequence[str], optional): file formats of the saved graphs. Defaults to ('png',).
+            workers (int, optional): number of worker processes rendering the saved graphs. Defaults to 1.
         """
-        visualisation = AoEGraphs(self.average_timestamp_results, self.average_results)
-        visualisation.output_results()
+        from visualisation import AoEGraphs # matplotlib and pandas are only loaded once graphs are requested
+        visualisation = AoEGraphs(self.average_timestamp_results, self.average_results, self.metrics)
+        if directory is None:
+            visualisation.output_results()
+        else:
+            visualisation.save_results(directory, formats, workers)
+
+    def save_heatmaps(self, directory: str, formats: typing.Sequence[str] = ('png',)) -> None:
+        """Saves the heatmaps of all types to heatmaps.npz, see heatmap.write_heatmaps(), and renders them for every frame
+
+        Args:
+            directory (str): directory of the heatmaps
+            formats (typing.Sequence[str], optional): file formats of the rendered heatmaps. Defaults to ('png',).
+        """
+        from heatmap import render_heatmaps # loads matplotlib
+        os.makedirs(directory, exist_ok=True)
+        write_heatmaps(f'{directory}/heatmaps.npz', self.heatmaps)
+        [render_heatmaps(self.heatmaps, f'{directory}/heatmap_{frame}.{format}', frame) for frame in FRAMES for format in formats]
 
     def create_analyses_report(self) -> None:
         """This invokes Analysis.create_analysis_report() for all stored analysis isntances
         """
+        if self.streaming:
+            print('Analysis reports are not available in streaming mode, the players have been released after parsing')
+            return
         [analysis.create_analysis_report() for analysis in self.combined_analyses]
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Analyses and visualises Age of Empires II DE replay files segmented by skill level.')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes parsing the replay files')
+    parser.add_argument('--no-cache', action='store_true', help='parse all replay files without using the analysis cache')
+    parser.add_argument('--clear-cache', action='store_true', help='invalidate the analysis cache before parsing')
+    parser.add_argument('--cache-size', type=int, default=512, help='maximum size of the analysis cache in MiB')
+    parser.add_argument('--intervals', type=int, nargs='+', default=[120], help='bucket intervals in seconds the player states are calculated for, the first one is averaged and visualised')
+    parser.add_argument('--slot', type=int, default=60, help='resolution of the recorded action timestamps in seconds, all intervals have to be a multiple of it')
+    parser.add_argument('--streaming', action='store_true', help='fold the players of each replay into the averages right after parsing and release them, no CSV reports are created')
+    parser.add_argument('--traces', action='store_true', help='write the relevant operations of every replay file to a trace file and analyse existing trace files instead of the replay files')
+    parser.add_argument('--instrument', default=None, metavar='PATH', help='count operations and actions of the parsed replay files, time their header parsing, decoding, action handlers and bucket computations and write the report as JSON to PATH')
+    parser.add_argument('--store', default=None, metavar='PATH', help='write the results of all replay files to a SQLite results store at PATH, see store.py')
+    parser.add_argument('--bulk-report', action='store_true', help='write the reports of all replay files into a few consolidated files in output/bulk instead of four CSV files per replay')
+    parser.add_argument('--report-format', choices=REPORT_FORMATS, default='csv', help='file format of the consolidated reports, parquet requires pyarrow')
+    parser.add_argument('--timeout', type=float, default=None, metavar='SECONDS', help='maximum number of seconds parsing a replay file may take, slower replay files are recorded as failed')
+    parser.add_argument('--journal', default=None, metavar='PATH', help='record completed and failed replay files in a journal at PATH, an interrupted run resumes from the analysis cache and skips replay files which have failed before')
+    parser.add_argument('--retry-failed', action='store_true', help='analyse replay files again which have failed in a previous run of the journal')
+    parser.add_argument('--save-aggregates', default=None, metavar='PATH', help='write the running sums of all skill levels as JSON to PATH, see aggregation.write_aggregates()')
+    parser.add_argument('--merge-aggregates', nargs='+', default=[], metavar='PATH', help='merge the running sums saved by other runs into the averages before visualising them')
+    parser.add_argument('--headless', action='store_true', help='save the graphs to the output/graphs directory instead of showing them')
+    parser.add_argument('--graph-formats', nargs='+', default=['png'], help='file formats of the saved graphs, e.g. png svg pdf')
+    parser.add_argument('--heatmaps', action='store_true', help='save the action heatmaps of all skill levels to the output/heatmaps directory, see heatmap.py')
+    parser.add_argument('--render-workers', type=int, default=1, help='number of worker processes rendering the saved graphs')
+    parser.add_argument('--metrics', nargs='+', choices=list(METRICS), default=None, metavar='METRIC', help=f'only record, average and visualise the given metrics ({", ".join(METRICS)}), all others read as zero, see metrics.py')
+    args = parser.parse_args()
+    if args.heatmaps and args.metrics is not None and 'heatmap' not in args.metrics:
+        parser.error('--heatmaps requires the metric heatmap')
+
     base_path = Path(__file__).parent
     file_path = str((base_path / 'replays').resolve())
-    analyses = MultipleAnalyses({SkillLevel.PRO: file_path + '/pro', SkillLevel.HIGH: file_path + '/high', SkillLevel.MIDDLE: file_path + '/middle', SkillLevel.LOW: file_path + '/low'})
-    analyses.start_analyses()
-    analyses.output_results()
-    analyses.create_analyses_report()
+    cache = None
+    if not args.no_cache:
+        cache = AnalysisCache(str((base_path / 'cache').resolve()), ANALYZER_VERSION, args.cache_size * 1024 * 1024)
+        if args.clear_cache:
+            cache.clear()
+    analyses = MultipleAnalyses({SkillLevel.PRO: file_path + '/pro', SkillLevel.HIGH: file_path + '/high', SkillLevel.MIDDLE: file_path + '/middle', SkillLevel.LOW: file_path + '/low'}, BucketConfig(args.intervals, args.slot), args.metrics)
+    trace_directory = str((base_path / 'traces').resolve()) if args.traces else None
+    store = ResultsStore(args.store) if args.store is not None else None
+    report_writer = BulkReportWriter(str((base_path / 'output' / 'bulk').resolve()), args.report_format) if args.bulk_report else None
+    if args.journal is not None and cache is None:
+        parser.error('--journal restores completed replay files from the analysis cache, it cannot be combined with --no-cache')
+    journal = RunJournal(args.journal, args.retry_failed) if args.journal is not None else None
+    analyses.start_analyses(args.workers, cache, trace_directory, args.streaming, args.instrument is not None, store, report_writer, args.timeout, journal)
+    if journal is not None:
+        journal.close()
+    if store is not None:
+        store.close()
+    if report_writer is not None:
+        report_writer.close()
+    if args.instrument is not None:
+        analyses.write_instrumentation_report(args.instrument)
+    if args.save_aggregates is not None:
+        analyses.save_aggregates(args.save_aggregates) # only the replay files of this run
+    [analyses.merge_aggregates(filename) for filename in args.merge_aggregates]
+    if args.heatmaps:
+        analyses.save_heatmaps(str((base_path / 'output' / 'heatmaps').resolve()), args.graph_formats)
+    graph_directory = str((base_path / 'output' / 'graphs').resolve()) if args.headless else None
+    analyses.output_results(graph_directory, args.graph_formats, args.render_workers)
+    if not args.bulk_report:
+        analyses.create_analyses_report()
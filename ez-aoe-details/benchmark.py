@@ -0,0 +1,223 @@
+import io
+import os
+import sys
+import copy
+import json
+import time
+import typing
+import argparse
+import platform
+import tempfile
+import resource
+import tracemalloc
+import contextlib
+import subprocess
+import matplotlib
+matplotlib.use('Agg') # graphs are rendered without a display
+from datetime import datetime
+from pathlib import Path
+from analysis import Analysis, MultipleAnalyses
+from units import SkillLevel
+from visualisation import AoEGraphs
+
+class StageMeasurement():
+    """This class measures the wall time or the peak memory of a single pipeline stage. The peak memory is traced with tracemalloc, which slows down allocation heavy stages considerably, i.e. time and memory are measured in separate runs of a stage.
+    """
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.seconds = 0
+        self.peak_memory = None
+        self.replays = 0
+        self.operations = 0
+
+    def __enter__(self) -> 'StageMeasurement':
+        if self.trace_memory:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.seconds = time.perf_counter() - self.start
+        if self.trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def get_result(self) -> typing.Dict[str, any]:
+        """Gets the measured time and throughput
+
+        Returns:
+            typing.Dict[str, any]: e.g. {'seconds': 24.1, 'replays': 8, 'replays_per_second': 0.33, 'operations': 912034, 'operations_per_second': 37843.7}
+        """
+        result = {'seconds': self.seconds, 'replays': self.replays, 'replays_per_second': self.replays / self.seconds if self.seconds > 0 else None}
+        if self.operations > 0:
+            result['operations'] = self.operations
+            result['operations_per_second'] = self.operations / self.seconds
+        return result
+
+class PipelineBenchmark():
+    """This class benchmarks the parse → aggregate → report → graphs pipeline of MultipleAnalyses. Every replay file is parsed once with Analysis.start_analysis(). The remaining stages run on the bundled corpus and on a synthetic corpus, which repeats the parsed replays `scale` times.
+    Parsing is not repeated for the synthetic corpus, its throughput per replay does not depend on the corpus size. The peak memory of each stage is measured in a second, traced run. For the parse stage, the traced run only covers the first replay of each skill level.
+    """
+    def __init__(self, paths_to_segmented_replayfiles: typing.Dict[SkillLevel, str], scale: int = 10, limit: typing.Optional[int] = None, trace_memory: bool = True):
+        """Constructor
+
+        Args:
+            paths_to_segmented_replayfiles (typing.Dict[SkillLevel, str]): directories of the replay files for each skill level
+            scale (int, optional): factor the synthetic corpus is scaled up by. Defaults to 10.
+            limit (typing.Optional[int], optional): maximum number of replay files per skill level. Defaults to None, i.e. all replay files.
+            trace_memory (bool, optional): whether the peak memory of each stage is measured. Defaults to True.
+        """
+        self.analyses = MultipleAnalyses(paths_to_segmented_replayfiles)
+        if limit is not None:
+            self.analyses.analyses = {type: sorted(analyses, key=lambda analysis: analysis.replayfile)[:limit] for type, analyses in self.analyses.analyses.items()}
+            self.analyses.combined_analyses = [analysis for analyses in self.analyses.analyses.values() for analysis in analyses]
+        self.scale = scale
+        self.trace_memory = trace_memory
+
+    def run(self) -> typing.Dict[str, any]:
+        """Runs all stages, the output of the stages is suppressed
+
+        Returns:
+            typing.Dict[str, any]: the environment of the run and the measurements of every stage for the bundled and the synthetic corpus
+        """
+        results = {'bundled': {}, f'scaled_x{self.scale}': {}}
+        with tempfile.TemporaryDirectory() as output_path, contextlib.redirect_stdout(io.StringIO()):
+            results['bundled']['parse'] = self.measure(self.run_parse, self.analyses.analyses)
+            synthetic_analyses = self.create_synthetic_analyses()
+            for corpus, analyses in zip(results.keys(), [self.analyses.analyses, synthetic_analyses]):
+                results[corpus]['aggregate'] = self.measure(self.run_aggregate, analyses)
+                results[corpus]['report'] = self.measure(self.run_report, analyses, f'{output_path}/{corpus}')
+                results[corpus]['graphs'] = self.measure(self.run_graphs, analyses, f'{output_path}/{corpus}/graphs')
+        return {'environment': get_environment(), 'scale': self.scale, 'results': results}
+
+    def measure(self, stage: typing.Callable[..., None], analyses: typing.Dict[SkillLevel, list[Analysis]], *args) -> typing.Dict[str, any]:
+        """Measures the time of a stage and, in a second run, its peak memory
+
+        Args:
+            stage (typing.Callable[..., None]): the stage, called with the measurement, the analyses and args
+            analyses (typing.Dict[SkillLevel, list[Analysis]]): the analyses for each skill level
+
+        Returns:
+            typing.Dict[str, any]: the measured time, throughput and peak memory in bytes (None if not traced)
+        """
+        with StageMeasurement() as measurement:
+            stage(measurement, analyses, *args)
+        result = measurement.get_result()
+        result['peak_memory'] = None
+        if self.trace_memory:
+            if stage == self.run_parse:
+                # parse a fresh copy of one replay per skill level
+                analyses = {type: [Analysis(analyses_for_type[0].replayfile, analyses_for_type[0].buckets)] for type, analyses_for_type in analyses.items() if len(analyses_for_type) > 0}
+            with StageMeasurement(True) as memory_measurement:
+                stage(memory_measurement, analyses, *args)
+            result['peak_memory'] = memory_measurement.peak_memory
+        return result
+
+    def run_parse(self, measurement: StageMeasurement, analyses: typing.Dict[SkillLevel, list[Analysis]]) -> None:
+        for analyses_for_type in analyses.values():
+            for analysis in analyses_for_type:
+                analysis.start_analysis()
+                measurement.replays += 1
+                measurement.operations += analysis.operation_count
+
+    def run_aggregate(self, measurement: StageMeasurement, analyses: typing.Dict[SkillLevel, list[Analysis]]) -> None:
+        for type, analyses_for_type in analyses.items():
+            players = [player for analysis in analyses_for_type for player in analysis.get_players().values()]
+            self.analyses.compute_average_results_for_type(type, players)
+            measurement.replays += len(analyses_for_type)
+
+    def run_report(self, measurement: StageMeasurement, analyses: typing.Dict[SkillLevel, list[Analysis]], output_path: str) -> None:
+        for analyses_for_type in analyses.values():
+            for analysis in analyses_for_type:
+                analysis.create_analysis_report(output_path)
+                measurement.replays += 1
+
+    def run_graphs(self, measurement: StageMeasurement, analyses: typing.Dict[SkillLevel, list[Analysis]], output_path: str) -> None:
+        visualisation = AoEGraphs(self.analyses.average_timestamp_results, self.analyses.average_results)
+        visualisation.save_results(output_path)
+        measurement.replays += sum(len(analyses_for_type) for analyses_for_type in analyses.values())
+
+    def create_synthetic_analyses(self) -> typing.Dict[SkillLevel, list[Analysis]]:
+        """Creates the synthetic corpus by repeating every parsed analysis `scale` times. The copies share their players but have distinct replay file names, i.e. their reports do not overwrite each other.
+
+        Returns:
+            typing.Dict[SkillLevel, list[Analysis]]: the synthetic analyses for each skill level
+        """
+        synthetic_analyses = {}
+        for type, analyses_for_type in self.analyses.analyses.items():
+            synthetic_analyses[type] = []
+            for index in range(self.scale):
+                for analysis in analyses_for_type:
+                    synthetic_analysis = copy.copy(analysis)
+                    synthetic_analysis.replayfile = f'{analysis.replayfile}.{index}'
+                    synthetic_analyses[type].append(synthetic_analysis)
+        return synthetic_analyses
+
+def get_environment() -> typing.Dict[str, any]:
+    """Gets the environment of a benchmark run, i.e. the commit, the interpreter and the machine
+
+    Returns:
+        typing.Dict[str, any]: the environment, the commit is None outside of a git repository
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'date': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+
+def compare_benchmarks(previous: typing.Dict[str, any], current: typing.Dict[str, any]) -> None:
+    """Prints the change of the wall time and the peak memory of every stage compared to a previous run
+
+    Args:
+        previous (typing.Dict[str, any]): results of the previous run, see PipelineBenchmark.run()
+        current (typing.Dict[str, any]): results of the current run
+    """
+    print(f'Compared to commit {previous["environment"]["commit"]} ({previous["environment"]["date"]}):')
+    for corpus, stages in current['results'].items():
+        for stage, result in stages.items():
+            previous_result = previous['results'].get(corpus, {}).get(stage)
+            if previous_result is None:
+                continue
+            changes = [f'time {(result["seconds"] / previous_result["seconds"] - 1) * 100:+.1f}%']
+            if result['peak_memory'] is not None and previous_result['peak_memory']:
+                changes.append(f'peak memory {(result["peak_memory"] / previous_result["peak_memory"] - 1) * 100:+.1f}%')
+            print(f'{corpus} {stage}: {", ".join(changes)}')
+
+def print_benchmark(benchmark: typing.Dict[str, any]) -> None:
+    for corpus, stages in benchmark['results'].items():
+        for stage, result in stages.items():
+            line = f'{corpus} {stage}: {result["seconds"]:.3f} s, {result["replays_per_second"]:.2f} replays/s'
+            if 'operations_per_second' in result:
+                line += f', {result["operations_per_second"]:.0f} operations/s'
+            if result['peak_memory'] is not None:
+                line += f', peak memory {result["peak_memory"] / (1024 * 1024):.1f} MiB'
+            print(line)
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    print(f'Maximum resident set size: {max_rss:.1f} MiB')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the parse, aggregate, report and graph stages on the bundled replay corpus and on a synthetic scaled-up corpus.')
+    parser.add_argument('--scale', type=int, default=10, help='factor the synthetic corpus is scaled up by')
+    parser.add_argument('--limit', type=int, default=None, help='maximum number of replay files per skill level')
+    parser.add_argument('--no-memory', action='store_true', help='do not measure the peak memory of the stages, which runs every stage a second time')
+    parser.add_argument('--output', default=None, help='path of the JSON results, defaults to benchmarks/<date>.json')
+    parser.add_argument('--compare', default=None, help='path of the JSON results of a previous run to compare against')
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent
+    file_path = str((base_path / 'replays').resolve())
+    benchmark = PipelineBenchmark({SkillLevel.PRO: file_path + '/pro', SkillLevel.HIGH: file_path + '/high', SkillLevel.MIDDLE: file_path + '/middle', SkillLevel.LOW: file_path + '/low'}, args.scale, args.limit, not args.no_memory).run()
+    print_benchmark(benchmark)
+
+    output = args.output
+    if output is None:
+        os.makedirs(base_path / 'benchmarks', exist_ok=True)
+        output = str(base_path / 'benchmarks' / f'{datetime.now().strftime("%Y-%m-%d_%H_%M_%S")}.json')
+    with open(output, 'w', encoding='UTF8') as file:
+        json.dump(benchmark, file, indent=1)
+    print(f'Saved results to {output}')
+
+    if args.compare is not None:
+        with open(args.compare, encoding='UTF8') as file:
+            compare_benchmarks(json.load(file), benchmark)
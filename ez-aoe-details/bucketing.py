@@ -0,0 +1,96 @@
+import typing
+
+class BucketConfig():
+    """This class configures the time buckets the player states are calculated for.
+    Actions are recorded in slots of `slot` seconds, i.e. an action at game time t is stored with the timestamp ceil(t / slot) * slot. Every `interval` seconds, the player state is calculated. The action coordinates of the state at timestamp T are rolled up from all slots with a timestamp between T - interval and T (both exclusive).
+    Multiple intervals can be calculated in the same pass, the slots are only recorded once for all of them. The first interval is the primary one, which is used for averaging and visualisation.
+    The default (slot 60, interval 120) corresponds to a player state every two minutes.
+    """
+    def __init__(self, intervals: typing.Sequence[int] = (120,), slot: int = 60):
+        """Constructor
+
+        Args:
+            intervals (typing.Sequence[int], optional): bucket intervals in seconds, each a multiple of the slot. Defaults to (120,).
+            slot (int, optional): slot size in seconds. Defaults to 60.
+        """
+        if slot <= 0 or len(intervals) == 0:
+            raise ValueError('the slot size has to be positive and at least one interval is required')
+        for interval in intervals:
+            if interval <= 0 or interval % slot != 0:
+                raise ValueError(f'interval {interval} is not a positive multiple of the slot size {slot}')
+        self.slot = slot
+        self.intervals = list(dict.fromkeys(intervals))
+        self.primary_interval = self.intervals[0]
+        self.max_interval = max(self.intervals)
+
+    def get_slot_timestamp(self, time: int) -> int:
+        """Gets the timestamp of the slot an action at the given game time is recorded in
+
+        Args:
+            time (int): game time in ms
+
+        Returns:
+            int: slot timestamp in seconds
+        """
+        return -(-time // (self.slot * 1000)) * self.slot
+
+    def get_intervals_for_timestamp(self, timestamp: int) -> list[int]:
+        """Gets all intervals a state has to be calculated for at the given timestamp
+
+        Args:
+            timestamp (int): slot timestamp in seconds
+
+        Returns:
+            list[int]: intervals dividing the timestamp
+        """
+        return [interval for interval in self.intervals if timestamp % interval == 0]
+
+    def get_window_slots(self, timestamp: int, interval: int) -> range:
+        """Gets the timestamps of all slots rolled up into the state at the given timestamp
+
+        Args:
+            timestamp (int): state timestamp in seconds
+            interval (int): bucket interval in seconds
+
+        Returns:
+            range: slot timestamps between timestamp - interval and timestamp (both exclusive)
+        """
+        return range(timestamp - interval + self.slot, timestamp, self.slot)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, BucketConfig) and self.slot == other.slot and self.intervals == other.intervals
+
+    def __hash__(self) -> int:
+        return hash((self.slot, tuple(self.intervals)))
+
+    def __str__(self) -> str:
+        return f'slot{self.slot}-' + '-'.join(str(interval) for interval in self.intervals)
+
+DEFAULT_BUCKETS = BucketConfig()
+
+class BucketClock():
+    """This class tracks the game time of a replay and decides in O(1) per SYNC operation when player states have to be calculated. A state is calculated whenever the game time enters a new slot whose timestamp is a multiple of an interval.
+    """
+    def __init__(self, buckets: BucketConfig = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.slot_ms = buckets.slot * 1000
+        self.next_slot_time = 0
+
+    def advance(self, time: int) -> typing.Optional[typing.Tuple[int, list[int]]]:
+        """Advances the clock to the given game time
+
+        Args:
+            time (int): game time in ms
+
+        Returns:
+            typing.Optional[typing.Tuple[int, list[int]]]: the timestamp in seconds and the intervals a state has to be calculated for, None if there is none
+        """
+        if time < self.next_slot_time:
+            return None
+        slot_index = time // self.slot_ms
+        self.next_slot_time = (slot_index + 1) * self.slot_ms
+        timestamp = slot_index * self.buckets.slot
+        intervals = self.buckets.get_intervals_for_timestamp(timestamp)
+        if len(intervals) == 0:
+            return None
+        return timestamp, intervals
@@ -0,0 +1,114 @@
+import os
+import pickle
+import hashlib
+import typing
+
+def get_content_hash(replayfile: str) -> str:
+    """Computes the SHA-256 hash of the content of a replay file, e.g. to key files derived from it
+
+    Args:
+        replayfile (str): path of the replay file
+
+    Returns:
+        str: the hex digest
+    """
+    content_hash = hashlib.sha256()
+    with open(replayfile, 'rb') as data:
+        for chunk in iter(lambda: data.read(1024 * 1024), b''):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+class AnalysisCache():
+    """This class holds an on-disk cache of analysis results, e.g. analysis.AnalysisResult. Entries are keyed by the content hash of the replay file and the analyzer version, i.e. moved or renamed replays are still found and results of an outdated analyzer are never loaded.
+    The least recently used entries are evicted as soon as the cache exceeds its maximum size.
+    """
+    def __init__(self, path: str, version: int, max_size: int = 512 * 1024 * 1024):
+        """Constructor
+
+        Args:
+            path (str): directory holding the cache entries
+            version (int): analyzer version, part of every key
+            max_size (int, optional): maximum size of all cache entries in bytes. Defaults to 512 MiB.
+        """
+        self.path = path
+        self.version = version
+        self.max_size = max_size
+        os.makedirs(self.path, exist_ok=True)
+
+    def get_key(self, replayfile: str, variant: str = '') -> str:
+        """Computes the cache key of a replay file, i.e. the SHA-256 hash of its content combined with the analyzer version and the analysis variant
+
+        Args:
+            replayfile (str): path of the replay file
+            variant (str, optional): describes the configuration of the analysis, e.g. its time buckets. Defaults to ''.
+
+        Returns:
+            str: the cache key
+        """
+        return f'{get_content_hash(replayfile)}-v{self.version}-{variant}'
+
+    def get_entry_path(self, key: str) -> str:
+        return f'{self.path}/{key}.pickle'
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(self.get_entry_path(key))
+
+    def load(self, key: str) -> typing.Optional[any]:
+        """Loads a cached result, the entry is marked as recently used
+
+        Args:
+            key (str): cache key, see get_key(self, replayfile)
+
+        Returns:
+            typing.Optional[any]: the cached result or None if there is no valid entry
+        """
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path, 'rb') as entry:
+                result = pickle.load(entry)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # entry is truncated or was written by an incompatible version
+            os.remove(entry_path)
+            return None
+        os.utime(entry_path)
+        return result
+
+    def store(self, key: str, result: any) -> None:
+        """Stores a result, call evict(self) once all results of a run have been stored
+
+        Args:
+            key (str): cache key, see get_key(self, replayfile)
+            result (any): the picklable result
+        """
+        entry_path = self.get_entry_path(key)
+        temporary_path = f'{entry_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'wb') as entry:
+            pickle.dump(result, entry, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, entry_path) # entries are never read half-written
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the size of the cache is below its maximum size
+        """
+        entries = []
+        total_size = 0
+        with os.scandir(self.path) as directory_entries:
+            for entry in directory_entries:
+                if entry.is_file() and entry.name.endswith('.pickle'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            os.remove(entry_path)
+            total_size -= size
+
+    def clear(self) -> None:
+        """Removes all cache entries
+        """
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_file() and (entry.name.endswith('.pickle') or entry.name.endswith('.tmp')):
+                    os.remove(entry.path)
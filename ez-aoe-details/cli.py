@@ -0,0 +1,132 @@
+import time
+import argparse
+from pathlib import Path
+from analysis import MultipleAnalyses, ANALYZER_VERSION
+from aggregation import read_aggregates
+from bucketing import BucketConfig
+from cache import AnalysisCache
+from journal import RunJournal
+from metrics import METRICS
+from report import BulkReportWriter, REPORT_FORMATS
+from store import ResultsStore
+from units import SkillLevel
+
+def run_analyses(args: argparse.Namespace, parser: argparse.ArgumentParser, store: ResultsStore = None, report_writer: BulkReportWriter = None, instrument: bool = False) -> MultipleAnalyses:
+    """Analyses the replay files of all skill levels with the options shared by all commands and merges the saved aggregates of other runs
+
+    Args:
+        args (argparse.Namespace): the parsed command line arguments
+        parser (argparse.ArgumentParser): the parser of the command, reports invalid combinations of arguments
+        store (ResultsStore, optional): results store all analyses are written to. Defaults to None.
+        report_writer (BulkReportWriter, optional): writer of the consolidated reports. Defaults to None.
+        instrument (bool, optional): whether the parsed replay files are instrumented. Defaults to False.
+
+    Returns:
+        MultipleAnalyses: the finished analyses
+    """
+    base_path = Path(__file__).parent
+    file_path = str((base_path / 'replays').resolve())
+    cache = None
+    if not args.no_cache:
+        cache = AnalysisCache(str((base_path / 'cache').resolve()), ANALYZER_VERSION, args.cache_size * 1024 * 1024)
+        if args.clear_cache:
+            cache.clear()
+    if args.journal is not None and cache is None:
+        parser.error('--journal restores completed replay files from the analysis cache, it cannot be combined with --no-cache')
+    analyses = MultipleAnalyses({SkillLevel.PRO: file_path + '/pro', SkillLevel.HIGH: file_path + '/high', SkillLevel.MIDDLE: file_path + '/middle', SkillLevel.LOW: file_path + '/low'}, BucketConfig(args.intervals, args.slot), args.metrics)
+    trace_directory = str((base_path / 'traces').resolve()) if args.traces else None
+    journal = RunJournal(args.journal, args.retry_failed) if args.journal is not None else None
+    analyses.start_analyses(args.workers, cache, trace_directory, args.streaming, instrument, store, report_writer, args.timeout, journal)
+    if journal is not None:
+        journal.close()
+    return analyses
+
+def load_aggregates(filenames: list[str], buckets: BucketConfig, metrics: list[str] = None) -> MultipleAnalyses:
+    """Computes the averages from saved aggregates only, no replay file is parsed
+
+    Args:
+        filenames (list[str]): paths of the JSON files, see MultipleAnalyses.save_aggregates()
+        buckets (BucketConfig): the bucket configuration the aggregates were saved with
+        metrics (list[str], optional): the metrics the aggregates were saved with. Defaults to None, i.e. all metrics.
+
+    Returns:
+        MultipleAnalyses: holds the average results of the merged aggregates, e.g. for MultipleAnalyses.output_results()
+    """
+    saved_aggregates = {filename: read_aggregates(filename) for filename in filenames}
+    analyses = MultipleAnalyses({}, buckets, metrics)
+    analyses.set_replayfiles({type: [] for aggregates, _ in saved_aggregates.values() for type in aggregates})
+    for filename, (aggregates, metadata) in saved_aggregates.items():
+        analyses.add_aggregates(filename, aggregates, metadata)
+    analyses.update_merged_average_results()
+    return analyses
+
+if __name__ == '__main__':
+    common_parser = argparse.ArgumentParser(add_help=False)
+    common_parser.add_argument('--workers', type=int, default=1, help='number of worker processes parsing the replay files')
+    common_parser.add_argument('--no-cache', action='store_true', help='parse all replay files without using the analysis cache')
+    common_parser.add_argument('--clear-cache', action='store_true', help='invalidate the analysis cache before parsing')
+    common_parser.add_argument('--cache-size', type=int, default=512, help='maximum size of the analysis cache in MiB')
+    common_parser.add_argument('--intervals', type=int, nargs='+', default=[120], help='bucket intervals in seconds the player states are calculated for, the first one is averaged and visualised')
+    common_parser.add_argument('--slot', type=int, default=60, help='resolution of the recorded action timestamps in seconds, all intervals have to be a multiple of it')
+    common_parser.add_argument('--streaming', action='store_true', help='fold the players of each replay into the averages right after parsing and release them')
+    common_parser.add_argument('--traces', action='store_true', help='write and analyse trace files, see analysis.py --traces')
+    common_parser.add_argument('--timeout', type=float, default=None, metavar='SECONDS', help='maximum number of seconds parsing a replay file may take, slower replay files are recorded as failed')
+    common_parser.add_argument('--journal', default=None, metavar='PATH', help='record completed and failed replay files in a journal at PATH, see analysis.py --journal')
+    common_parser.add_argument('--retry-failed', action='store_true', help='analyse replay files again which have failed in a previous run of the journal')
+    common_parser.add_argument('--metrics', nargs='+', choices=list(METRICS), default=None, metavar='METRIC', help='only record, average and visualise the given metrics, see analysis.py --metrics')
+
+    parser = argparse.ArgumentParser(description='Analyses Age of Empires II DE replay files segmented by skill level. Only the graph command loads matplotlib and pandas.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    parse_parser = subparsers.add_parser('parse', parents=[common_parser], help='parse the replay files into the analysis cache, a results store or saved aggregates without creating reports or graphs')
+    parse_parser.add_argument('--store', default=None, metavar='PATH', help='write the results of all replay files to a SQLite results store at PATH, see store.py')
+    parse_parser.add_argument('--instrument', default=None, metavar='PATH', help='profile the parsed replay files and write the report as JSON to PATH, see analysis.py --instrument')
+    parse_parser.add_argument('--save-aggregates', default=None, metavar='PATH', help='write the running sums of all skill levels as JSON to PATH')
+    report_parser = subparsers.add_parser('report', parents=[common_parser], help='write the reports of all replay files, four CSV files per replay or consolidated files with --bulk-report')
+    report_parser.add_argument('--bulk-report', action='store_true', help='write the reports into a few consolidated files in output/bulk, also in streaming mode')
+    report_parser.add_argument('--report-format', choices=REPORT_FORMATS, default='csv', help='file format of the consolidated reports, parquet requires pyarrow')
+    graph_parser = subparsers.add_parser('graph', parents=[common_parser], help='visualise the averages of all skill levels')
+    graph_parser.add_argument('--merge-aggregates', nargs='+', default=[], metavar='PATH', help='merge the running sums saved by other runs into the averages before visualising them')
+    graph_parser.add_argument('--from-aggregates', action='store_true', help='only visualise the aggregates of --merge-aggregates, no replay file is parsed')
+    graph_parser.add_argument('--headless', action='store_true', help='save the graphs to the output/graphs directory instead of showing them')
+    graph_parser.add_argument('--graph-formats', nargs='+', default=['png'], help='file formats of the saved graphs, e.g. png svg pdf')
+    graph_parser.add_argument('--render-workers', type=int, default=1, help='number of worker processes rendering the saved graphs')
+    graph_parser.add_argument('--heatmaps', action='store_true', help='save the action heatmaps of all skill levels to the output/heatmaps directory, see heatmap.py')
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent
+    start = time.time()
+    if args.command == 'parse':
+        store = ResultsStore(args.store) if args.store is not None else None
+        analyses = run_analyses(args, parse_parser, store, instrument=args.instrument is not None)
+        if store is not None:
+            store.close()
+        if args.instrument is not None:
+            analyses.write_instrumentation_report(args.instrument)
+        if args.save_aggregates is not None:
+            analyses.save_aggregates(args.save_aggregates)
+        print(f'Parsed the replay files in {time.time() - start} seconds')
+    elif args.command == 'report':
+        if args.streaming and not args.bulk_report:
+            report_parser.error('the per-replay reports are not available in streaming mode, use --bulk-report')
+        report_writer = BulkReportWriter(str((base_path / 'output' / 'bulk').resolve()), args.report_format) if args.bulk_report else None
+        analyses = run_analyses(args, report_parser, report_writer=report_writer)
+        if report_writer is not None:
+            report_writer.close()
+        else:
+            analyses.create_analyses_report()
+    else:
+        if args.heatmaps and args.metrics is not None and 'heatmap' not in args.metrics:
+            graph_parser.error('--heatmaps requires the metric heatmap')
+        if args.from_aggregates:
+            if len(args.merge_aggregates) == 0:
+                graph_parser.error('--from-aggregates requires the saved aggregates of --merge-aggregates')
+            if args.heatmaps:
+                graph_parser.error('heatmaps are not part of the saved aggregates, render them with heatmap.py')
+            analyses = load_aggregates(args.merge_aggregates, BucketConfig(args.intervals, args.slot), args.metrics)
+        else:
+            analyses = run_analyses(args, graph_parser)
+            [analyses.merge_aggregates(filename) for filename in args.merge_aggregates]
+        if args.heatmaps:
+            analyses.save_heatmaps(str((base_path / 'output' / 'heatmaps').resolve()), args.graph_formats)
+        graph_directory = str((base_path / 'output' / 'graphs').resolve()) if args.headless else None
+        analyses.output_results(graph_directory, args.graph_formats, args.render_workers)
@@ -0,0 +1,205 @@
+import os
+import typing
+import argparse
+import numpy as np
+from player import MOVE_ACTION, UNIT_ACTIONS
+
+HEATMAP_RESOLUTION = 64 # cells per axis
+FRAMES = ('map', 'start') # absolute coordinates relative to the map size, offsets from the starting position relative to the map size
+ACTION_KINDS = ('move', 'unit', 'other') # move actions, attack moves, patrols, formations and attack ground actions, all other actions with coordinates (e.g. buildings)
+
+class PlayerHeatmap():
+    """This class holds the binned actions of a single player sparsely, i.e. the flat indices of the non-empty cells of Heatmap.counts and their counts. It is small enough to be sent between processes and to be cached together with player.PlayerResult.
+    """
+    def __init__(self, interval: int, resolution: int, indices: np.ndarray, values: np.ndarray):
+        self.interval = interval
+        self.resolution = resolution
+        self.indices = indices
+        self.values = values
+
+def create_player_heatmap(actions: typing.Dict[str, np.ndarray], map_dimensions: int, starting_position: typing.Tuple[float, float], interval: int = 120, resolution: int = HEATMAP_RESOLUTION) -> PlayerHeatmap:
+    """Bins the actions of a player into the cells of all frames, see Heatmap. The actions are binned with a single bincount, there is no loop over the actions.
+
+    Args:
+        actions (typing.Dict[str, np.ndarray]): the action columns, see player.ActionStore.get_columns()
+        map_dimensions (int): the map size in tiles
+        starting_position (typing.Tuple[float, float]): the starting position of the player
+        interval (int, optional): bucket length in seconds. Defaults to 120.
+        resolution (int, optional): number of cells per axis. Defaults to HEATMAP_RESOLUTION.
+
+    Returns:
+        PlayerHeatmap: the binned actions
+    """
+    if len(actions['x']) == 0 or map_dimensions <= 0:
+        return PlayerHeatmap(interval, resolution, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32))
+    kinds = np.full(len(actions['action']), ACTION_KINDS.index('other'), dtype=np.int64)
+    kinds[actions['action'] == MOVE_ACTION] = ACTION_KINDS.index('move')
+    kinds[np.isin(actions['action'], UNIT_ACTIONS)] = ACTION_KINDS.index('unit')
+    buckets = -(-actions['timestamp'].astype(np.int64) // interval)
+
+    normalised_coordinates = [(actions['x'] / map_dimensions, actions['y'] / map_dimensions),
+        ((actions['x'] - starting_position[0]) / (2 * map_dimensions) + 0.5, (actions['y'] - starting_position[1]) / (2 * map_dimensions) + 0.5)]
+    indices = []
+    for frame_index, (x, y) in enumerate(normalised_coordinates):
+        cells_x = np.clip((x * resolution).astype(np.int64), 0, resolution - 1)
+        cells_y = np.clip((y * resolution).astype(np.int64), 0, resolution - 1)
+        indices.append((((buckets * len(FRAMES) + frame_index) * len(ACTION_KINDS) + kinds) * resolution + cells_y) * resolution + cells_x)
+    counts = np.bincount(np.concatenate(indices))
+    cells = np.flatnonzero(counts)
+    return PlayerHeatmap(interval, resolution, cells.astype(np.int32), counts[cells].astype(np.int32))
+
+class Heatmap():
+    """This class holds the number of actions of several players binned into a grid of resolution x resolution cells for every frame (see FRAMES), action kind (see ACTION_KINDS) and bucket, i.e. the counts have the shape (buckets, frames, kinds, resolution, resolution).
+    Bucket i holds the actions with a timestamp in (interval * (i - 1), interval * i]. In frame 'map', the coordinates are divided by the map size, i.e. the grid covers the whole map. In frame 'start', the offsets from the starting position are divided by the map size, i.e. the grid covers twice the map size centered on the starting position.
+    Heatmaps of players, replays and skill levels are merged by adding their counts.
+    """
+    def __init__(self, interval: int = 120, resolution: int = HEATMAP_RESOLUTION):
+        """Constructor
+
+        Args:
+            interval (int, optional): bucket length in seconds. Defaults to 120.
+            resolution (int, optional): number of cells per axis. Defaults to HEATMAP_RESOLUTION.
+        """
+        self.interval = interval
+        self.resolution = resolution
+        self.player_count = 0
+        self.counts = np.zeros((0, len(FRAMES), len(ACTION_KINDS), resolution, resolution), dtype=np.int64)
+
+    def add_player(self, player_heatmap: PlayerHeatmap) -> None:
+        """Adds the binned actions of a player, the player is counted once
+
+        Args:
+            player_heatmap (PlayerHeatmap): the binned actions, see create_player_heatmap()
+        """
+        self.check_compatibility(player_heatmap)
+        self.player_count += 1
+        if len(player_heatmap.indices) == 0:
+            return
+        self.resize(int(player_heatmap.indices[-1]) // (len(FRAMES) * len(ACTION_KINDS) * self.resolution * self.resolution) + 1)
+        self.counts.reshape(-1)[player_heatmap.indices] += player_heatmap.values # flat indices do not depend on the number of buckets
+
+    def merge(self, other: 'Heatmap') -> None:
+        """Adds the counts and players of another heatmap, e.g. of another run
+
+        Args:
+            other (Heatmap): the other heatmap
+        """
+        self.check_compatibility(other)
+        self.resize(len(other.counts))
+        self.counts[:len(other.counts)] += other.counts
+        self.player_count += other.player_count
+
+    def check_compatibility(self, other: typing.Union['Heatmap', PlayerHeatmap]) -> None:
+        if (other.interval, other.resolution) != (self.interval, self.resolution):
+            raise ValueError(f'cannot add a heatmap with interval {other.interval} and resolution {other.resolution} to a heatmap with interval {self.interval} and resolution {self.resolution}')
+
+    def resize(self, bucket_count: int) -> None:
+        if bucket_count > len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros((bucket_count - len(self.counts),) + self.counts.shape[1:], dtype=self.counts.dtype)])
+
+    def get_timestamps(self) -> list[int]:
+        return [index * self.interval for index in range(len(self.counts))]
+
+    def get_grid(self, frame: str = 'map', kinds: typing.Sequence[str] = ACTION_KINDS, start: typing.Optional[int] = None, end: typing.Optional[int] = None, per_player: bool = True) -> np.ndarray:
+        """Gets the grid of a frame summed up over the given action kinds and buckets
+
+        Args:
+            frame (str, optional): one of FRAMES. Defaults to 'map'.
+            kinds (typing.Sequence[str], optional): the action kinds, see ACTION_KINDS. Defaults to ACTION_KINDS.
+            start (typing.Optional[int], optional): first bucket timestamp in seconds. Defaults to None, i.e. the first bucket.
+            end (typing.Optional[int], optional): last bucket timestamp in seconds. Defaults to None, i.e. the last bucket.
+            per_player (bool, optional): whether the counts are divided by the number of players. Defaults to True.
+
+        Returns:
+            np.ndarray: the grid of shape (resolution, resolution), indexed by [y, x]
+        """
+        first_bucket = 0 if start is None else -(-start // self.interval)
+        last_bucket = len(self.counts) - 1 if end is None else end // self.interval
+        counts = self.counts[first_bucket:last_bucket + 1, FRAMES.index(frame), [ACTION_KINDS.index(kind) for kind in kinds]]
+        grid = counts.sum(axis=(0, 1)).astype(np.float64)
+        if per_player and self.player_count > 0:
+            grid /= self.player_count
+        return grid
+
+def write_heatmaps(filename: str, heatmaps: typing.Dict[str, Heatmap]) -> None:
+    """Writes heatmaps, e.g. of all skill levels, to a compressed NumPy archive
+
+    Args:
+        filename (str): path of the .npz file
+        heatmaps (typing.Dict[str, Heatmap]): the heatmaps mapped by name
+    """
+    arrays = {}
+    for name, heatmap in heatmaps.items():
+        arrays[f'{name}.counts'] = heatmap.counts
+        arrays[f'{name}.meta'] = np.array([heatmap.interval, heatmap.resolution, heatmap.player_count])
+    np.savez_compressed(filename, **arrays)
+
+def read_heatmaps(filename: str) -> typing.Dict[str, Heatmap]:
+    """Reads heatmaps written by write_heatmaps()
+
+    Args:
+        filename (str): path of the .npz file
+
+    Returns:
+        typing.Dict[str, Heatmap]: the heatmaps mapped by name
+    """
+    heatmaps = {}
+    with np.load(filename) as arrays:
+        for key in arrays.files:
+            name, array = key.rsplit('.', 1)
+            if array != 'meta':
+                continue
+            interval, resolution, player_count = arrays[key].tolist()
+            heatmaps[name] = Heatmap(interval, resolution)
+            heatmaps[name].player_count = player_count
+            heatmaps[name].counts = arrays[f'{name}.counts']
+    return heatmaps
+
+def render_heatmaps(heatmaps: typing.Dict[str, Heatmap], filename: str, frame: str = 'map', kinds: typing.Sequence[str] = ACTION_KINDS, start: typing.Optional[int] = None, end: typing.Optional[int] = None) -> None:
+    """Renders the heatmaps side by side with a shared logarithmic color scale, i.e. the average number of actions per player and cell
+
+    Args:
+        heatmaps (typing.Dict[str, Heatmap]): the heatmaps mapped by name, e.g. by skill level
+        filename (str): path of the image, its extension determines the format
+        frame (str, optional): one of FRAMES. Defaults to 'map'.
+        kinds (typing.Sequence[str], optional): the action kinds, see ACTION_KINDS. Defaults to ACTION_KINDS.
+        start (typing.Optional[int], optional): first bucket timestamp in seconds. Defaults to None.
+        end (typing.Optional[int], optional): last bucket timestamp in seconds. Defaults to None.
+    """
+    # matplotlib is only loaded when rendering, binning and merging do not need it
+    from matplotlib.colors import LogNorm
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    grids = {name: heatmap.get_grid(frame, kinds, start, end) for name, heatmap in heatmaps.items()}
+    positive_values = [grid[grid > 0] for grid in grids.values() if np.any(grid > 0)]
+    norm = LogNorm(min(values.min() for values in positive_values), max(values.max() for values in positive_values)) if len(positive_values) > 0 else None
+    extent = (0, 1, 0, 1) if frame == 'map' else (-1, 1, -1, 1)
+
+    figure = Figure(figsize=(4 * max(len(grids), 1), 4.4))
+    FigureCanvasAgg(figure)
+    axes = figure.subplots(1, max(len(grids), 1), squeeze=False)[0]
+    image = None
+    for ax, (name, grid) in zip(axes, grids.items()):
+        image = ax.imshow(np.ma.masked_equal(grid, 0), origin='lower', extent=extent, cmap='inferno', norm=norm)
+        ax.set_title(f'{name} ({heatmaps[name].player_count} players)')
+        ax.set_xlabel('x / map size' if frame == 'map' else 'x offset from start / map size')
+        if frame == 'start':
+            ax.plot(0, 0, marker='+', color='cyan')
+    if image is not None:
+        figure.colorbar(image, ax=list(axes), label='actions per player')
+    period = f', {start or 0}-{end} s' if end is not None else (f', from {start} s' if start is not None else '')
+    figure.suptitle(f'Actions ({", ".join(kinds)}), frame {frame}{period}')
+    figure.savefig(filename)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Renders heatmaps of the action coordinates saved by analysis.py --heatmaps.')
+    parser.add_argument('heatmaps', help='path of the .npz file holding the heatmaps of all skill levels')
+    parser.add_argument('--output', default='heatmap.png', help='path of the image')
+    parser.add_argument('--frame', choices=FRAMES, default='map', help='map: coordinates relative to the map size, start: offsets from the starting position relative to the map size')
+    parser.add_argument('--kinds', nargs='+', choices=ACTION_KINDS, default=list(ACTION_KINDS), help='action kinds to include')
+    parser.add_argument('--start', type=int, default=None, help='first bucket timestamp in seconds')
+    parser.add_argument('--end', type=int, default=None, help='last bucket timestamp in seconds')
+    args = parser.parse_args()
+
+    render_heatmaps(read_heatmaps(args.heatmaps), args.output, args.frame, args.kinds, args.start, args.end)
+    print(f'Saved heatmaps to {os.path.abspath(args.output)}')
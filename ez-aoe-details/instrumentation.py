@@ -0,0 +1,97 @@
+import json
+import time
+import typing
+from mgz import fast
+
+class Instrumentation():
+    """This class collects opt-in profiling data of analyses, i.e. the number of operations and actions by type and the cumulative time of timed sections. Sections are e.g. 'header' (parsing the replay header), 'decode' (fast.operation), 'handler.MOVE' (the handler of move actions) or 'bucket' (calculating the player states of a bucket).
+    Analyses without instrumentation do not call any of its methods, i.e. disabled instrumentation adds no overhead. Instances of several replays can be merged into the report of a run.
+    """
+    def __init__(self):
+        self.operations = {}
+        self.actions = {}
+        self.sections = {}
+
+    def add_time(self, section: str, seconds: float, calls: int = 1) -> None:
+        """Adds time to a section
+
+        Args:
+            section (str): section name, e.g. 'header'
+            seconds (float): time spent in the section
+            calls (int, optional): number of calls the time was spent in. Defaults to 1.
+        """
+        totals = self.sections.get(section)
+        if totals is None:
+            self.sections[section] = [calls, seconds]
+        else:
+            totals[0] += calls
+            totals[1] += seconds
+
+    def read_operation(self, data: typing.BinaryIO) -> typing.Tuple[fast.Operation, any]:
+        """Decodes the next operation with fast.operation, counts it by type and adds the decoding time to the 'decode' section
+
+        Args:
+            data (typing.BinaryIO): the replay file positioned at the operation
+
+        Returns:
+            typing.Tuple[fast.Operation, any]: the operation, see fast.operation
+        """
+        start = time.perf_counter()
+        operation = fast.operation(data)
+        self.add_time('decode', time.perf_counter() - start)
+        name = operation[0].name
+        self.operations[name] = self.operations.get(name, 0) + 1
+        if operation[0] == fast.Operation.ACTION:
+            name = operation[1][0].name if isinstance(operation[1][0], fast.Action) else str(operation[1][0])
+            self.actions[name] = self.actions.get(name, 0) + 1
+        return operation
+
+    def time_section(self, section: str, function: typing.Callable) -> typing.Callable:
+        """Wraps a function so that every call adds to the time of a section
+
+        Args:
+            section (str): section name
+            function (typing.Callable): the function
+
+        Returns:
+            typing.Callable: the timed function
+        """
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.add_time(section, time.perf_counter() - start)
+            return result
+        return timed_function
+
+    def merge(self, other: 'Instrumentation') -> None:
+        """Adds the counts and times of another instance, e.g. of another replay
+
+        Args:
+            other (Instrumentation): the other instance
+        """
+        for name, count in other.operations.items():
+            self.operations[name] = self.operations.get(name, 0) + count
+        for name, count in other.actions.items():
+            self.actions[name] = self.actions.get(name, 0) + count
+        for section, (calls, seconds) in other.sections.items():
+            self.add_time(section, seconds, calls)
+
+    def get_report(self) -> typing.Dict[str, any]:
+        """Gets the collected data, sections are sorted by their cumulative time
+
+        Returns:
+            typing.Dict[str, any]: e.g. {'operations': {'ACTION': 53112, 'SYNC': 40410}, 'actions': {'MOVE': 12001}, 'sections': {'decode': {'calls': 93522, 'seconds': 1.52, 'seconds_per_call': 1.6e-05}}}
+        """
+        sections = {section: {'calls': calls, 'seconds': seconds, 'seconds_per_call': seconds / calls if calls > 0 else 0} for section, (calls, seconds) in sorted(self.sections.items(), key=lambda item: -item[1][1])}
+        return {'operations': dict(sorted(self.operations.items(), key=lambda item: -item[1])), 'actions': dict(sorted(self.actions.items(), key=lambda item: -item[1])), 'sections': sections}
+
+def write_report(filename: str, replays: typing.Dict[str, Instrumentation], run: Instrumentation) -> None:
+    """Writes the instrumentation reports of all replays and the whole run as JSON
+
+    Args:
+        filename (str): path of the JSON file
+        replays (typing.Dict[str, Instrumentation]): instrumentation of every replay mapped by replay file
+        run (Instrumentation): merged instrumentation of the run
+    """
+    with open(filename, 'w', encoding='UTF8') as file:
+        json.dump({'run': run.get_report(), 'replays': {replayfile: instrumentation.get_report() for replayfile, instrumentation in replays.items()}}, file, indent=1)
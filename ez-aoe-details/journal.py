@@ -0,0 +1,73 @@
+import os
+import json
+import typing
+
+class RunJournal():
+    """This class holds an append-only journal of the replay files of a batch run, one JSON line per completed or failed replay file. Every line is flushed right away, i.e. the journal survives an interrupted run. The results of completed replay files are restored from the analysis cache when the run is resumed, failed replay files are skipped unless they have changed since.
+    """
+    def __init__(self, path: str, retry_failed: bool = False):
+        """Constructor, reads the entries of previous runs
+
+        Args:
+            path (str): path of the journal file
+            retry_failed (bool, optional): whether replay files which have failed in a previous run are analysed again. Defaults to False.
+        """
+        self.path = path
+        self.completed = {}
+        self.failed = {}
+        if os.path.exists(path):
+            with open(path, encoding='UTF8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError: # last line of an interrupted run
+                        continue
+                    if entry['status'] == 'completed':
+                        self.completed[entry['replayfile']] = entry
+                        self.failed.pop(entry['replayfile'], None)
+                    else:
+                        self.failed[entry['replayfile']] = entry
+                        self.completed.pop(entry['replayfile'], None)
+        if retry_failed:
+            self.failed = {}
+        self.file = open(path, 'a', encoding='UTF8')
+        if self.file.tell() > 0:
+            with open(path, 'rb') as file:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    self.file.write('\n') # terminate the last line of an interrupted run
+
+    def get_version(self, replayfile: str) -> typing.Tuple[int, int]:
+        stat = os.stat(replayfile)
+        return stat.st_size, stat.st_mtime_ns
+
+    def add_entry(self, replayfile: str, status: str, **values) -> None:
+        size, mtime = self.get_version(replayfile)
+        entry = dict(values, replayfile=replayfile, status=status, size=size, mtime=mtime)
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+        (self.completed if status == 'completed' else self.failed)[replayfile] = entry
+        (self.failed if status == 'completed' else self.completed).pop(replayfile, None)
+
+    def add_completed(self, replayfile: str) -> None:
+        self.add_entry(replayfile, 'completed')
+
+    def add_failure(self, replayfile: str, error: str) -> None:
+        self.add_entry(replayfile, 'failed', error=error)
+
+    def get_failure(self, replayfile: str) -> typing.Optional[str]:
+        """Gets the error of a replay file which failed in a previous run and has not changed since
+
+        Args:
+            replayfile (str): path of the replay file
+
+        Returns:
+            typing.Optional[str]: the error or None if the replay file has not failed
+        """
+        entry = self.failed.get(replayfile)
+        if entry is None or (entry['size'], entry['mtime']) != self.get_version(replayfile):
+            return None
+        return entry['error']
+
+    def close(self) -> None:
+        self.file.close()
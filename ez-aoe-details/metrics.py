@@ -0,0 +1,127 @@
+import math
+import typing
+from mgz import fast
+from player import STATE_METRICS
+from units import MainType, FilterType, BuildingType, Technology
+
+MOVEMENT_ACTIONS = (fast.Action.TOWN_BELL, fast.Action.PATROL, fast.Action.FORMATION, fast.Action.DE_ATTACK_MOVE, fast.Action.MOVE, fast.Action.ATTACK_GROUND)
+ATTACK_ACTIONS = (fast.Action.DE_ATTACK_MOVE, fast.Action.PATROL, fast.Action.FORMATION, fast.Action.ATTACK_GROUND) # see player.UNIT_ACTIONS
+BUILD_ACTIONS = (fast.Action.BUILD, fast.Action.WALL)
+PLAYER_ACTIONS = (fast.Action.DE_QUEUE, fast.Action.RESEARCH) + BUILD_ACTIONS + MOVEMENT_ACTIONS # action types handled by analysis.Analysis itself
+AGGREGATIONS = ('mean', 'sum')
+METRICS = {} # all metrics by name in the order of their registration, see register_metric()
+
+class Metric():
+    """This class declares a metric, i.e. the action types it consumes, the values it records and how they are aggregated over the players of a skill level and visualised. The parse loop of analysis.Analysis only runs the work of the selected metrics, all of them in one pass over the operations.
+    Built-in metrics record the columns of player.STATE_METRICS for every timestamp and/or a per-player result (eAPM, technology research times, average action coordinates). Additional metrics record a single value per player with a handler, see register_metric().
+    """
+    def __init__(self, name: str, actions: typing.Sequence[fast.Action], aggregation: str = 'mean', state: typing.Sequence[typing.Tuple[FilterType, any]] = (), result: typing.Optional[FilterType] = None, coordinates: typing.Sequence[fast.Action] = (), charts: typing.Sequence[typing.Dict[str, any]] = (), value: typing.Optional[typing.Callable[[typing.Dict[FilterType, typing.Dict[any, float]]], float]] = None, handler: typing.Optional[typing.Callable[[any, int, typing.Dict[str, any], fast.Action], None]] = None):
+        """Constructor
+
+        Args:
+            name (str): unique name, e.g. used by analysis.py --metrics
+            actions (typing.Sequence[fast.Action]): the action types the metric consumes
+            aggregation (str, optional): how the values of the players are aggregated, mean (based on the players who reached a timestamp respectively all players) or sum. Defaults to 'mean'.
+            state (typing.Sequence[typing.Tuple[FilterType, any]], optional): the columns of player.STATE_METRICS recorded for every timestamp. Defaults to ().
+            result (typing.Optional[FilterType], optional): the per-player result of a built-in metric, i.e. the key of analysis.MultipleAnalyses.average_results. Defaults to None.
+            coordinates (typing.Sequence[fast.Action], optional): the consumed action types whose coordinates are recorded. Defaults to ().
+            charts (typing.Sequence[typing.Dict[str, any]], optional): the charts of the metric, e.g. {'name': 'walls_built', 'figure': 10, 'title': 'Average Walls Built'}, charts of timestamp metrics may add the technologies drawn into them, e.g. 'technologies': (MainType.ECO, [Technology.LOOM]). Defaults to ().
+            value (typing.Optional[typing.Callable[[typing.Dict[FilterType, typing.Dict[any, float]]], float]], optional): derives the charted value from the average state of a timestamp. Defaults to None, i.e. the single state column.
+            handler (typing.Optional[typing.Callable[[analysis.Analysis, int, typing.Dict[str, any], fast.Action], None]], optional): records the value of the player with player.Player.add_metric_value(), called like the handlers of analysis.register_action_handler(). Defaults to None.
+        """
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f'unknown aggregation {aggregation}, expected one of {", ".join(AGGREGATIONS)}')
+        if any(action not in actions for action in coordinates):
+            raise ValueError(f'metric {name} records the coordinates of action types it does not consume')
+        self.name = name
+        self.actions = tuple(actions)
+        self.aggregation = aggregation
+        self.state = tuple(state)
+        self.result = result
+        self.coordinates = tuple(coordinates)
+        self.charts = tuple(charts)
+        self.value = value
+        self.handler = handler
+
+    def get_value(self, entries: typing.Dict[FilterType, typing.Dict[any, float]]) -> float:
+        """Gets the charted value of the average state of a timestamp, see analysis.MultipleAnalyses.average_timestamp_results
+
+        Args:
+            entries (typing.Dict[FilterType, typing.Dict[any, float]]): the average state
+
+        Returns:
+            float: the value
+        """
+        if self.value is not None:
+            return self.value(entries)
+        key, value_key = self.state[0]
+        return entries[key][value_key]
+
+def get_distance(key: FilterType) -> typing.Callable[[typing.Dict[FilterType, typing.Dict[any, float]]], float]:
+    def distance(entries: typing.Dict[FilterType, typing.Dict[any, float]]) -> float:
+        return math.sqrt(math.pow(entries[key]['x'], 2) + math.pow(entries[key]['y'], 2))
+    return distance
+
+def register_metric(metric: Metric) -> None:
+    """Registers a metric. Metrics registered at import time are available in worker processes as well. The columns of player.STATE_METRICS are all recorded by the built-in metrics, i.e. additional metrics record a single value per player with a handler and are visualised as bar chart.
+    Analyses recording a metric with a handler do not load trace files, see analysis.Analysis.start().
+
+    Args:
+        metric (Metric): the metric
+
+    Raises:
+        ValueError: if the name is taken or a state column is unknown or already recorded by another metric
+    """
+    if metric.name in METRICS:
+        raise ValueError(f'a metric named {metric.name} is already registered')
+    recorded_columns = {column for registered_metric in METRICS.values() for column in registered_metric.state}
+    for column in metric.state:
+        if column not in STATE_METRICS or column in recorded_columns:
+            raise ValueError(f'metric {metric.name} cannot record {column}, the state columns are fixed and recorded once, see player.STATE_METRICS')
+    METRICS[metric.name] = metric
+
+def get_metrics(names: typing.Optional[typing.Iterable[str]] = None) -> list[Metric]:
+    """Gets the metrics of the given names in the order of their registration
+
+    Args:
+        names (typing.Optional[typing.Iterable[str]], optional): the metric names. Defaults to None, i.e. all registered metrics.
+
+    Raises:
+        ValueError: if a metric is not registered
+
+    Returns:
+        list[Metric]: the metrics
+    """
+    if names is None:
+        return list(METRICS.values())
+    names = set(names)
+    unknown_names = names - METRICS.keys()
+    if len(unknown_names) > 0:
+        raise ValueError(f'unknown metrics {", ".join(sorted(unknown_names))}, expected some of {", ".join(METRICS)}')
+    return [metric for name, metric in METRICS.items() if name in names]
+
+for metric in (
+    Metric('villagers', (fast.Action.DE_QUEUE,), state=[(FilterType.UNITS, MainType.ECO)], charts=[
+        {'name': 'villagers_ages', 'figure': 1, 'title': 'Average Villager Count', 'technologies': (MainType.ECO, [Technology.FEUDAL_AGE, Technology.CASTLE_AGE, Technology.IMPERIAL_AGE])},
+        {'name': 'villagers_tech', 'figure': 2, 'title': 'Average Villager Count', 'technologies': (MainType.ECO, [Technology.HAND_CART, Technology.WHEELBARROW, Technology.LOOM])}]),
+    Metric('military', (fast.Action.DE_QUEUE,), state=[(FilterType.UNITS, MainType.MIL)], charts=[
+        {'name': 'military_units', 'figure': 3, 'title': 'Average Military Count', 'technologies': (MainType.MIL, [Technology.FLETCHING, Technology.FORGING, Technology.BALLISTICS])}]),
+    Metric('military_buildings', BUILD_ACTIONS, state=[(FilterType.BUILDINGS, MainType.MIL)], charts=[{'name': 'military_buildings', 'figure': 4, 'title': 'Average Military Buildings'}]),
+    Metric('eco_buildings', BUILD_ACTIONS, state=[(FilterType.BUILDINGS, MainType.ECO)], charts=[{'name': 'eco_buildings', 'figure': 5, 'title': 'Average Eco Buildings'}]),
+    Metric('walls', BUILD_ACTIONS, state=[(FilterType.BUILDINGS, BuildingType.WALL)], charts=[{'name': 'walls_built', 'figure': 10, 'title': 'Average Walls Built'}]),
+    Metric('eAPM', PLAYER_ACTIONS, result=FilterType.EAPM, charts=[{'name': 'eAPM_activity', 'figure': 6, 'title': 'Average eAPM Activity'}]),
+    # the first town center of a nomad player sets the starting position the distances are based on
+    Metric('move_distance', (fast.Action.MOVE, fast.Action.BUILD), state=[(FilterType.ACTION_MOVE_COORDINATES, 'x'), (FilterType.ACTION_MOVE_COORDINATES, 'y')], result=FilterType.ACTION_MOVE_COORDINATES, coordinates=(fast.Action.MOVE,),
+        charts=[{'name': 'moving_actions', 'figure': 7, 'title': 'Distance of Moving Actions from Starting TC in Game'}], value=get_distance(FilterType.ACTION_MOVE_COORDINATES)),
+    Metric('move_count', (fast.Action.MOVE,), 'sum', state=[(FilterType.ACTION_MOVE_COORDINATES, 'count')], coordinates=(fast.Action.MOVE,)),
+    Metric('attack_distance', ATTACK_ACTIONS + (fast.Action.BUILD,), state=[(FilterType.ACTION_UNIT_COORDINATES, 'x'), (FilterType.ACTION_UNIT_COORDINATES, 'y')], result=FilterType.ACTION_UNIT_COORDINATES, coordinates=ATTACK_ACTIONS,
+        charts=[{'name': 'attacking_actions', 'figure': 8, 'title': 'Distance of Attacking Actions from Starting TC in Game'}], value=get_distance(FilterType.ACTION_UNIT_COORDINATES)),
+    Metric('attack_count', ATTACK_ACTIONS, 'sum', state=[(FilterType.ACTION_UNIT_COORDINATES, 'count')], coordinates=ATTACK_ACTIONS,
+        charts=[{'name': 'occurence_attacking_actions', 'figure': 9, 'title': 'Occurence of Attacking Actions in Game'}]),
+    Metric('technologies', (fast.Action.RESEARCH,), result=FilterType.TECHNOLOGIES),
+    # all actions with coordinates are binned, see heatmap.py
+    Metric('heatmap', PLAYER_ACTIONS, 'sum', coordinates=PLAYER_ACTIONS),
+):
+    register_metric(metric)
+BUILTIN_METRICS = tuple(METRICS) # names of the metrics recorded by default
+SUMMED_METRICS = sorted(STATE_METRICS.index(column) for metric in METRICS.values() if metric.aggregation == 'sum' for column in metric.state) # indices of the state columns which are summed up instead of averaged
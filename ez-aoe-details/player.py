@@ -1,22 +1,195 @@
 import typing
-from units import UNIT_IDS, BUILDING_IDS, TECHNOLOGY_IDS, MainType, UnitType, FilterType, Technology, Building, BuildingType
+import collections.abc
+import numpy as np
+from array import array
+from units import UNIT_COUNTERS, UNIT_COUNTER_INDEX, BUILDING_COUNTERS, BUILDING_COUNTER_INDEX, TECHNOLOGY_COUNTERS, TECHNOLOGY_COUNTER_INDEX, Action, MainType, UnitType, FilterType, Technology, Building, BuildingType
 from mgz import fast
+from bucketing import BucketConfig, DEFAULT_BUCKETS
+
+NO_ACTION = -1 # action code of actions without movement type, e.g. building
+MOVE_ACTION = fast.Action.MOVE.value
+UNIT_ACTIONS = (fast.Action.DE_ATTACK_MOVE.value, fast.Action.PATROL.value, fast.Action.FORMATION.value, fast.Action.ATTACK_GROUND.value)
+# metrics of a player state in the order of a BucketStates row
+STATE_METRICS = ((FilterType.UNITS, MainType.ECO), (FilterType.UNITS, MainType.MIL),
+    (FilterType.BUILDINGS, MainType.ECO), (FilterType.BUILDINGS, MainType.MIL), (FilterType.BUILDINGS, BuildingType.WALL),
+    (FilterType.ACTION_MOVE_COORDINATES, 'x'), (FilterType.ACTION_MOVE_COORDINATES, 'y'), (FilterType.ACTION_MOVE_COORDINATES, 'count'),
+    (FilterType.ACTION_UNIT_COORDINATES, 'x'), (FilterType.ACTION_UNIT_COORDINATES, 'y'), (FilterType.ACTION_UNIT_COORDINATES, 'count'))
+INTEGER_METRICS = frozenset(index for index, (_, key) in enumerate(STATE_METRICS) if key not in ('x', 'y')) # counts are returned as int
+UNIT_TYPES = (MainType.ECO,) + tuple(UnitType)
+TECHNOLOGY_TYPES = (MainType.ECO, MainType.MIL)
+BUILDING_TYPES = (MainType.ECO, MainType.MIL, BuildingType.WALL)
+NOT_RESEARCHED = -1 # research time of technologies which have not been researched
+
+def get_counter_ranges(counters: list[typing.Tuple[Action, Action]], types: typing.Sequence[Action]) -> typing.Dict[Action, range]:
+    """Gets the contiguous counter indices of every category, see units.create_counter_index()
+
+    Args:
+        counters (list[typing.Tuple[Action, Action]]): the category and entry of every counter
+        types (typing.Sequence[Action]): all categories, categories without counters get an empty range
+
+    Returns:
+        typing.Dict[Action, range]: the counter indices of every category, e.g. {MainType.ECO: range(0, 1), UnitType.INFANTRY: range(1, 14)}
+    """
+    ranges = {}
+    for type in types:
+        indices = [index for index, (counter_type, _) in enumerate(counters) if counter_type == type]
+        ranges[type] = range(indices[0], indices[-1] + 1) if len(indices) > 0 else range(0)
+    return ranges
+
+UNIT_RANGES = get_counter_ranges(UNIT_COUNTERS, UNIT_TYPES)
+TECHNOLOGY_RANGES = get_counter_ranges(TECHNOLOGY_COUNTERS, TECHNOLOGY_TYPES)
+BUILDING_RANGES = get_counter_ranges(BUILDING_COUNTERS, BUILDING_TYPES)
+
+def create_counter_view(counts: array, counters: list[typing.Tuple[Action, Action]], ranges: typing.Dict[Action, range], empty: int = 0) -> typing.Dict[Action, typing.Dict[Action, int]]:
+    """Creates the nested dict of dense counts, e.g. {Economy: {Villager: 72}, Infantry: {}, Cavalary: {Scout: 3, Knight: 43}}. Entries with the empty value are left out.
+
+    Args:
+        counts (array): the counts indexed by counter, see units.create_counter_index()
+        counters (list[typing.Tuple[Action, Action]]): the category and entry of every counter
+        ranges (typing.Dict[Action, range]): the counter indices of every category, see get_counter_ranges()
+        empty (int, optional): the value of counters which have not been set. Defaults to 0.
+
+    Returns:
+        typing.Dict[Action, typing.Dict[Action, int]]: the counts by category and entry
+    """
+    return {type: {counters[index][1]: counts[index] for index in indices if counts[index] != empty} for type, indices in ranges.items()}
+
+class BucketStates:
+    """This class holds the states of a player for all timestamps of a bucket interval in a fixed layout, i.e. one row of STATE_METRICS values per timestamp in a flat array of doubles instead of a nested dict per timestamp.
+    """
+    __slots__ = ('timestamps', 'values')
+
+    def __init__(self):
+        self.timestamps = array('i')
+        self.values = array('d')
+
+    def set_state(self, timestamp: int, values: typing.Sequence[float]) -> None:
+        """Sets the state of a timestamp, timestamps are added in ascending order. The state of the last timestamp is replaced if it is set again.
+
+        Args:
+            timestamp (int): timestamp in seconds
+            values (typing.Sequence[float]): the values in the order of STATE_METRICS
+        """
+        if len(self.timestamps) > 0 and self.timestamps[-1] == timestamp:
+            self.values[-len(STATE_METRICS):] = array('d', values)
+            return
+        self.timestamps.append(timestamp)
+        self.values.extend(values)
+
+    def get_row(self, index: int) -> typing.Dict[FilterType, typing.Dict[any, float]]:
+        """Gets the state of the timestamp at the given position in the nested layout, e.g. {FilterType.UNITS: {MainType.ECO: 5, MainType.MIL: 0}, FilterType.BUILDINGS: {MainType.ECO: 1, MainType.MIL: 0, BuildingType.WALL: 0}, FilterType.ACTION_MOVE_COORDINATES: {'x': 3.5, 'y': 7.0, 'count': 12}, FilterType.ACTION_UNIT_COORDINATES: {'x': 0.0, 'y': 0.0, 'count': 0}}
+
+        Args:
+            index (int): position of the timestamp
+
+        Returns:
+            typing.Dict[FilterType, typing.Dict[any, float]]: the state
+        """
+        start = index * len(STATE_METRICS)
+        state = {}
+        for metric_index, ((key, value_key), value) in enumerate(zip(STATE_METRICS, self.values[start:start + len(STATE_METRICS)])):
+            state.setdefault(key, {})[value_key] = int(value) if metric_index in INTEGER_METRICS else value
+        return state
+
+    def get_matrix(self) -> typing.Tuple[list[int], np.ndarray]:
+        """Gets the timestamps and the states as an array of shape (timestamps, metrics), see STATE_METRICS
+
+        Returns:
+            typing.Tuple[list[int], np.ndarray]: the timestamps and the states
+        """
+        return self.timestamps.tolist(), np.array(self.values, dtype=np.float64).reshape(-1, len(STATE_METRICS))
+
+class StateView(collections.abc.Mapping):
+    """This class is a read-only view of BucketStates which maps every timestamp to its state in the nested layout, see BucketStates.get_row(). The nested dicts are created on access and not kept.
+    """
+    __slots__ = ('states',)
+
+    def __init__(self, states: BucketStates):
+        self.states = states
+
+    def __getitem__(self, timestamp: int) -> typing.Dict[FilterType, typing.Dict[any, float]]:
+        try:
+            index = self.states.timestamps.index(timestamp)
+        except ValueError:
+            raise KeyError(timestamp) from None
+        return self.states.get_row(index)
+
+    def __iter__(self) -> typing.Iterator[int]:
+        return iter(self.states.timestamps)
+
+    def __len__(self) -> int:
+        return len(self.states.timestamps)
+
+    def items(self) -> typing.Iterator[typing.Tuple[int, typing.Dict[FilterType, typing.Dict[any, float]]]]:
+        return ((timestamp, self.states.get_row(index)) for index, timestamp in enumerate(self.states.timestamps))
+
+    def values(self) -> typing.Iterator[typing.Dict[FilterType, typing.Dict[any, float]]]:
+        return (self.states.get_row(index) for index in range(len(self.states.timestamps)))
+
+class ActionStore:
+    """This class stores the actions of a player column-wise in NumPy arrays, i.e. x and y coordinates, timestamp and action code (fast.Action value). The arrays grow by doubling their capacity.
+    """
+    __slots__ = ('count', 'x', 'y', 'timestamps', 'actions')
+
+    def __init__(self, capacity: int = 1024):
+        self.count = 0
+        self.x = np.empty(capacity, dtype=np.float64)
+        self.y = np.empty(capacity, dtype=np.float64)
+        self.timestamps = np.empty(capacity, dtype=np.int32)
+        self.actions = np.empty(capacity, dtype=np.int16)
+
+    def append(self, x: float, y: float, timestamp: int, action: int) -> None:
+        if self.count == len(self.x):
+            self.grow()
+        index = self.count
+        self.x[index] = x
+        self.y[index] = y
+        self.timestamps[index] = timestamp
+        self.actions[index] = action
+        self.count += 1
+
+    def grow(self) -> None:
+        capacity = 2 * len(self.x)
+        for column in ('x', 'y', 'timestamps', 'actions'):
+            values = getattr(self, column)
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self.count] = values[:self.count]
+            setattr(self, column, grown)
+
+    def get_columns(self) -> typing.Dict[str, np.ndarray]:
+        """Gets views of all stored actions, e.g. {'x': array([17.5, ...]), 'y': array([24.1, ...]), 'timestamp': array([60, ...]), 'action': array([3, ...])}
+
+        Returns:
+            typing.Dict[str, np.ndarray]: the action columns
+        """
+        return {'x': self.x[:self.count], 'y': self.y[:self.count], 'timestamp': self.timestamps[:self.count], 'action': self.actions[:self.count]}
+
+    def __len__(self) -> int:
+        return self.count
+
 class Player:
     """This class contains all the necessary information for a player.
     In particular: buildings built, military queued, villagers queued and actions.
+    Units, buildings and technologies are held in dense arrays indexed by units.UNIT_COUNTERS, units.BUILDING_COUNTERS and units.TECHNOLOGY_COUNTERS, the states of every bucket interval in BucketStates. The getters return nested dicts created from them.
     """
-    def __init__(self, id: int, starting_position: typing.Tuple[float, float]=(0, 0)):
+    __slots__ = ('id', 'buckets', 'unit_counts', 'technology_times', 'building_counts', 'unknown_ids', 'eAPM', 'gameduration', 'state_for_intervals', 'actions', 'action_coordinates', 'starting_position', 'heatmap', 'metric_values')
+
+    def __init__(self, id: int, starting_position: typing.Tuple[float, float]=(0, 0), buckets: BucketConfig = DEFAULT_BUCKETS):
         self.id = id
-        self.units = {MainType.ECO: {}}
-        for type in UnitType:
-            self.units[type] = {}
-        self.technologies = {MainType.ECO: {}, MainType.MIL: {}}
-        self.buildings = {MainType.ECO: {}, MainType.MIL: {}, BuildingType.WALL: {}}
+        self.buckets = buckets
+        self.unit_counts = array('I', [0]) * len(UNIT_COUNTERS)
+        self.technology_times = array('i', [NOT_RESEARCHED]) * len(TECHNOLOGY_COUNTERS)
+        self.building_counts = array('I', [0]) * len(BUILDING_COUNTERS)
+        self.unknown_ids = {FilterType.UNITS: {}, FilterType.BUILDINGS: {}, FilterType.TECHNOLOGIES: {}} # occurences of ids missing in units.*_IDS
         self.eAPM = 0
         self.gameduration = -1
-        self.state_for_timestamps = {0: {FilterType.UNITS: {MainType.ECO: 0, MainType.MIL: 0}, FilterType.BUILDINGS: {MainType.ECO: 0, MainType.MIL: 0, BuildingType.WALL: 0}, FilterType.ACTION_MOVE_COORDINATES: {'x': 0, 'y': 0}}}
-        self.actions = []
+        self.state_for_intervals = {interval: BucketStates() for interval in buckets.intervals}
+        [states.set_state(0, [0] * len(STATE_METRICS)) for states in self.state_for_intervals.values()]
+        self.actions = ActionStore()
+        self.action_coordinates = {} # running coordinate sums of the actions not yet part of a closed timestamp window, keyed by slot timestamp: [move x, move y, move count, unit x, unit y, unit count]
         self.starting_position = starting_position
+        self.heatmap = None
+        self.metric_values = {} # values of additional metrics, see metrics.register_metric()
 
     def get_all_unit_count(self) -> int:
         """Returns the unit count based on type, e.g. {Economy: 72, Infantry: 1, Cavalary: 46, Archer: 17, Monk: 4, Siege: 17}
@@ -24,13 +197,10 @@ class Player:
         Returns:
             dict: containing all UNIT_IDS keys + corresponding unit count
         """
-        count = {}
-        for key, value in self.units.items():
-            count[key] = sum(value.values())
-        return count
+        return {type: sum(self.unit_counts[indices.start:indices.stop]) for type, indices in UNIT_RANGES.items()}
 
     def get_units(self) -> typing.Dict[MainType, typing.Dict[str, int]]:
-        return self.units
+        return create_counter_view(self.unit_counts, UNIT_COUNTERS, UNIT_RANGES)
     
     def add_unit(self, unit: int) -> None:
         """Adds a queued unit id to the corresponding unit id count
@@ -38,67 +208,73 @@ class Player:
         Args:
             unit (int): unit id
         """
-        for type, units in UNIT_IDS.items():
-            if unit in units:
-                unit = units[unit]
-                self.units[type][unit] = self.units[type].get(unit, 0) + 1
-                return
-        print(f'unknown unit id: {unit}')
+        index = UNIT_COUNTER_INDEX.get(unit)
+        if index is None:
+            self.add_unknown_id(FilterType.UNITS, unit)
+            return
+        self.unit_counts[index] += 1
 
-    def calculate_state_for_timestamp(self, timestamp: int):
+    def add_unknown_id(self, type: FilterType, id: int) -> None:
+        """Counts an id which is not part of units.UNIT_IDS, units.BUILDING_IDS or units.TECHNOLOGY_IDS
+
+        Args:
+            type (FilterType): FilterType.UNITS, FilterType.BUILDINGS or FilterType.TECHNOLOGIES
+            id (int): the unknown id
+        """
+        self.unknown_ids[type][id] = self.unknown_ids[type].get(id, 0) + 1
+
+    def get_unknown_ids(self) -> typing.Dict[FilterType, typing.Dict[int, int]]:
+        return self.unknown_ids
+
+    def calculate_state_for_timestamp(self, timestamp: int, intervals: typing.Optional[list[int]] = None):
         """Calculates all relevant information, i.e. military buildings and player actions, for a specific timestamp. The values are added to a dictionary holding all timestamp results.
         See get_state_for_timestamp(self) for an overview regarding the added value.
 
         Args:
             timestamp (int): the relevant timestamp 
+            intervals (typing.Optional[list[int]], optional): the bucket intervals the state is calculated for, see bucketing.BucketConfig. Defaults to None, i.e. the primary interval.
         """
         # calculate unit and building counts
-        vil_count = sum(self.units[MainType.ECO].values())
-        mil_count = 0
-        for type, unit in self.units.items():
-            if type != MainType.ECO:
-                mil_count += sum(unit.values())
-
-        eco_building_count = sum(self.buildings[MainType.ECO].values())
-        mil_building_count = sum(self.buildings[MainType.MIL].values())
-        wall_count = sum(self.buildings[BuildingType.WALL].values())
-
-        # calculate average action coordinates
-        action_move_coordinates = {'x': 0, 'y': 0, 'count': 0}
-        action_unit_coordinates = {'x': 0, 'y': 0, 'count': 0}
-        for action in self.actions:
-            if action['timestamp'] > timestamp - 120 and action['timestamp'] < timestamp: # 120 == update every two min
-                if action['action'] == fast.Action.MOVE:
-                    action_move_coordinates['x'] += abs(self.starting_position[0] - action['x'])
-                    action_move_coordinates['y'] += abs(self.starting_position[1] - action['y'])
-                    action_move_coordinates['count'] += 1
-                elif action['action'] == fast.Action.DE_ATTACK_MOVE or fast.Action.PATROL == action['action'] or fast.Action.FORMATION == action['action'] or fast.Action.ATTACK_GROUND == action['action']:
-                    action_unit_coordinates['x'] += abs(self.starting_position[0] - action['x'])
-                    action_unit_coordinates['y'] += abs(self.starting_position[1] - action['y'])
-                    action_unit_coordinates['count'] += 1    
-  
-        # average based on occurence of actions
-        if action_move_coordinates['count'] > 0:
-            action_move_coordinates['x'] /= action_move_coordinates['count']
-            action_move_coordinates['y'] /= action_move_coordinates['count']
-
-        if action_unit_coordinates['count'] > 0:
-            action_unit_coordinates['x'] /= action_unit_coordinates['count']
-            action_unit_coordinates['y'] /= action_unit_coordinates['count']     
-
-        self.state_for_timestamps[timestamp] = {
-            FilterType.UNITS: {MainType.ECO: vil_count, MainType.MIL: mil_count}, 
-            FilterType.BUILDINGS: {MainType.ECO: eco_building_count, MainType.MIL: mil_building_count, BuildingType.WALL: wall_count}, 
-            FilterType.ACTION_MOVE_COORDINATES: action_move_coordinates,
-            FilterType.ACTION_UNIT_COORDINATES: action_unit_coordinates}
-
-    def get_state_for_timestamps(self) -> typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, int]]]:
+        eco_units = UNIT_RANGES[MainType.ECO]
+        vil_count = sum(self.unit_counts[eco_units.start:eco_units.stop])
+        mil_count = sum(self.unit_counts) - vil_count
+        building_counts = [sum(self.building_counts[indices.start:indices.stop]) for indices in BUILDING_RANGES.values()] # eco, mil, wall
+
+        for interval in intervals or [self.buckets.primary_interval]:
+            # roll up the running sums of all slots inside the window
+            sums = [0, 0, 0, 0, 0, 0]
+            for slot_timestamp in self.buckets.get_window_slots(timestamp, interval):
+                coordinates = self.action_coordinates.get(slot_timestamp)
+                if coordinates is None:
+                    continue
+                for index in range(6):
+                    sums[index] += coordinates[index]
+
+            # average based on occurence of actions
+            for offset in (0, 3):
+                if sums[offset + 2] > 0:
+                    sums[offset] /= sums[offset + 2]
+                    sums[offset + 1] /= sums[offset + 2]
+
+            self.state_for_intervals[interval].set_state(timestamp, [vil_count, mil_count, *building_counts, *sums])
+
+        # sums outside of the largest window are not needed anymore
+        for slot_timestamp in [slot_timestamp for slot_timestamp in self.action_coordinates if slot_timestamp <= timestamp - self.buckets.max_interval]:
+            del self.action_coordinates[slot_timestamp]
+
+    def get_state_for_timestamps(self, interval: typing.Optional[int] = None) -> typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, int]]]:
         """Gets the state for all timestamps, e.g. {0: {FilterType.UNITS: {MainType.ECO: 0, MainType.MIL: 0}, FilterType.BUILDINGS: {MainType.ECO: 0, MainType.MIL: 0}, FilterType.ACTION_MOVE_COORDINATES: {'x': 0, 'y': 0, count: 0}, FilterType.ACTION_UNIT_COORDINATES: {'x': 0, 'y': 0, count: 0}}}
 
+        Args:
+            interval (typing.Optional[int], optional): the bucket interval. Defaults to None, i.e. the primary interval.
+
         Returns:
-            typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, int]]]: state for all timestamps
+            typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, int]]]: state for all timestamps, a read-only StateView
         """
-        return self.state_for_timestamps
+        return StateView(self.get_bucket_states(interval))
+
+    def get_bucket_states(self, interval: typing.Optional[int] = None) -> BucketStates:
+        return self.state_for_intervals[self.buckets.primary_interval if interval is None else interval]
 
     def get_technologies_for_type(self, type: MainType) -> typing.Dict[Technology, int]:
         """Gets all technologies for a specific type, i.e. MainType.ECO and MainType.MIL
@@ -109,9 +285,7 @@ class Player:
         Returns:
             typing.Dict[Technology, int]: all technologies for a given type
         """
-        if type in self.technologies:
-            return self.technologies[type]
-        return {}
+        return self.get_technologies().get(type, {})
 
     def get_technologies(self) -> typing.Dict[MainType, typing.Dict[Technology, int]]:
         """Gets all technologies with their corresponding timestamps
@@ -119,7 +293,7 @@ class Player:
         Returns:
             typing.Dict[MainType, typing.Dict[Technology, int]]: all technologies
         """
-        return self.technologies
+        return create_counter_view(self.technology_times, TECHNOLOGY_COUNTERS, TECHNOLOGY_RANGES, NOT_RESEARCHED)
 
     def add_technology(self, technology: str, time: int):
         """Adds a technology with its corresponding research time
@@ -128,11 +302,11 @@ class Player:
             technology (str): technology id
             time (int): time
         """
-        for type, technologies in TECHNOLOGY_IDS.items():
-            if technology in technologies:
-                technology = technologies[technology]
-                self.technologies[type][technology] = time
-                return
+        index = TECHNOLOGY_COUNTER_INDEX.get(technology)
+        if index is None:
+            self.add_unknown_id(FilterType.TECHNOLOGIES, technology)
+            return
+        self.technology_times[index] = time
 
     def set_starting_position(self, starting_position: typing.Tuple[int, int]):
         """Sets the starting position of the player, required if the game is started in nomad
@@ -141,6 +315,12 @@ class Player:
             starting_position (typing.Tuple[int, int]): TC starting position 
         """
         self.starting_position = starting_position
+        # the running sums depend on the starting position -> recalculate the sums of the open windows
+        pending_timestamps = list(self.action_coordinates)
+        self.action_coordinates = {}
+        actions = self.actions.get_columns()
+        mask = np.isin(actions['timestamp'], pending_timestamps)
+        [self.add_action_coordinates(*action) for action in zip(actions['x'][mask].tolist(), actions['y'][mask].tolist(), actions['timestamp'][mask].tolist(), actions['action'][mask].tolist())]
 
     def get_starting_position(self) -> typing.Tuple[int, int]:
         return self.starting_position
@@ -151,19 +331,17 @@ class Player:
         Args:
             building_id (int): building id
         """
-        for type, buildings in BUILDING_IDS.items():
-            if building_id in buildings:
-                building = buildings[building_id]
-                self.buildings[type][building] = self.buildings[type].get(building, 0) + 1
-                return
+        index = BUILDING_COUNTER_INDEX.get(building_id)
+        if index is None:
+            self.add_unknown_id(FilterType.BUILDINGS, building_id)
+            return
+        self.building_counts[index] += 1
 
     def get_buildings_for_type(self, type: str) -> typing.Dict[str, int]:
-        if type in self.buildings:
-            return self.buildings[type]
-        return {}
+        return self.get_buildings().get(type, {})
     
     def get_buildings(self) -> typing.Dict[MainType, typing.Dict[Building, int]]:
-        return self.buildings
+        return create_counter_view(self.building_counts, BUILDING_COUNTERS, BUILDING_RANGES)
 
     def increase_eAPM(self) -> None:
         self.eAPM += 1
@@ -174,35 +352,161 @@ class Player:
     def get_average_eAPM(self) -> float:
         return self.eAPM / self.gameduration
 
-    def add_action(self, action: typing.Dict[str, any]):
-        self.actions.append(action)
+    def add_action(self, x: float, y: float, timestamp: int, action: fast.Action = NO_ACTION):
+        """Adds an action with its coordinates
+
+        Args:
+            x (float): x coordinate
+            y (float): y coordinate
+            timestamp (int): timestamp in seconds
+            action (fast.Action, optional): action type. Defaults to NO_ACTION.
+        """
+        action = action.value if isinstance(action, fast.Action) else action
+        self.actions.append(x, y, timestamp, action)
+        self.add_action_coordinates(x, y, timestamp, action)
+
+    def add_action_coordinates(self, x: float, y: float, timestamp: int, action: int) -> None:
+        """Adds the distance of a moving or attacking action from the starting position to the running sums of its timestamp, see calculate_state_for_timestamp(self, timestamp).
+
+        Args:
+            x (float): x coordinate
+            y (float): y coordinate
+            timestamp (int): timestamp in seconds
+            action (int): action code
+        """
+        if action == MOVE_ACTION:
+            offset = 0
+        elif action in UNIT_ACTIONS:
+            offset = 3
+        else:
+            return
+        coordinates = self.action_coordinates.get(timestamp)
+        if coordinates is None:
+            coordinates = self.action_coordinates[timestamp] = [0, 0, 0, 0, 0, 0]
+        coordinates[offset] += abs(self.starting_position[0] - x)
+        coordinates[offset + 1] += abs(self.starting_position[1] - y)
+        coordinates[offset + 2] += 1
+
+    def set_heatmap(self, heatmap: any) -> None:
+        """Sets the binned actions of the player once all actions have been added
+
+        Args:
+            heatmap (any): the heatmap.PlayerHeatmap
+        """
+        self.heatmap = heatmap
+
+    def get_heatmap(self) -> any:
+        return self.heatmap
+
+    def add_metric_value(self, name: str, value: float) -> None:
+        """Adds to the value of an additional metric, see metrics.register_metric()
+
+        Args:
+            name (str): the metric name
+            value (float): the value added, e.g. 1 to count an action
+        """
+        self.metric_values[name] = self.metric_values.get(name, 0) + value
 
-    def get_actions(self) -> list[typing.Dict[str, float]]:
-        return self.actions
+    def get_metric_values(self) -> typing.Dict[str, float]:
+        return self.metric_values
+
+    def get_actions(self) -> typing.Dict[str, np.ndarray]:
+        """Gets all actions column-wise, see ActionStore.get_columns(self)
+
+        Returns:
+            typing.Dict[str, np.ndarray]: the action columns
+        """
+        return self.actions.get_columns()
 
     def get_average_action_coordinates(self) -> typing.Tuple[float, float]:
-        return self.get_average_coordinates(self.actions)
+        return self.get_average_coordinates()
 
     def get_average_move_action_coordinates(self) -> typing.Tuple[float, float]:
-        filtered_actions = [action for action in self.actions if fast.Action.MOVE == action['action']]
-        return self.get_average_coordinates(filtered_actions)
+        return self.get_average_coordinates(self.actions.get_columns()['action'] == MOVE_ACTION)
 
     def get_average_unit_coordinates(self) -> typing.Tuple[float, float]:
-        filtered_actions = [action for action in self.actions if fast.Action.DE_ATTACK_MOVE == action['action'] or fast.Action.PATROL == action['action'] or fast.Action.FORMATION == action['action'] or fast.Action.ATTACK_GROUND == action['action']]
-        return self.get_average_coordinates(filtered_actions)
+        return self.get_average_coordinates(np.isin(self.actions.get_columns()['action'], UNIT_ACTIONS))
 
-    def get_average_coordinates(self, actions: list[typing.Dict[str, any]]) -> typing.Tuple[float, float]:
-        """Gets the average coordinates for all actions passed as parameter
+    def get_average_coordinates(self, mask: typing.Optional[np.ndarray] = None) -> typing.Tuple[float, float]:
+        """Gets the average distance from the starting position for all actions selected by the mask
 
         Args:
-            actions (list[typing.Dict[str, any]]): the action containing x and y coordinates
+            mask (typing.Optional[np.ndarray], optional): boolean mask selecting the actions. Defaults to None, i.e. all actions.
 
         Returns:
             typing.Tuple[float, float]: the average x and y action location
         """
-        actions_count = len(actions)
-        if actions_count == 0:
+        actions = self.actions.get_columns()
+        x, y = actions['x'], actions['y']
+        if mask is not None:
+            x, y = x[mask], y[mask]
+        if len(x) == 0:
             return (0, 0)
-        average_x = sum(abs(self.starting_position[0] - action['x']) for action in actions) / actions_count
-        average_y = sum(abs(self.starting_position[1] - action['y']) for action in actions) / actions_count
+        average_x = float(np.abs(self.starting_position[0] - x).mean())
+        average_y = float(np.abs(self.starting_position[1] - y).mean())
         return (average_x, average_y)
+
+    def get_result(self) -> 'PlayerResult':
+        """Creates a compact snapshot of the player results which does not contain the recorded actions.
+
+        Returns:
+            PlayerResult: the player results
+        """
+        return PlayerResult(self.id, self.starting_position, self.unit_counts, self.technology_times, self.building_counts, self.eAPM, self.gameduration, self.state_for_intervals, self.buckets.primary_interval, self.get_average_move_action_coordinates(), self.get_average_unit_coordinates(), self.unknown_ids, self.heatmap, self.metric_values)
+
+class PlayerResult:
+    """This class holds the results of a player.Player without the recorded actions. It is small enough to be sent between processes and offers the same getters as player.Player used for averaging and CSV generation.
+    """
+    __slots__ = ('id', 'starting_position', 'unit_counts', 'technology_times', 'building_counts', 'eAPM', 'gameduration', 'state_for_intervals', 'primary_interval', 'average_move_action_coordinates', 'average_unit_coordinates', 'unknown_ids', 'heatmap', 'metric_values')
+
+    def __init__(self, id: int, starting_position: typing.Tuple[float, float], unit_counts: array, technology_times: array, building_counts: array, eAPM: int, gameduration: int, state_for_intervals: typing.Dict[int, BucketStates], primary_interval: int, average_move_action_coordinates: typing.Tuple[float, float], average_unit_coordinates: typing.Tuple[float, float], unknown_ids: typing.Dict[FilterType, typing.Dict[int, int]], heatmap: any = None, metric_values: typing.Optional[typing.Dict[str, float]] = None):
+        self.id = id
+        self.starting_position = starting_position
+        self.unit_counts = unit_counts
+        self.technology_times = technology_times
+        self.building_counts = building_counts
+        self.eAPM = eAPM
+        self.gameduration = gameduration
+        self.state_for_intervals = state_for_intervals
+        self.primary_interval = primary_interval
+        self.average_move_action_coordinates = average_move_action_coordinates
+        self.average_unit_coordinates = average_unit_coordinates
+        self.unknown_ids = unknown_ids
+        self.heatmap = heatmap
+        self.metric_values = metric_values or {}
+
+    def get_units(self) -> typing.Dict[MainType, typing.Dict[str, int]]:
+        return create_counter_view(self.unit_counts, UNIT_COUNTERS, UNIT_RANGES)
+
+    def get_technologies(self) -> typing.Dict[MainType, typing.Dict[Technology, int]]:
+        return create_counter_view(self.technology_times, TECHNOLOGY_COUNTERS, TECHNOLOGY_RANGES, NOT_RESEARCHED)
+
+    def get_buildings(self) -> typing.Dict[MainType, typing.Dict[Building, int]]:
+        return create_counter_view(self.building_counts, BUILDING_COUNTERS, BUILDING_RANGES)
+
+    def get_state_for_timestamps(self, interval: typing.Optional[int] = None) -> typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, int]]]:
+        return StateView(self.get_bucket_states(interval))
+
+    def get_bucket_states(self, interval: typing.Optional[int] = None) -> BucketStates:
+        return self.state_for_intervals[self.primary_interval if interval is None else interval]
+
+    def get_starting_position(self) -> typing.Tuple[float, float]:
+        return self.starting_position
+
+    def get_average_eAPM(self) -> float:
+        return self.eAPM / self.gameduration
+
+    def get_average_move_action_coordinates(self) -> typing.Tuple[float, float]:
+        return self.average_move_action_coordinates
+
+    def get_average_unit_coordinates(self) -> typing.Tuple[float, float]:
+        return self.average_unit_coordinates
+
+    def get_unknown_ids(self) -> typing.Dict[FilterType, typing.Dict[int, int]]:
+        return self.unknown_ids
+
+    def get_heatmap(self) -> any:
+        return self.heatmap
+
+    def get_metric_values(self) -> typing.Dict[str, float]:
+        return self.metric_values
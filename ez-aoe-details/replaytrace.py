@@ -0,0 +1,95 @@
+import os
+import json
+import struct
+import typing
+import numpy as np
+
+TRACE_MAGIC = b'AOETRACE'
+TRACE_VERSION = 2
+TRACE_PREAMBLE = struct.Struct('<8sII') # magic, version, length of the JSON header
+TRACE_DTYPE = np.dtype([('action', '<i2'), ('player_id', '<i2'), ('id', '<i4'), ('x', '<f4'), ('y', '<f4')])
+SYNC_RECORD = -1 # action value of records holding a SYNC operation, the id holds the time increment in ms
+
+class TraceWriter():
+    """This class writes the relevant operations of a replay to a compact binary trace file. The trace file consists of a preamble, a JSON header holding the game metadata and fixed size records (see TRACE_DTYPE):
+    * SYNC operations: action SYNC_RECORD, id holds the time increment in ms
+    * actions: action holds the fast.Action value, player_id the player id of the action (-1 if not present), id the unit, technology or building id (-1 if not present), x and y the coordinates (NaN if not present)
+    The records start at an offset aligned to 8 bytes, i.e. they can be memory-mapped, see TraceReader.
+    """
+    def __init__(self, path: str, flush_size: int = 65536):
+        self.path = path
+        self.flush_size = flush_size
+        self.records = []
+        self.temporary_path = f'{path}.{os.getpid()}.tmp' # processes writing the trace of the same replay do not interfere
+        self.file = open(self.temporary_path, 'wb')
+
+    def write_header(self, metadata: typing.Dict[str, any]) -> None:
+        """Writes the game metadata, has to be called before any record is added
+
+        Args:
+            metadata (typing.Dict[str, any]): JSON serialisable metadata, e.g. {'map_dimensions': 120, 'players': [[1, [45.5, 110.5]], [2, None]], 'player_id': 2}, player_id is the player the movement actions before the first queue, research or build action are attributed to
+        """
+        header = json.dumps(metadata).encode('UTF8')
+        header += b' ' * (-(TRACE_PREAMBLE.size + len(header)) % 8) # align records
+        self.file.write(TRACE_PREAMBLE.pack(TRACE_MAGIC, TRACE_VERSION, len(header)))
+        self.file.write(header)
+
+    def add_sync(self, increment: int) -> None:
+        self.add_record((SYNC_RECORD, -1, increment, np.nan, np.nan))
+
+    def add_action(self, action: int, player_id: int, id: int, x: float = np.nan, y: float = np.nan) -> None:
+        self.add_record((action, player_id, id, x, y))
+
+    def add_record(self, record: typing.Tuple[int, int, int, float, float]) -> None:
+        self.records.append(record)
+        if len(self.records) >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        np.array(self.records, dtype=TRACE_DTYPE).tofile(self.file)
+        self.records = []
+
+    def close(self) -> None:
+        """Writes all remaining records, the trace file is only visible at its final path once it is complete
+        """
+        self.flush()
+        self.file.close()
+        os.replace(self.temporary_path, self.path)
+
+    def discard(self) -> None:
+        self.file.close()
+        os.remove(self.temporary_path)
+
+class TraceReader():
+    """This class reads a trace file written by TraceWriter. The records are memory-mapped, i.e. they are not copied when the trace is loaded.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            magic, version, header_length = TRACE_PREAMBLE.unpack(file.read(TRACE_PREAMBLE.size))
+            if magic != TRACE_MAGIC or version != TRACE_VERSION:
+                raise ValueError(f'{path} is not a trace file of version {TRACE_VERSION}')
+            self.metadata = json.loads(file.read(header_length))
+        offset = TRACE_PREAMBLE.size + header_length
+        if os.path.getsize(path) > offset:
+            self.records = np.memmap(path, dtype=TRACE_DTYPE, mode='r', offset=offset)
+        else:
+            self.records = np.empty(0, dtype=TRACE_DTYPE)
+
+    def get_metadata(self) -> typing.Dict[str, any]:
+        return self.metadata
+
+    def get_records(self) -> np.ndarray:
+        return self.records
+
+    def iterate_records(self, chunk_size: int = 65536) -> typing.Iterator[typing.Tuple[int, int, int, float, float]]:
+        """Iterates over all records, only one chunk of records is converted to Python objects at a time
+
+        Args:
+            chunk_size (int, optional): number of records converted at once. Defaults to 65536.
+
+        Yields:
+            typing.Iterator[typing.Tuple[int, int, int, float, float]]: action, player_id, id, x and y of each record
+        """
+        for start in range(0, len(self.records), chunk_size):
+            yield from self.records[start:start + chunk_size].tolist()
@@ -0,0 +1,113 @@
+import os
+import csv
+import gzip
+from units import MainType, FilterType, TECHNOLOGY_IDS, UNIT_IDS
+
+REPORT_FORMATS = ('csv', 'csv.gz', 'parquet')
+UNIT_COLUMNS = [str(unit) for unit in dict.fromkeys(unit for units in UNIT_IDS.values() for unit in units.values())]
+TECHNOLOGY_COLUMNS = [str(technology) for technology in dict.fromkeys(technology for technologies in TECHNOLOGY_IDS.values() for technology in technologies.values())]
+HEADERS = {
+    'units': ['replay', 'player'] + UNIT_COLUMNS,
+    'technologies': ['replay', 'player'] + TECHNOLOGY_COLUMNS,
+    'unit_timestamps': ['replay', 'player', 'timestamp', 'villagers', 'military']}
+
+class BulkReportWriter():
+    """This class writes the reports of all analyses into a few consolidated files instead of four CSV files per replay, see analysis.Analysis.create_analysis_report():
+    units (queued units per player), technologies (research times per player) and unit_timestamps (villagers and military units per player and timestamp). Every row starts with the replay file name and the player id.
+    Rows are buffered and written in chunks of `buffer_size` rows. CSV files are appended to, i.e. several runs can be written to the same directory. Parquet files require pyarrow and are rewritten per run.
+    """
+    def __init__(self, directory: str, format: str = 'csv', buffer_size: int = 4096):
+        """Constructor
+
+        Args:
+            directory (str): directory of the report files
+            format (str, optional): csv, csv.gz (gzip compressed CSV) or parquet (compressed columnar). Defaults to 'csv'.
+            buffer_size (int, optional): number of rows buffered per file. Defaults to 4096.
+        """
+        if format not in REPORT_FORMATS:
+            raise ValueError(f'unknown report format {format}, expected one of {", ".join(REPORT_FORMATS)}')
+        self.directory = directory
+        self.format = format
+        self.buffer_size = buffer_size
+        self.rows = {name: [] for name in HEADERS}
+        self.files = {}
+        self.writers = {}
+        self.schemas = {}
+        if format == 'parquet':
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError as error:
+                raise ImportError('report format parquet requires pyarrow: pip3 install pyarrow') from error
+            self.pyarrow = pyarrow
+        os.makedirs(directory, exist_ok=True)
+
+    def add_analysis(self, analysis: any) -> None:
+        """Adds the reports of a finished analysis
+
+        Args:
+            analysis (any): the analysis.Analysis, its players may be player.PlayerResult
+        """
+        replay = os.path.basename(analysis.replayfile)
+        for player_id, player in analysis.get_players().items():
+            units = {str(unit): count for units_for_type in player.get_units().values() for unit, count in units_for_type.items()}
+            self.rows['units'].append([replay, player_id] + [units.get(column, 0) for column in UNIT_COLUMNS])
+            technologies = {str(technology): seconds for technologies_for_type in player.get_technologies().values() for technology, seconds in technologies_for_type.items()}
+            self.rows['technologies'].append([replay, player_id] + [technologies.get(column) for column in TECHNOLOGY_COLUMNS])
+            for timestamp, state in player.get_state_for_timestamps().items():
+                self.rows['unit_timestamps'].append([replay, player_id, timestamp, state[FilterType.UNITS][MainType.ECO], state[FilterType.UNITS][MainType.MIL]])
+        for name, rows in self.rows.items():
+            if len(rows) >= self.buffer_size:
+                self.write_rows(name)
+
+    def write_rows(self, name: str) -> None:
+        """Writes the buffered rows of a report file, the file is opened on the first write
+
+        Args:
+            name (str): name of the report file, see HEADERS
+        """
+        rows = self.rows[name]
+        if len(rows) == 0:
+            return
+        if name not in self.writers:
+            self.open_file(name)
+        if self.format == 'parquet':
+            columns = list(zip(*rows))
+            self.writers[name].write_table(self.pyarrow.table({column: list(values) for column, values in zip(HEADERS[name], columns)}, schema=self.schemas[name]))
+        else:
+            self.writers[name].writerows(rows)
+        self.rows[name] = []
+
+    def open_file(self, name: str) -> None:
+        filename = f'{self.directory}/{name}.{self.format}'
+        if self.format == 'parquet':
+            import pyarrow.parquet
+            types = {'replay': self.pyarrow.string(), 'player': self.pyarrow.int32(), 'timestamp': self.pyarrow.int32()}
+            self.schemas[name] = self.pyarrow.schema([(column, types.get(column, self.pyarrow.int64())) for column in HEADERS[name]])
+            self.writers[name] = pyarrow.parquet.ParquetWriter(filename, self.schemas[name], compression='zstd')
+            return
+        write_header = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        if self.format == 'csv.gz':
+            file = gzip.open(filename, 'at', encoding='UTF8', newline='') # appended runs are separate gzip members
+        else:
+            file = open(filename, 'a', encoding='UTF8', newline='', buffering=1024 * 1024)
+        self.files[name] = file
+        self.writers[name] = csv.writer(file)
+        if write_header:
+            self.writers[name].writerow(HEADERS[name])
+
+    def flush(self) -> None:
+        """Writes all buffered rows to the report files
+        """
+        [self.write_rows(name) for name in self.rows]
+        [file.flush() for file in self.files.values()]
+
+    def close(self) -> None:
+        """Writes all buffered rows and closes the report files
+        """
+        self.flush()
+        if self.format == 'parquet':
+            [writer.close() for writer in self.writers.values()]
+        [file.close() for file in self.files.values()]
+        self.files = {}
+        self.writers = {}
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import typing
+import hashlib
+import argparse
+from pathlib import Path
+from analysis import MultipleAnalyses, ANALYZER_VERSION
+from aggregation import read_aggregates
+from bucketing import BucketConfig
+from cache import AnalysisCache
+from metrics import METRICS, get_metrics
+from triage import read_manifest
+from units import SkillLevel
+
+PLAN_FILENAME = 'plan.json'
+PARTIALS_DIRECTORY = 'partials'
+
+def list_replayfiles(paths_to_segmented_replayfiles: typing.Dict[SkillLevel, str]) -> list[typing.Dict[str, any]]:
+    """Lists the replay files of the given skill level directories in the structure of a manifest, see triage.create_manifest(). Only the skill level, the path and the file size are set.
+
+    Args:
+        paths_to_segmented_replayfiles (typing.Dict[SkillLevel, str]): directories of the replay files for each skill level
+
+    Returns:
+        list[typing.Dict[str, any]]: the replay files, sorted by skill level and path
+    """
+    manifest = []
+    for type, path in paths_to_segmented_replayfiles.items():
+        with os.scandir(path) as entries:
+            manifest.extend({'replayfile': f'{path}/{entry.name}', 'file_size': entry.stat().st_size, 'skill_level': type} for entry in sorted(entries, key=lambda entry: entry.name) if entry.is_file())
+    return manifest
+
+def split_manifest(manifest: list[typing.Dict[str, any]], shard_count: int) -> list[list[typing.Dict[str, str]]]:
+    """Splits a manifest into shards of about the same total file size, the parsing time of a replay file is roughly proportional to its size. The largest replay files are assigned first, each to the shard with the smallest total so far. The split only depends on the manifest, i.e. it is deterministic.
+
+    Args:
+        manifest (list[typing.Dict[str, any]]): the replay files, see triage.create_manifest()
+        shard_count (int): number of shards
+
+    Returns:
+        list[list[typing.Dict[str, str]]]: the skill level and path of the replay files of every shard, sorted by skill level and path
+    """
+    if shard_count <= 0:
+        raise ValueError('at least one shard is required')
+    shards = [[] for _ in range(shard_count)]
+    totals = [0] * shard_count
+    for entry in sorted(manifest, key=lambda entry: (-entry['file_size'], entry['replayfile'])):
+        index = min(range(shard_count), key=lambda index: (totals[index], index))
+        shards[index].append({'skill_level': entry['skill_level'], 'replayfile': entry['replayfile']})
+        totals[index] += entry['file_size']
+    return [sorted(shard, key=lambda entry: (entry['skill_level'], entry['replayfile'])) for shard in shards]
+
+def create_plan(manifest: list[typing.Dict[str, any]], shard_count: int, buckets: BucketConfig, metrics: typing.Optional[typing.Sequence[str]] = None) -> typing.Dict[str, any]:
+    """Creates the plan of a sharded run, i.e. the shards, the bucket configuration and the metrics all nodes use. The plan id identifies the partial results of the plan.
+
+    Args:
+        manifest (list[typing.Dict[str, any]]): the replay files, see triage.create_manifest()
+        shard_count (int): number of shards
+        buckets (BucketConfig): the bucket configuration
+        metrics (typing.Optional[typing.Sequence[str]], optional): names of the recorded metrics, see metrics.METRICS. Defaults to None, i.e. all metrics.
+
+    Returns:
+        typing.Dict[str, any]: the plan, e.g. {'id': '3f2a...', 'analyzer_version': 1, 'intervals': [120], 'slot': 60, 'metrics': ['villagers', 'eAPM'], 'skill_levels': ['pro', 'high'], 'shards': [[{'skill_level': 'pro', 'replayfile': '/mnt/replays/pro/AgeIIDE_Replay_165870265.aoe2record'}]]}
+    """
+    shards = split_manifest(manifest, shard_count)
+    plan = {'analyzer_version': ANALYZER_VERSION, 'intervals': buckets.intervals, 'slot': buckets.slot, 'metrics': [metric.name for metric in get_metrics(metrics)], 'skill_levels': list(dict.fromkeys(entry['skill_level'] for entry in manifest)), 'shards': shards}
+    plan['id'] = hashlib.sha256(json.dumps(plan, sort_keys=True).encode('UTF8')).hexdigest()
+    return plan
+
+def write_plan(plan: typing.Dict[str, any], work_directory: str) -> None:
+    os.makedirs(f'{work_directory}/{PARTIALS_DIRECTORY}', exist_ok=True)
+    with open(f'{work_directory}/{PLAN_FILENAME}', 'w', encoding='UTF8') as file:
+        json.dump(plan, file, indent=1)
+
+def read_plan(work_directory: str) -> typing.Dict[str, any]:
+    """Reads the plan of a work directory and checks that this node analyses the replay files like the plan requires
+
+    Args:
+        work_directory (str): work directory of the plan, see write_plan()
+
+    Raises:
+        ValueError: if the plan was written by another analyzer version or a metric of the plan is not registered on this node
+
+    Returns:
+        typing.Dict[str, any]: the plan, see create_plan()
+    """
+    with open(f'{work_directory}/{PLAN_FILENAME}', encoding='UTF8') as file:
+        plan = json.load(file)
+    if plan.get('analyzer_version') != ANALYZER_VERSION:
+        raise ValueError(f'the plan was written by analyzer version {plan.get("analyzer_version")}, expected version {ANALYZER_VERSION}, split the corpus again')
+    if 'metrics' not in plan:
+        raise ValueError('the plan does not record its metrics, split the corpus again')
+    get_metrics(plan['metrics']) # raises for metrics which are not registered
+    return plan
+
+def get_partial_path(work_directory: str, index: int) -> str:
+    return f'{work_directory}/{PARTIALS_DIRECTORY}/shard-{index:04d}.json'
+
+def run_shard(work_directory: str, index: int, workers: int = 1, cache: typing.Optional[AnalysisCache] = None, trace_directory: typing.Optional[str] = None) -> None:
+    """Analyses the replay files of a shard in streaming mode and saves the running sums as partial results. The partial results are written to a temporary file first, i.e. the merge never reads a half-written file.
+
+    Args:
+        work_directory (str): work directory of the plan, see write_plan()
+        index (int): index of the shard
+        workers (int, optional): number of worker processes parsing the replay files. Defaults to 1.
+        cache (typing.Optional[AnalysisCache], optional): cache of analysis results. Defaults to None.
+        trace_directory (typing.Optional[str], optional): directory holding the trace files. Defaults to None.
+    """
+    plan = read_plan(work_directory)
+    if not 0 <= index < len(plan['shards']):
+        raise ValueError(f'shard {index} does not exist, the plan has {len(plan["shards"])} shards')
+    replayfiles = {} # only the skill levels of the shard
+    [replayfiles.setdefault(entry['skill_level'], []).append(entry['replayfile']) for entry in plan['shards'][index]]
+    analyses = MultipleAnalyses({}, BucketConfig(plan['intervals'], plan['slot']), plan['metrics'])
+    analyses.set_replayfiles(replayfiles)
+    analyses.start_analyses(workers, cache, trace_directory, True)
+
+    partial_path = get_partial_path(work_directory, index)
+    temporary_path = f'{partial_path}.{os.getpid()}.tmp'
+    analyses.save_aggregates(temporary_path, {'plan': plan['id'], 'shard': index})
+    os.replace(temporary_path, partial_path)
+
+def merge_partials(work_directory: str) -> MultipleAnalyses:
+    """Merges the partial results of all shards of a plan
+
+    Args:
+        work_directory (str): work directory of the plan, see write_plan()
+
+    Returns:
+        MultipleAnalyses: holds the average results of the whole corpus, e.g. for MultipleAnalyses.output_results()
+    """
+    plan = read_plan(work_directory)
+    missing_shards = [index for index in range(len(plan['shards'])) if not os.path.exists(get_partial_path(work_directory, index))]
+    if len(missing_shards) > 0:
+        raise ValueError(f'the partial results of shards {", ".join(str(index) for index in missing_shards)} are missing')
+    analyses = MultipleAnalyses({}, BucketConfig(plan['intervals'], plan['slot']), plan['metrics'])
+    analyses.set_replayfiles({type: [] for type in plan['skill_levels']})
+    for index in range(len(plan['shards'])):
+        partial_path = get_partial_path(work_directory, index)
+        aggregates, metadata = read_aggregates(partial_path)
+        if metadata.get('plan') != plan['id'] or metadata.get('shard') != index:
+            raise ValueError(f'{partial_path} belongs to another plan, run shard {index} again')
+        analyses.add_aggregates(partial_path, aggregates, metadata)
+    analyses.update_merged_average_results() # once all partial results have been merged
+    return analyses
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Spreads the analysis of a replay corpus across several processes or machines sharing a work directory: split the corpus into shards, run every shard on its own node and merge the partial results.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    split_parser = subparsers.add_parser('split', help='split the corpus into shards and write the plan to the work directory')
+    split_parser.add_argument('--shards', type=int, required=True, help='number of shards')
+    split_parser.add_argument('--manifest', default=None, help='manifest of the corpus created by triage.py, defaults to all replay files of the skill level directories')
+    split_parser.add_argument('--intervals', type=int, nargs='+', default=[120], help='bucket intervals in seconds the player states are calculated for')
+    split_parser.add_argument('--slot', type=int, default=60, help='resolution of the recorded action timestamps in seconds')
+    split_parser.add_argument('--metrics', nargs='+', choices=list(METRICS), default=None, metavar='METRIC', help='only record, average and visualise the given metrics on all nodes, see analysis.py --metrics')
+    run_parser = subparsers.add_parser('run', help='analyse a shard and write its partial results to the work directory')
+    run_parser.add_argument('--shard', type=int, required=True, help='index of the shard, starting at 0')
+    run_parser.add_argument('--workers', type=int, default=1, help='number of worker processes parsing the replay files')
+    run_parser.add_argument('--no-cache', action='store_true', help='parse all replay files without using the analysis cache')
+    run_parser.add_argument('--traces', action='store_true', help='write and analyse trace files, see analysis.py --traces')
+    merge_parser = subparsers.add_parser('merge', help='merge the partial results of all shards and visualise them')
+    merge_parser.add_argument('--headless', action='store_true', help='save the graphs to the output/graphs directory instead of showing them')
+    merge_parser.add_argument('--graph-formats', nargs='+', default=['png'], help='file formats of the saved graphs')
+    merge_parser.add_argument('--save-aggregates', default=None, metavar='PATH', help='write the merged running sums as JSON to PATH')
+    for subparser in (split_parser, run_parser, merge_parser):
+        subparser.add_argument('--work-dir', required=True, help='work directory shared by all nodes, holds the plan and the partial results')
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent
+    start = time.time()
+    if args.command == 'split':
+        if args.manifest is not None:
+            manifest = read_manifest(args.manifest)
+        else:
+            file_path = str((base_path / 'replays').resolve())
+            manifest = list_replayfiles({SkillLevel.PRO: file_path + '/pro', SkillLevel.HIGH: file_path + '/high', SkillLevel.MIDDLE: file_path + '/middle', SkillLevel.LOW: file_path + '/low'})
+        plan = create_plan(manifest, args.shards, BucketConfig(args.intervals, args.slot), args.metrics)
+        write_plan(plan, args.work_dir)
+        print(f'Split {len(manifest)} replay files into {args.shards} shards: {", ".join(str(len(shard)) for shard in plan["shards"])} replay files')
+    elif args.command == 'run':
+        cache = AnalysisCache(str((base_path / 'cache').resolve()), ANALYZER_VERSION) if not args.no_cache else None
+        trace_directory = str((base_path / 'traces').resolve()) if args.traces else None
+        run_shard(args.work_dir, args.shard, args.workers, cache, trace_directory)
+        print(f'Analysed shard {args.shard} in {time.time() - start} seconds')
+    else:
+        analyses = merge_partials(args.work_dir)
+        if args.save_aggregates is not None:
+            analyses.save_aggregates(args.save_aggregates)
+        graph_directory = str((base_path / 'output' / 'graphs').resolve()) if args.headless else None
+        analyses.output_results(graph_directory, args.graph_formats)
@@ -0,0 +1,256 @@
+import os
+import sqlite3
+import typing
+import argparse
+from pathlib import Path
+from units import MainType, FilterType, BuildingType, SkillLevel
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS replays (
+    id INTEGER PRIMARY KEY,
+    replayfile TEXT NOT NULL UNIQUE,
+    skill_level TEXT NOT NULL,
+    map_dimensions INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    gameduration INTEGER NOT NULL,
+    analyzer_version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS replays_skill_level_map_dimensions ON replays (skill_level, map_dimensions);
+CREATE TABLE IF NOT EXISTS players (
+    replay_id INTEGER NOT NULL REFERENCES replays (id) ON DELETE CASCADE,
+    player INTEGER NOT NULL,
+    eapm REAL NOT NULL,
+    starting_x REAL,
+    starting_y REAL,
+    action_move_x REAL,
+    action_move_y REAL,
+    action_unit_x REAL,
+    action_unit_y REAL,
+    PRIMARY KEY (replay_id, player)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS states (
+    replay_id INTEGER NOT NULL REFERENCES replays (id) ON DELETE CASCADE,
+    player INTEGER NOT NULL,
+    interval INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    eco_units INTEGER NOT NULL,
+    mil_units INTEGER NOT NULL,
+    eco_buildings INTEGER NOT NULL,
+    mil_buildings INTEGER NOT NULL,
+    walls INTEGER NOT NULL,
+    action_move_x REAL NOT NULL,
+    action_move_y REAL NOT NULL,
+    action_move_count INTEGER NOT NULL,
+    action_unit_x REAL NOT NULL,
+    action_unit_y REAL NOT NULL,
+    action_unit_count INTEGER NOT NULL,
+    PRIMARY KEY (replay_id, player, interval, timestamp)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS states_interval_timestamp ON states (interval, timestamp);
+CREATE TABLE IF NOT EXISTS technologies (
+    replay_id INTEGER NOT NULL REFERENCES replays (id) ON DELETE CASCADE,
+    player INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    technology TEXT NOT NULL,
+    seconds INTEGER NOT NULL,
+    PRIMARY KEY (replay_id, player, technology)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS technologies_technology ON technologies (technology, replay_id);
+CREATE TABLE IF NOT EXISTS units (
+    replay_id INTEGER NOT NULL REFERENCES replays (id) ON DELETE CASCADE,
+    player INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (replay_id, player, unit)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS units_unit ON units (unit, replay_id);
+'''
+
+STATE_COLUMNS = ('eco_units', 'mil_units', 'eco_buildings', 'mil_buildings', 'walls', 'action_move_x', 'action_move_y', 'action_move_count', 'action_unit_x', 'action_unit_y', 'action_unit_count')
+
+class ResultsStore():
+    """This class holds the results of analysed replays in a SQLite database, i.e. one row per replay, per player, per player state (bucket), per researched technology and per queued unit type. Queries filter by skill level and map dimensions via indexes, i.e. nothing has to be parsed again.
+    Analyses are written in batches, a transaction is only committed every `batch_size` replays or on flush(self).
+    """
+    def __init__(self, path: str, batch_size: int = 64, read_only: bool = False):
+        """Constructor
+
+        Args:
+            path (str): path of the database file, created if it does not exist unless the store is opened read-only
+            batch_size (int, optional): number of replays written per transaction. Defaults to 64.
+            read_only (bool, optional): whether the existing database file is only queried, writing raises sqlite3.OperationalError. Defaults to False.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = 0
+        if read_only:
+            self.connection = sqlite3.connect(f'{Path(path).resolve().as_uri()}?mode=ro', uri=True)
+            return
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(SCHEMA)
+
+    def add_analysis(self, analysis: any, skill_level: str, analyzer_version: int) -> None:
+        """Adds the results of an analysis, previous results of the same replay file are replaced
+
+        Args:
+            analysis (any): the finished analysis.Analysis, its players may be player.PlayerResult
+            skill_level (str): skill level of the replay, see units.SkillLevel
+            analyzer_version (int): version of the analyzer, see analysis.ANALYZER_VERSION
+        """
+        connection = self.connection # the transaction is opened implicitly by the first statement
+        connection.execute('DELETE FROM replays WHERE replayfile = ?', (analysis.replayfile,))
+        replay_id = connection.execute('INSERT INTO replays (replayfile, skill_level, map_dimensions, time, gameduration, analyzer_version) VALUES (?, ?, ?, ?, ?, ?)', (analysis.replayfile, skill_level, analysis.get_map_dimensions(), analysis.time, analysis.get_gameduration(), analyzer_version)).lastrowid
+
+        players = []
+        states = []
+        technologies = []
+        units = []
+        for player_id, player in analysis.get_players().items():
+            starting_position = player.get_starting_position()
+            action_move_coordinates = player.get_average_move_action_coordinates()
+            action_unit_coordinates = player.get_average_unit_coordinates()
+            players.append((replay_id, player_id, player.get_average_eAPM(), *starting_position, *action_move_coordinates, *action_unit_coordinates))
+            for interval in analysis.buckets.intervals:
+                for timestamp, state in player.get_state_for_timestamps(interval).items():
+                    states.append((replay_id, player_id, interval, timestamp, *[value for values in state.values() for value in values.values()]))
+            for type, technologies_for_type in player.get_technologies().items():
+                technologies.extend((replay_id, player_id, str(type), str(technology), seconds) for technology, seconds in technologies_for_type.items())
+            for type, units_for_type in player.get_units().items():
+                units.extend((replay_id, player_id, str(type), str(unit), count) for unit, count in units_for_type.items())
+        connection.executemany('INSERT INTO players VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', players)
+        connection.executemany(f'INSERT INTO states VALUES ({", ".join(["?"] * (4 + len(STATE_COLUMNS)))})', states)
+        connection.executemany('INSERT INTO technologies VALUES (?, ?, ?, ?, ?)', technologies)
+        connection.executemany('INSERT INTO units VALUES (?, ?, ?, ?, ?)', units)
+
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Commits the pending analyses
+        """
+        if self.pending > 0:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+    def contains(self, replayfile: str, analyzer_version: int) -> bool:
+        return self.connection.execute('SELECT 1 FROM replays WHERE replayfile = ? AND analyzer_version = ?', (replayfile, analyzer_version)).fetchone() is not None
+
+    def get_replay_filter(self, skill_level: typing.Optional[str] = None, map_dimensions: typing.Optional[int] = None) -> typing.Tuple[str, list[any]]:
+        """Creates the condition selecting the replays of a skill level and map dimensions
+
+        Args:
+            skill_level (typing.Optional[str], optional): skill level, see units.SkillLevel. Defaults to None, i.e. all skill levels.
+            map_dimensions (typing.Optional[int], optional): map dimensions, e.g. 120. Defaults to None, i.e. all maps.
+
+        Returns:
+            typing.Tuple[str, list[any]]: the SQL condition on table replays and its parameters
+        """
+        conditions = ['1']
+        parameters = []
+        if skill_level is not None:
+            conditions.append('replays.skill_level = ?')
+            parameters.append(skill_level)
+        if map_dimensions is not None:
+            conditions.append('replays.map_dimensions = ?')
+            parameters.append(map_dimensions)
+        return ' AND '.join(conditions), parameters
+
+    def get_average_technology_time(self, technology: str, skill_level: typing.Optional[str] = None, map_dimensions: typing.Optional[int] = None) -> typing.Optional[float]:
+        """Gets the average research time of a technology based on the players who have researched it, e.g. the average Feudal Age time of pro players on maps of size 120
+
+        Args:
+            technology (str): the technology, e.g. 'Feudal Age', see units.Technology
+            skill_level (typing.Optional[str], optional): skill level. Defaults to None, i.e. all skill levels.
+            map_dimensions (typing.Optional[int], optional): map dimensions. Defaults to None, i.e. all maps.
+
+        Returns:
+            typing.Optional[float]: the average research time in seconds or None if nobody has researched the technology
+        """
+        condition, parameters = self.get_replay_filter(skill_level, map_dimensions)
+        return self.connection.execute(f'SELECT AVG(technologies.seconds) FROM technologies JOIN replays ON replays.id = technologies.replay_id WHERE technologies.technology = ? AND {condition}', [str(technology), *parameters]).fetchone()[0]
+
+    def get_average_unit_count(self, unit: str, skill_level: typing.Optional[str] = None, map_dimensions: typing.Optional[int] = None) -> float:
+        """Gets the average number of queued units of a type per player, players who have not queued the unit count as 0
+
+        Args:
+            unit (str): the unit, e.g. 'Knight', see units.Unit
+            skill_level (typing.Optional[str], optional): skill level. Defaults to None, i.e. all skill levels.
+            map_dimensions (typing.Optional[int], optional): map dimensions. Defaults to None, i.e. all maps.
+
+        Returns:
+            float: the average number of queued units
+        """
+        condition, parameters = self.get_replay_filter(skill_level, map_dimensions)
+        total = self.connection.execute(f'SELECT COALESCE(SUM(units.count), 0) FROM units JOIN replays ON replays.id = units.replay_id WHERE units.unit = ? AND {condition}', [str(unit), *parameters]).fetchone()[0]
+        player_count = self.get_player_count(skill_level, map_dimensions)
+        return total / player_count if player_count > 0 else 0
+
+    def get_player_count(self, skill_level: typing.Optional[str] = None, map_dimensions: typing.Optional[int] = None) -> int:
+        condition, parameters = self.get_replay_filter(skill_level, map_dimensions)
+        return self.connection.execute(f'SELECT COUNT(*) FROM players JOIN replays ON replays.id = players.replay_id WHERE {condition}', parameters).fetchone()[0]
+
+    def get_average_timestamp_results(self, interval: int, skill_level: typing.Optional[str] = None, map_dimensions: typing.Optional[int] = None) -> typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]:
+        """Gets the average units and buildings as well as the average action coordinates for all timestamps based on the number of players who reached the timestamp. The action counts are not averaged, see aggregation.SkillLevelAggregate.
+
+        Args:
+            interval (int): bucket interval of the states, see bucketing.BucketConfig
+            skill_level (typing.Optional[str], optional): skill level. Defaults to None, i.e. all skill levels.
+            map_dimensions (typing.Optional[int], optional): map dimensions. Defaults to None, i.e. all maps.
+
+        Returns:
+            typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, float]]]: the average results for all timestamps, see visualisation.AoEGraphs
+        """
+        condition, parameters = self.get_replay_filter(skill_level, map_dimensions)
+        aggregates = ', '.join(f'SUM(states.{column})' if column.endswith('_count') else f'AVG(states.{column})' for column in STATE_COLUMNS)
+        rows = self.connection.execute(f'SELECT states.timestamp, {aggregates} FROM states JOIN replays ON replays.id = states.replay_id WHERE states.interval = ? AND {condition} GROUP BY states.timestamp ORDER BY states.timestamp', [interval, *parameters])
+        timestamp_results = {}
+        for timestamp, eco_units, mil_units, eco_buildings, mil_buildings, walls, move_x, move_y, move_count, unit_x, unit_y, unit_count in rows:
+            timestamp_results[timestamp] = {
+                FilterType.UNITS: {MainType.ECO: eco_units, MainType.MIL: mil_units},
+                FilterType.BUILDINGS: {MainType.ECO: eco_buildings, MainType.MIL: mil_buildings, BuildingType.WALL: walls},
+                FilterType.ACTION_MOVE_COORDINATES: {'x': move_x, 'y': move_y, 'count': move_count},
+                FilterType.ACTION_UNIT_COORDINATES: {'x': unit_x, 'y': unit_y, 'count': unit_count}}
+        return timestamp_results
+
+    def query(self, sql: str, parameters: typing.Sequence[any] = ()) -> list[tuple]:
+        """Runs a query, which can only read if the store has been opened read-only, e.g. SELECT replays.map_dimensions, AVG(players.eapm) FROM players JOIN replays ON replays.id = players.replay_id GROUP BY replays.map_dimensions
+
+        Args:
+            sql (str): the query
+            parameters (typing.Sequence[any], optional): parameters of the query. Defaults to ().
+
+        Returns:
+            list[tuple]: all rows
+        """
+        return self.connection.execute(sql, parameters).fetchall()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Queries the results store written by analysis.py --store.')
+    parser.add_argument('database', help='path of the database file')
+    parser.add_argument('--skill-level', choices=[SkillLevel.PRO, SkillLevel.HIGH, SkillLevel.MIDDLE, SkillLevel.LOW, SkillLevel.CUSTOM_A, SkillLevel.CUSTOM_B], default=None, help='only consider replays of this skill level')
+    parser.add_argument('--map-dimensions', type=int, default=None, help='only consider replays with these map dimensions, e.g. 120')
+    parser.add_argument('--technology', default=None, help='print the average research time of a technology, e.g. "Feudal Age"')
+    parser.add_argument('--unit', default=None, help='print the average number of queued units of a type, e.g. Knight')
+    parser.add_argument('--sql', default=None, help='run a query and print its rows, the store is opened read-only')
+    args = parser.parse_args()
+    if not os.path.isfile(args.database):
+        parser.error(f'{args.database} does not exist, write a results store with analysis.py --store')
+
+    store = ResultsStore(args.database, read_only=True) # queries cannot modify the store
+    print(f'Players: {store.get_player_count(args.skill_level, args.map_dimensions)}')
+    if args.technology is not None:
+        seconds = store.get_average_technology_time(args.technology, args.skill_level, args.map_dimensions)
+        print(f'Average {args.technology} time: ' + (f'{seconds / 60:.2f} min' if seconds is not None else 'not researched'))
+    if args.unit is not None:
+        print(f'Average {args.unit} count: {store.get_average_unit_count(args.unit, args.skill_level, args.map_dimensions):.2f}')
+    if args.sql is not None:
+        [print(row) for row in store.query(args.sql)]
+    store.close()
@@ -0,0 +1,174 @@
+import json
+import typing
+import collections.abc
+import pytest
+import numpy as np
+from pathlib import Path
+from mgz import fast
+import analysis
+from analysis import Analysis, MultipleAnalyses, ANALYZER_VERSION, ID_KEYS, register_action_handler, skip_action
+from aggregation import read_aggregates, write_aggregates
+from cache import AnalysisCache
+from metrics import MOVEMENT_ACTIONS
+from player import ActionStore, BucketStates, StateView, STATE_METRICS
+from units import FilterType, MainType
+
+REPLAY_PATH = Path(__file__).parent.parent / 'replays'
+# the shortest bundled replay of every skill level
+REPLAYFILES = {
+    'pro': [str(REPLAY_PATH / 'pro' / 'AgeIIDE_Replay_159903381.aoe2record')],
+    'high': [str(REPLAY_PATH / 'high' / 'AgeIIDE_Replay_159691370.aoe2record')],
+    'middle': [str(REPLAY_PATH / 'middle' / 'AgeIIDE_Replay_163867353.aoe2record')],
+    'low': [str(REPLAY_PATH / 'low' / 'AgeIIDE_Replay_162893190.aoe2record')],
+}
+# averages of REPLAYFILES computed by the baseline commit 128c2f8, i.e. before the analysis was optimised
+BASELINE_PATH = Path(__file__).parent / 'data' / 'baseline_averages.json'
+
+def canon(results: any) -> any:
+    if isinstance(results, collections.abc.Mapping):
+        return {str(key): canon(value) for key, value in results.items()}
+    if isinstance(results, (list, tuple)):
+        return [canon(value) for value in results]
+    return results
+
+def get_averages(analyses: MultipleAnalyses) -> typing.Dict[str, any]:
+    """Gets the averages of a run in the layout of the baseline file, the additional metrics did not exist in the baseline
+    """
+    average_results = {key: value for key, value in analyses.average_results.items() if key != FilterType.METRICS}
+    return {'average_timestamp_results': canon(analyses.average_timestamp_results), 'average_results': canon(average_results)}
+
+def assert_close(actual: any, expected: any, path: str = '') -> None:
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and actual.keys() == expected.keys(), path
+        for key in expected:
+            assert_close(actual[key], expected[key], f'{path}/{key}')
+    elif isinstance(expected, list):
+        assert isinstance(actual, list) and len(actual) == len(expected), path
+        for index, (actual_value, expected_value) in enumerate(zip(actual, expected)):
+            assert_close(actual_value, expected_value, f'{path}/{index}')
+    elif isinstance(expected, float) or isinstance(actual, float):
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-9), path
+    else:
+        assert actual == expected, path
+
+def run_analyses(replayfiles: typing.Dict[str, list[str]] = REPLAYFILES, metrics: typing.Optional[list[str]] = None, **kwargs) -> MultipleAnalyses:
+    analyses = MultipleAnalyses({}, metrics=metrics)
+    analyses.set_replayfiles(replayfiles)
+    analyses.start_analyses(**kwargs)
+    return analyses
+
+@pytest.fixture(scope='module')
+def baseline() -> typing.Dict[str, any]:
+    with open(BASELINE_PATH, encoding='UTF8') as file:
+        return json.load(file)
+
+@pytest.mark.parametrize('options', [{}, {'streaming': True}, {'workers': 2}, {'workers': 2, 'streaming': True}])
+def test_averages_match_baseline(baseline, options):
+    assert_close(get_averages(run_analyses(**options)), baseline)
+
+def test_trace_averages_match_baseline(baseline, tmp_path, capsys):
+    trace_directory = tmp_path / 'traces'
+    assert_close(get_averages(run_analyses(trace_directory=str(trace_directory))), baseline)
+    assert len(list(trace_directory.glob('*.trace'))) == len(REPLAYFILES)
+    capsys.readouterr()
+    assert_close(get_averages(run_analyses(trace_directory=str(trace_directory), streaming=True)), baseline)
+    assert capsys.readouterr().out.count('Loaded trace') == len(REPLAYFILES)
+
+def test_cached_averages_match_baseline(baseline, tmp_path):
+    cache = AnalysisCache(str(tmp_path / 'cache'), ANALYZER_VERSION)
+    assert_close(get_averages(run_analyses(workers=2, cache=cache)), baseline)
+    assert_close(get_averages(run_analyses(cache=cache)), baseline)
+
+def test_dispatch_table_does_not_depend_on_metrics():
+    all_metrics = Analysis(REPLAYFILES['pro'][0])
+    villagers = Analysis(REPLAYFILES['pro'][0], metrics=['villagers'])
+    assert set(all_metrics.action_handlers) == set(ID_KEYS) | set(MOVEMENT_ACTIONS)
+    assert villagers.get_dispatched_actions() == all_metrics.get_dispatched_actions()
+    assert villagers.action_handlers[fast.Action.DE_QUEUE] == villagers.process_queue
+    assert villagers.action_handlers[fast.Action.BUILD] is skip_action
+    assert villagers.action_handlers[fast.Action.MOVE] is skip_action
+    assert all_metrics.action_handlers[fast.Action.MOVE] == all_metrics.process_movement
+
+class MovementRecordingAnalysis(Analysis):
+    def process_movement(self, player_id: int, details: typing.Dict[str, any], action: fast.Action) -> None:
+        self.movements.append((action, player_id, details.get('player_id'), details.get('x'), details.get('y')))
+        super().process_movement(player_id, details, action)
+
+def test_traces_pass_the_same_details_as_replays(tmp_path, capsys):
+    movements = []
+    for _ in range(2): # parses the replay file and writes the trace file, then loads the trace file
+        recording_analysis = MovementRecordingAnalysis(REPLAYFILES['high'][0])
+        recording_analysis.movements = []
+        recording_analysis.start(str(tmp_path))
+        movements.append(recording_analysis.movements)
+    assert capsys.readouterr().out.count('Loaded trace') == 1
+    assert len(movements[0]) > 0 and movements[0] == movements[1]
+    # movement actions are attributed to the player of the last queue, research or build action
+    assert any(player_id != action_player_id for _, player_id, action_player_id, _, _ in movements[0])
+
+def test_registered_handlers_run_after_builtin_handlers(monkeypatch, tmp_path):
+    monkeypatch.setattr(analysis, 'ACTION_HANDLERS', {})
+    calls = []
+    def count_queue(queue_analysis: Analysis, player_id: int, details: typing.Dict[str, any], action: fast.Action) -> None:
+        calls.append((player_id, details['player_id'], sum(queue_analysis.find_player(player_id).get_all_unit_count().values())))
+    register_action_handler(fast.Action.DE_QUEUE, count_queue)
+    handler_analysis = Analysis(REPLAYFILES['pro'][0])
+    handler_analysis.start(str(tmp_path))
+    assert len(calls) > 0
+    assert all(player_id == action_player_id for player_id, action_player_id, _ in calls)
+    assert calls[0][2] > 0 # the built-in handler has already counted the queued unit
+    assert not handler_analysis.traceable and list(tmp_path.iterdir()) == [] # trace files do not hold all details the handler may read
+
+def test_saved_aggregates_round_trip(tmp_path):
+    analyses = run_analyses(streaming=True)
+    analyses.save_aggregates(str(tmp_path / 'saved.json'))
+    aggregates, metadata = read_aggregates(str(tmp_path / 'saved.json'))
+    assert metadata['metrics'] == analyses.metrics and metadata['replayfiles'] == REPLAYFILES
+    write_aggregates(str(tmp_path / 'resaved.json'), aggregates, metadata)
+    with open(tmp_path / 'saved.json', encoding='UTF8') as saved, open(tmp_path / 'resaved.json', encoding='UTF8') as resaved:
+        assert json.load(saved) == json.load(resaved)
+
+def test_merged_aggregates_match_a_single_run(tmp_path):
+    cache = AnalysisCache(str(tmp_path / 'cache'), ANALYZER_VERSION)
+    replayfiles = {'pro': REPLAYFILES['pro'] + REPLAYFILES['high'], 'low': REPLAYFILES['low']}
+    single_run = run_analyses(replayfiles, cache=cache, streaming=True)
+    run_analyses({'pro': REPLAYFILES['pro'], 'low': REPLAYFILES['low']}, cache=cache, streaming=True).save_aggregates(str(tmp_path / 'first.json'))
+    run_analyses({'pro': REPLAYFILES['high']}, cache=cache).save_aggregates(str(tmp_path / 'second.json'))
+    merged = MultipleAnalyses({})
+    merged.set_replayfiles({'pro': [], 'low': []})
+    merged.merge_aggregates(str(tmp_path / 'first.json'))
+    merged.merge_aggregates(str(tmp_path / 'second.json'))
+    assert_close(get_averages(merged), get_averages(single_run))
+    with pytest.raises(ValueError):
+        MultipleAnalyses({}, metrics=['villagers']).merge_aggregates(str(tmp_path / 'first.json'))
+
+def test_action_store_layout():
+    store = ActionStore(capacity=2)
+    for index in range(5):
+        store.append(index + 0.5, 2.0 * index, 60 * index, fast.Action.MOVE.value)
+    columns = store.get_columns()
+    assert len(store) == 5
+    assert columns['x'].tolist() == [0.5, 1.5, 2.5, 3.5, 4.5]
+    assert columns['y'].tolist() == [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert columns['timestamp'].tolist() == [0, 60, 120, 180, 240]
+    assert columns['action'].tolist() == [fast.Action.MOVE.value] * 5
+    assert (columns['x'].dtype, columns['timestamp'].dtype, columns['action'].dtype) == (np.float64, np.int32, np.int16)
+
+def test_bucket_states_layout():
+    states = BucketStates()
+    values = [float(index) for index in range(len(STATE_METRICS))]
+    states.set_state(120, values)
+    states.set_state(240, values)
+    states.set_state(240, [value + 0.5 for value in values]) # replaces the state of the last timestamp
+    timestamps, matrix = states.get_matrix()
+    assert timestamps == [120, 240]
+    assert matrix.shape == (2, len(STATE_METRICS))
+    assert matrix[1].tolist() == [value + 0.5 for value in values]
+    row = states.get_row(0)
+    assert row[FilterType.UNITS][MainType.ECO] == 0 and isinstance(row[FilterType.UNITS][MainType.ECO], int)
+    x = STATE_METRICS.index((FilterType.ACTION_MOVE_COORDINATES, 'x'))
+    assert row[FilterType.ACTION_MOVE_COORDINATES]['x'] == float(x)
+    view = StateView(states)
+    assert list(view) == [120, 240] and view[240] == states.get_row(1)
+    with pytest.raises(KeyError):
+        view[360]
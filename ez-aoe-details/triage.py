@@ -0,0 +1,147 @@
+import io
+import os
+import json
+import time
+import struct
+import typing
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from mgz import fast
+from mgz.fast import header
+from mgz.summary.objects import TC_IDS
+from units import SkillLevel
+
+POSTGAME_MAGIC = b'\xce\xa4\x59\xb1\x05\xdb\x7b\x43' # trailer of DE replay files containing a postgame block
+POSTGAME_TAIL_SIZE = 4096
+
+def scan_replay(replayfile: str) -> typing.Dict[str, any]:
+    """Scans the metadata of a replay file without decoding the game actions. Only the header is parsed, the game duration is read from the postgame block at the end of DE replay files. If there is no postgame block, the body is skipped operation by operation and only the SYNC time increments are summed up.
+
+    Args:
+        replayfile (str): path of the replay file
+
+    Returns:
+        typing.Dict[str, any]: the replay metadata, e.g. {'replayfile': 'replays/pro/AgeIIDE_Replay_165870265.aoe2record', 'file_size': 2436392, 'map_dimensions': 120, 'players': [{'id': 1, 'name': 'Hera', 'civilization_id': 5, 'starting_position': [50.0, 98.0]}], 'duration': 1129094, 'duration_source': 'postgame'}
+    """
+    file_size = os.path.getsize(replayfile)
+    with open(replayfile, 'rb') as data:
+        _header = header.parse(data)
+        players = []
+        for player in _header['players']:
+            if player['number'] == 0: # gaia
+                continue
+            starting_position = None # nomad
+            for obj in player['objects']:
+                if obj['object_id'] in TC_IDS:
+                    starting_position = [obj['position']['x'], obj['position']['y']]
+                    break
+            players.append({'id': player['number'], 'name': player['name'].decode('UTF8', errors='replace'), 'civilization_id': player['civilization_id'], 'starting_position': starting_position})
+
+        duration = read_postgame_duration(data, file_size)
+        duration_source = 'postgame'
+        if duration is None:
+            fast.meta(data)
+            duration = sum_sync_increments(data, file_size)
+            duration_source = 'sync'
+
+    return {'replayfile': replayfile, 'file_size': file_size, 'map_dimensions': _header['map']['dimension'], 'players': players, 'duration': duration, 'duration_source': duration_source}
+
+def read_postgame_duration(data: typing.BinaryIO, file_size: int) -> typing.Optional[int]:
+    """Reads the world time (in ms) from the postgame block at the end of a DE replay file, the read position is restored afterwards
+
+    Args:
+        data (typing.BinaryIO): the replay file
+        file_size (int): size of the replay file
+
+    Returns:
+        typing.Optional[int]: the game duration in ms or None if there is no postgame block
+    """
+    position = data.tell()
+    data.seek(max(position, file_size - POSTGAME_TAIL_SIZE))
+    tail = data.read()
+    data.seek(position)
+    if not tail.endswith(POSTGAME_MAGIC):
+        return None
+    try:
+        return fast.postgame(io.BytesIO(tail)).get('world_time')
+    except (struct.error, RuntimeError, ValueError):
+        # block is longer than the tail or unknown
+        return None
+
+def sum_sync_increments(data: typing.BinaryIO, eof: int) -> int:
+    """Skips through the body of a replay file and sums up all SYNC time increments. Actions are skipped by their length without decoding them.
+
+    Args:
+        data (typing.BinaryIO): the replay file positioned at the first operation
+        eof (int): size of the replay file
+
+    Returns:
+        int: the game duration in ms
+    """
+    duration = 0
+    while data.tell() < eof:
+        operation_id, = struct.unpack('<I', data.read(4))
+        if operation_id == fast.Operation.ACTION.value:
+            length, = struct.unpack('<I', data.read(4))
+            data.seek(length + 4, 1) # action bytes + sequence
+        elif operation_id == fast.Operation.SYNC.value:
+            duration += fast.sync(data)[0]
+        elif operation_id == fast.Operation.VIEWLOCK.value:
+            data.seek(12, 1)
+        elif operation_id == fast.Operation.CHAT.value:
+            fast.chat(data)
+        elif operation_id == fast.Operation.POSTGAME.value:
+            break
+        else:
+            data.seek(-4, 1)
+            fast.operation(data)
+    return duration
+
+def create_manifest(paths_to_segmented_replayfiles: typing.Dict[SkillLevel, str], workers: int = 1) -> list[typing.Dict[str, any]]:
+    """Scans all replay files of the given skill level directories, see scan_replay(replayfile)
+
+    Args:
+        paths_to_segmented_replayfiles (typing.Dict[SkillLevel, str]): directories of the replay files for each skill level
+        workers (int, optional): number of worker processes scanning the replay files. Defaults to 1.
+
+    Returns:
+        list[typing.Dict[str, any]]: the metadata of all replay files including their skill level, sorted by skill level and path
+    """
+    replayfiles = []
+    for type, path in paths_to_segmented_replayfiles.items():
+        with os.scandir(path) as entries:
+            replayfiles.extend((type, f'{path}/{entry.name}') for entry in sorted(entries, key=lambda entry: entry.name) if entry.is_file())
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            scans = list(executor.map(scan_replay, [replayfile for _, replayfile in replayfiles], chunksize=16))
+    else:
+        scans = [scan_replay(replayfile) for _, replayfile in replayfiles]
+
+    manifest = []
+    for (type, _), scan in zip(replayfiles, scans):
+        scan['skill_level'] = type
+        manifest.append(scan)
+    return manifest
+
+def write_manifest(manifest: list[typing.Dict[str, any]], filename: str) -> None:
+    with open(filename, 'w', encoding='UTF8') as file:
+        json.dump(manifest, file, indent=1)
+
+def read_manifest(filename: str) -> list[typing.Dict[str, any]]:
+    with open(filename, encoding='UTF8') as file:
+        return json.load(file)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Creates a manifest of the replay corpus (players, map dimensions, starting positions, duration, file size) by only reading the replay headers.')
+    parser.add_argument('--output', default='manifest.json', help='path of the manifest file')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes scanning the replay files')
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent
+    file_path = str((base_path / 'replays').resolve())
+    start = time.time()
+    manifest = create_manifest({SkillLevel.PRO: file_path + '/pro', SkillLevel.HIGH: file_path + '/high', SkillLevel.MIDDLE: file_path + '/middle', SkillLevel.LOW: file_path + '/low'}, args.workers)
+    write_manifest(manifest, args.output)
+    print(f'Scanned {len(manifest)} replay files in {time.time() - start} seconds')
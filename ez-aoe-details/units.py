@@ -1,3 +1,4 @@
+import typing
 from enum import Enum
 
 class Action(Enum):
@@ -182,6 +183,7 @@ class FilterType():
     GAMEDURATION = 'gameduration'
     ACTION_MOVE_COORDINATES = 'action_move_coordinates'
     ACTION_UNIT_COORDINATES = 'action_unit_coordinates'
+    METRICS = 'metrics' # additional metrics, see metrics.register_metric()
 class SkillLevel():
     PRO = 'pro' # ELO > 2200
     HIGH = 'high' # ELO > 1800
@@ -356,3 +358,29 @@ TECHNOLOGY_IDS = {
         631: Technology.ELITE_BATTLE_ELEPHANT,
     }
 }
+
+def create_counter_index(ids: typing.Dict[Action, typing.Dict[int, Action]]) -> typing.Tuple[list[typing.Tuple[Action, Action]], typing.Dict[int, int]]:
+    """Assigns a dense index to every distinct category and entry of a categorised id dict, e.g. UNIT_IDS, i.e. counts can be held in a flat array instead of nested dicts. The indices of a category are contiguous.
+
+    Args:
+        ids (typing.Dict[Action, typing.Dict[int, Action]]): ids categorised by type
+
+    Returns:
+        typing.Tuple[list[typing.Tuple[Action, Action]], typing.Dict[int, int]]: the category and entry of every index and the index of every id, e.g. ([(MainType.ECO, Unit.VILLAGER)], {83: 0}), the first category wins for duplicate ids
+    """
+    counters = []
+    counter_indices = {}
+    index = {}
+    for type, entries in ids.items():
+        for id, entry in entries.items():
+            if id in index:
+                continue
+            if (type, entry) not in counter_indices:
+                counter_indices[(type, entry)] = len(counters)
+                counters.append((type, entry))
+            index[id] = counter_indices[(type, entry)]
+    return counters, index
+
+UNIT_COUNTERS, UNIT_COUNTER_INDEX = create_counter_index(UNIT_IDS)
+BUILDING_COUNTERS, BUILDING_COUNTER_INDEX = create_counter_index(BUILDING_IDS)
+TECHNOLOGY_COUNTERS, TECHNOLOGY_COUNTER_INDEX = create_counter_index(TECHNOLOGY_IDS)
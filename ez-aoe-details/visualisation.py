@@ -1,115 +1,113 @@
-import math
+import os
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import typing
-from units import MainType, FilterType, SkillLevel, Technology, BuildingType
+from concurrent.futures import ProcessPoolExecutor
+from units import MainType, FilterType, SkillLevel, Technology
+from metrics import get_metrics
+
+CHART_LINE = 'line'
+CHART_LINE_TECHNOLOGIES = 'line_technologies'
+CHART_BAR = 'bar'
+LINESTYLES = ['-', '--', ':', '-.']
 
 class AoEGraphs():
     """This class handles the visualisation of analysis results. It relies on helper classes from units.* to not rely on hardcoded values.
     """
-    def __init__(self, average_timestamp_analysis_results: typing.Dict[SkillLevel, typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, int]]]], average_results: typing.Dict[FilterType, typing.Dict[SkillLevel, any]]):
+    def __init__(self, average_timestamp_analysis_results: typing.Dict[SkillLevel, typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, int]]]], average_results: typing.Dict[FilterType, typing.Dict[SkillLevel, any]], metrics: typing.Optional[typing.Sequence[str]] = None):
         """Constructor
 
         Args:
             average_timestamp_analysis_results (typing.Dict[SkillLevel, typing.Dict[int, typing.Dict[FilterType, typing.Dict[MainType, int]]]]): All the analysis results, example structure:
              {'low': {120: {'units': {Economy: 4.8, Military: 0.05}, 'buildings': {Economy: 0.1, Military: 0.05, Wall: 0.0}, 'action_move_coordinates': {'x': 17.178742296106446, 'y': 24.073642806206504, 'count': 564}, 'action_unit_coordinates': {'x': 0.0, 'y': 0.0, 'count': 0}}}}
             average_results (typing.Dict[FilterType, typing.Dict[SkillLevel, any]]): holds eAPM and average technology research times for all players, e.g. {'eapm': {'pro': 45.921025117599676, 'high': 44.40773592782665, 'middle': 29.72721939895853, 'low': 16.29198645698805}, 'technologies': {'pro': {Economy: {Loom: 367.25, Feudal Age: 463.6, Double Bit Axe: 639.8421052631579}}}
+            metrics (typing.Optional[typing.Sequence[str]], optional): names of the visualised metrics, see metrics.METRICS. Defaults to None, i.e. all metrics.
         """
         self.average_timestamp_analysis_results = average_timestamp_analysis_results
         self.average_results = average_results
+        self.metrics = get_metrics(metrics)
 
-    def output_results(self) -> None:
-        """Outputs all relevant graphs
+    def create_charts(self) -> list[typing.Dict[str, any]]:
+        """Prepares the data of the charts of all metrics, see metrics.Metric
+
+        Returns:
+            list[typing.Dict[str, any]]: the charts ordered by figure, e.g. {'name': 'walls_built', 'figure': 10, 'kind': CHART_LINE, 'title': 'Average Walls Built', 'values': {'pro': [0.0, 0.5]}, 'timestamps': [0.0, 2.0], 'colors': {'pro': 'blue'}}
         """
-        timestamps = []
-        vil_unit_values = {k: [] for k in self.average_timestamp_analysis_results}
-        eco_age_values = {k: {} for k in self.average_timestamp_analysis_results}
-        eco_technology_values = {k: {} for k in self.average_timestamp_analysis_results}
-
-        mil_unit_values = {k: [] for k in self.average_timestamp_analysis_results}
-        mil_technology_values = {k: {} for k in self.average_timestamp_analysis_results}
-
-        eco_building_values = {k: [] for k in self.average_timestamp_analysis_results}
-        mil_building_values = {k: [] for k in self.average_timestamp_analysis_results}
-        wall_values = {k: [] for k in self.average_timestamp_analysis_results}
-
-        action_coordinate_values = {k: [] for k in self.average_timestamp_analysis_results}
-        action_coordinate_unit_values = {k: [] for k in self.average_timestamp_analysis_results}
-        action_coordinate_unit_count_values = {k: [] for k in self.average_timestamp_analysis_results}
-
-        for type, values in self.average_timestamp_analysis_results.items():
-            # set relevant technologies
-            eco_age_values[type][Technology.FEUDAL_AGE] = self.average_results[FilterType.TECHNOLOGIES][type][MainType.ECO][Technology.FEUDAL_AGE] / 60
-            eco_age_values[type][Technology.CASTLE_AGE] = self.average_results[FilterType.TECHNOLOGIES][type][MainType.ECO][Technology.CASTLE_AGE] / 60
-            eco_age_values[type][Technology.IMPERIAL_AGE] = self.average_results[FilterType.TECHNOLOGIES][type][MainType.ECO][Technology.IMPERIAL_AGE] / 60
-
-            eco_technology_values[type][Technology.HAND_CART] = self.average_results[FilterType.TECHNOLOGIES][type][MainType.ECO][Technology.HAND_CART] / 60
-            eco_technology_values[type][Technology.WHEELBARROW] = self.average_results[FilterType.TECHNOLOGIES][type][MainType.ECO][Technology.WHEELBARROW] / 60
-            eco_technology_values[type][Technology.LOOM] = self.average_results[FilterType.TECHNOLOGIES][type][MainType.ECO][Technology.LOOM] / 60
-
-            mil_technology_values[type][Technology.FLETCHING] = self.average_results[FilterType.TECHNOLOGIES][type][MainType.MIL][Technology.FLETCHING] / 60
-            mil_technology_values[type][Technology.FORGING] = self.average_results[FilterType.TECHNOLOGIES][type][MainType.MIL][Technology.FORGING] / 60
-            mil_technology_values[type][Technology.BALLISTICS] = self.average_results[FilterType.TECHNOLOGIES][type][MainType.MIL][Technology.BALLISTICS] / 60
-
-            # set entries for timestamps
-            for timestamp, entries in values.items():
-                timestamps.append(timestamp / 60)
-                mil_building_values[type].append(entries[FilterType.BUILDINGS][MainType.MIL])
-                wall_values[type].append(entries[FilterType.BUILDINGS][BuildingType.WALL])
-                eco_building_values[type].append(entries[FilterType.BUILDINGS][MainType.ECO])
-
-                vil_unit_values[type].append(entries[FilterType.UNITS][MainType.ECO])
-                mil_unit_values[type].append(entries[FilterType.UNITS][MainType.MIL])
-
-                action_coordinate_values[type].append(math.sqrt(math.pow(entries[FilterType.ACTION_MOVE_COORDINATES]['x'], 2) + math.pow(entries[FilterType.ACTION_MOVE_COORDINATES]['y'], 2)))
-                action_coordinate_unit_values[type].append(math.sqrt(math.pow(entries[FilterType.ACTION_UNIT_COORDINATES]['x'], 2) + math.pow(entries[FilterType.ACTION_UNIT_COORDINATES]['y'], 2)))
-                action_coordinate_unit_count_values[type].append(entries[FilterType.ACTION_UNIT_COORDINATES]['count'])
-        timestamps_length = len(timestamps)
-
-        # fill up array with none for missing values
-        value_entries = [vil_unit_values, mil_building_values, eco_building_values, wall_values, mil_unit_values, action_coordinate_values, action_coordinate_unit_values, action_coordinate_unit_count_values]
-        for entry in value_entries:
-            for entries in entry.values():
-                entries.extend([None] * (timestamps_length - len(entries)))
+        timestamps = [timestamp / 60 for values in self.average_timestamp_analysis_results.values() for timestamp in values]
 
         type_colors = {SkillLevel.PRO: 'blue', SkillLevel.HIGH: 'orange', SkillLevel.MIDDLE: 'green', SkillLevel.LOW: 'red', SkillLevel.CUSTOM_A: 'cyan', SkillLevel.CUSTOM_B: 'brown'}
-        type_colors = {type : color for type, color, in type_colors.items() if type in vil_unit_values} # filter all skill level keys not part of the analysed data
-
-        # Average Villager Count + Age Technologies
-        self.generate_line_chart_with_technologies(vil_unit_values, timestamps, type_colors, eco_age_values, 1, 'Average Villager Count')
-        # Average Villager Count + Eco Technologies
-        self.generate_line_chart_with_technologies(vil_unit_values, timestamps, type_colors, eco_technology_values, 2, 'Average Villager Count')
-        # Average Military Count + Technologies
-        self.generate_line_chart_with_technologies(mil_unit_values, timestamps, type_colors, mil_technology_values, 3, 'Average Military Count')
-
-        # Average Mil Building Count
-        self.generate_line_chart(mil_building_values, timestamps, type_colors, 4, 'Average Military Buildings')
-        # Average Eco Building Count
-        self.generate_line_chart(eco_building_values, timestamps, type_colors, 5, 'Average Eco Buildings')
-
-        # Average eAPM
-        df = pd.DataFrame({'Average eAPM': self.average_results[FilterType.EAPM].values()}, index=self.average_results[FilterType.EAPM].keys())
-        ax = df.plot(kind='bar', legend=False)
-        index = 0
-        for bar in ax.patches:
-            bar.set_color(list(type_colors.values())[index])
-            index += 1
-        plt.ylabel('Average Count')
-        plt.title('Average eAPM Activity')
-        plt.figure(6)
+        type_colors = {type : color for type, color, in type_colors.items() if type in self.average_timestamp_analysis_results} # filter all skill level keys not part of the analysed data
+
+        charts = []
+        for metric in self.metrics:
+            if len(metric.charts) == 0:
+                continue
+            if len(metric.state) > 0:
+                values = {}
+                for type, values_for_type in self.average_timestamp_analysis_results.items():
+                    values[type] = [metric.get_value(entries) for entries in values_for_type.values()]
+                    values[type].extend([None] * (len(timestamps) - len(values[type]))) # fill up array with none for missing values
+            else:
+                values = self.average_results[metric.result] if metric.result is not None else self.average_results[FilterType.METRICS].get(metric.name, {})
+            for chart in metric.charts:
+                if len(metric.state) == 0:
+                    charts.append({'name': chart['name'], 'figure': chart['figure'], 'kind': CHART_BAR, 'title': chart['title'], 'values': values, 'colors': type_colors})
+                elif 'technologies' not in chart:
+                    charts.append({'name': chart['name'], 'figure': chart['figure'], 'kind': CHART_LINE, 'title': chart['title'], 'values': values, 'timestamps': timestamps, 'colors': type_colors})
+                else:
+                    # set relevant technologies
+                    main_type, relevant_technologies = chart['technologies']
+                    technology_values = {type: {} for type in self.average_timestamp_analysis_results}
+                    [self.set_technology_values(technology_values[type], self.average_results[FilterType.TECHNOLOGIES][type][main_type], relevant_technologies) for type in self.average_timestamp_analysis_results]
+                    charts.append({'name': chart['name'], 'figure': chart['figure'], 'kind': CHART_LINE_TECHNOLOGIES, 'title': chart['title'], 'values': values, 'timestamps': timestamps, 'colors': type_colors, 'technologies': technology_values})
+        return sorted(charts, key=lambda chart: chart['figure'])
+
+    def set_technology_values(self, values: typing.Dict[Technology, float], technologies: typing.Dict[Technology, float], relevant_technologies: list[Technology]) -> None:
+        """Sets the average research time in min of all relevant technologies, technologies nobody of the skill level has researched are left out
 
-        # Average Action from Starting Position
-        self.generate_line_chart(action_coordinate_values, timestamps, type_colors, 7, 'Distance of Moving Actions from Starting TC in Game')
-        self.generate_line_chart(action_coordinate_unit_values, timestamps, type_colors, 8, 'Distance of Attacking Actions from Starting TC in Game')
-        self.generate_line_chart(action_coordinate_unit_count_values, timestamps, type_colors, 9, 'Occurence of Attacking Actions in Game')
+        Args:
+            values (typing.Dict[Technology, float]): the technology values of a skill level
+            technologies (typing.Dict[Technology, float]): average research times in seconds
+            relevant_technologies (list[Technology]): the technologies to set
+        """
+        for technology in relevant_technologies:
+            if technology in technologies:
+                values[technology] = technologies[technology] / 60
 
-        # Average Wall Count
-        self.generate_line_chart(wall_values, timestamps, type_colors, 10, 'Average Walls Built')
+    def output_results(self) -> None:
+        """Outputs all relevant graphs
+        """
+        for chart in self.create_charts():
+            if chart['kind'] == CHART_LINE_TECHNOLOGIES:
+                self.generate_line_chart_with_technologies(chart['values'], chart['timestamps'], chart['colors'], chart['technologies'], chart['figure'], chart['title'])
+            elif chart['kind'] == CHART_LINE:
+                self.generate_line_chart(chart['values'], chart['timestamps'], chart['colors'], chart['figure'], chart['title'])
+            else:
+                self.generate_bar_chart(chart['values'], chart['colors'], chart['figure'], chart['title'])
 
         # Show all figures
         plt.show()
 
+    def save_results(self, directory: str, formats: typing.Sequence[str] = ('png',), workers: int = 1) -> None:
+        """Renders all relevant graphs without a display and writes them to files named after the charts, e.g. graphs/villagers_ages.png. The global pyplot state is not used.
+
+        Args:
+            directory (str): directory the files are written to
+            formats (typing.Sequence[str], optional): file formats, e.g. png or svg. Defaults to ('png',).
+            workers (int, optional): number of worker processes rendering the charts. Defaults to 1, i.e. all charts are rendered in the current process.
+        """
+        os.makedirs(directory, exist_ok=True)
+        charts = self.create_charts()
+        if workers > 1:
+            batches = [charts[index::workers] for index in range(workers)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(render_charts, batches, [directory] * workers, [formats] * workers))
+        else:
+            render_charts(charts, directory, formats)
+
     def generate_line_chart_with_technologies(self, values: typing.Dict[SkillLevel, list[float]], timestamps: list[int], colors: typing.Dict[str, str], technologies: typing.Dict[SkillLevel, typing.Dict[Technology, int]], figure_count: int, title: str, linestyles: list[str] = ['-', '--', ':', '-.']) -> None:
         """Generates a line chart with given technologies
 
@@ -166,3 +164,83 @@ class AoEGraphs():
         plt.ylabel(title)
         plt.title(title)
         plt.figure(figure_count)
+
+    def generate_bar_chart(self, values: typing.Dict[SkillLevel, float], colors: typing.Dict[str, str], figure_count: int, title: str) -> None:
+        """Generates a bar chart with one bar per skill level
+
+        Args:
+            values (typing.Dict[SkillLevel, float]): bar values categorised by skill level
+            colors (typing.Dict[str, str]): colors of the bars mapped by skill level
+            figure_count (int): the figure count
+            title (str): title of the figure
+        """
+        df = pd.DataFrame({title: values.values()}, index=values.keys())
+        ax = df.plot(kind='bar', legend=False)
+        index = 0
+        for bar in ax.patches:
+            bar.set_color(list(colors.values())[index])
+            index += 1
+        plt.ylabel('Average Count')
+        plt.title(title)
+        plt.figure(figure_count)
+
+class ChartRenderer():
+    """This class renders charts created by AoEGraphs.create_charts() on a single figure without a display. The figure and its axes are reused for every chart.
+    """
+    def __init__(self):
+        self.figure = Figure()
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.ax_twin = self.ax.twinx()
+
+    def render(self, chart: typing.Dict[str, any], filename: str) -> None:
+        """Renders a chart and writes it to a file
+
+        Args:
+            chart (typing.Dict[str, any]): the chart, see AoEGraphs.create_charts()
+            filename (str): the file name, its extension determines the format
+        """
+        self.ax.clear()
+        self.ax_twin.clear()
+        self.ax_twin.set_visible(chart['kind'] == CHART_LINE_TECHNOLOGIES)
+        self.ax_twin.yaxis.tick_right()
+        colors = chart['colors']
+        if chart['kind'] == CHART_BAR:
+            df = pd.DataFrame({chart['title']: chart['values'].values()}, index=chart['values'].keys())
+            df.plot(kind='bar', legend=False, ax=self.ax)
+            for bar, color in zip(self.ax.patches, colors.values()):
+                bar.set_color(color)
+            self.ax.set_ylabel('Average Count')
+        else:
+            df = pd.DataFrame(chart['values'], index=chart['timestamps'])
+            df.plot(color=list(colors.values()), ax=self.ax)
+            self.ax.set_xlabel('Timestamp (in min)')
+            self.ax.set_ylabel(chart['title'])
+        self.ax.set_title(chart['title'])
+
+        if chart['kind'] == CHART_LINE_TECHNOLOGIES:
+            values = chart['values']
+            max_key = max(values, key = lambda k: list(filter(None.__ne__, k)))
+            max_value_avg = max(list(filter(None.__ne__, values[max_key]))) / 1.5
+            technology_list = []
+            for type, technologies in chart['technologies'].items():
+                for index, (technology, timestamp) in enumerate(technologies.items()):
+                    self.ax.vlines(x=timestamp, ymin=0, ymax=max_value_avg, colors=colors[type], ls=LINESTYLES[index % len(LINESTYLES)], lw=1, label='')
+                    if technology not in technology_list:
+                        technology_list.append(technology)
+            lines = [Line2D([0,1],[0,1], linestyle=linestyle, color='0.8') for linestyle in LINESTYLES]
+            self.ax_twin.legend(lines, technology_list, loc=4)
+        self.figure.savefig(filename)
+
+def render_charts(charts: list[typing.Dict[str, any]], directory: str, formats: typing.Sequence[str]) -> None:
+    """Renders charts with a single ChartRenderer, used as entry point for worker processes
+
+    Args:
+        charts (list[typing.Dict[str, any]]): the charts, see AoEGraphs.create_charts()
+        directory (str): directory the files are written to
+        formats (typing.Sequence[str]): file formats, e.g. png or svg
+    """
+    renderer = ChartRenderer()
+    for chart in charts:
+        for format in formats:
+            renderer.render(chart, f'{directory}/{chart["name"]}.{format}')
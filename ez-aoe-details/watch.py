@@ -0,0 +1,174 @@
+import os
+import time
+import typing
+import argparse
+import matplotlib
+matplotlib.use('Agg') # graphs are refreshed without a display
+from pathlib import Path
+from analysis import Analysis, MultipleAnalyses, ANALYZER_VERSION
+from bucketing import BucketConfig
+from cache import AnalysisCache
+from store import ResultsStore
+from report import BulkReportWriter, REPORT_FORMATS
+from units import SkillLevel
+
+class ReplayWatcher():
+    """This class watches the skill level directories of a MultipleAnalyses instance and ingests newly arrived replay files. The directories are polled, a new file is only parsed once its size has not changed between two polls, i.e. it has been copied completely. A file which could not be analysed is retried once its size or modification time changes, e.g. after it has been copied again.
+    New replays are folded into the running sums of their skill level (streaming mode), so ingesting a replay takes time proportional to that replay. Afterwards the averages of the affected skill levels, the graphs and the reports are refreshed.
+    """
+    def __init__(self, analyses: MultipleAnalyses, paths_to_segmented_replayfiles: typing.Dict[SkillLevel, str], workers: int = 1, cache: typing.Optional[AnalysisCache] = None, trace_directory: typing.Optional[str] = None, store: typing.Optional[ResultsStore] = None, report_writer: typing.Optional[BulkReportWriter] = None, graph_directory: typing.Optional[str] = None, graph_formats: typing.Sequence[str] = ('png',)):
+        """Constructor
+
+        Args:
+            analyses (MultipleAnalyses): the analyses of the replay files already present, see start(self)
+            paths_to_segmented_replayfiles (typing.Dict[SkillLevel, str]): the watched directories for each skill level
+            workers (int, optional): number of worker processes parsing the replay files. Defaults to 1.
+            cache (typing.Optional[AnalysisCache], optional): cache of analysis results. Defaults to None.
+            trace_directory (typing.Optional[str], optional): directory holding the trace files. Defaults to None.
+            store (typing.Optional[ResultsStore], optional): results store new replays are written to. Defaults to None.
+            report_writer (typing.Optional[BulkReportWriter], optional): writer of the consolidated reports of new replays. Defaults to None, i.e. a CSV report folder is created per new replay.
+            graph_directory (typing.Optional[str], optional): directory the refreshed graphs are saved to. Defaults to None, i.e. graphs are not refreshed.
+            graph_formats (typing.Sequence[str], optional): file formats of the graphs. Defaults to ('png',).
+        """
+        self.analyses = analyses
+        self.paths_to_segmented_replayfiles = paths_to_segmented_replayfiles
+        self.workers = workers
+        self.cache = cache
+        self.trace_directory = trace_directory
+        self.store = store
+        self.report_writer = report_writer
+        self.graph_directory = graph_directory
+        self.graph_formats = graph_formats
+        self.known_replayfiles = {analysis.replayfile for analysis in analyses.combined_analyses}
+        self.failed_replayfiles = {} # size and modification time of the replay files which could not be analysed
+        self.pending_sizes = {}
+
+    def start(self) -> None:
+        """Analyses the replay files already present in streaming mode and saves the graphs. No reports are written for them.
+        """
+        self.analyses.start_analyses(self.workers, self.cache, self.trace_directory, True, store=self.store)
+        for replayfile in self.analyses.failures:
+            self.add_failed_replayfile(replayfile)
+        self.refresh_graphs()
+
+    def add_failed_replayfile(self, replayfile: str) -> None:
+        """Records a replay file which could not be analysed, it is polled again once it has changed
+
+        Args:
+            replayfile (str): path of the replay file
+        """
+        self.known_replayfiles.discard(replayfile)
+        try:
+            stat = os.stat(replayfile)
+        except FileNotFoundError:
+            return
+        self.failed_replayfiles[replayfile] = (stat.st_size, stat.st_mtime_ns)
+
+    def poll(self) -> list[typing.Tuple[SkillLevel, str]]:
+        """Scans the watched directories for replay files which have not been analysed yet
+
+        Returns:
+            list[typing.Tuple[SkillLevel, str]]: the skill level and path of all new or changed failed replay files whose size has not changed since the previous poll
+        """
+        new_replayfiles = []
+        sizes = {}
+        for type, path in self.paths_to_segmented_replayfiles.items():
+            with os.scandir(path) as entries:
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    replayfile = f'{path}/{entry.name}'
+                    if replayfile in self.known_replayfiles or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    if self.failed_replayfiles.get(replayfile) == (stat.st_size, stat.st_mtime_ns):
+                        continue
+                    size = stat.st_size
+                    if size > 0 and self.pending_sizes.get(replayfile) == size:
+                        new_replayfiles.append((type, replayfile))
+                    else:
+                        sizes[replayfile] = size
+        self.pending_sizes = sizes
+        return new_replayfiles
+
+    def ingest(self, new_replayfiles: list[typing.Tuple[SkillLevel, str]]) -> None:
+        """Analyses new replay files, adds them to the running sums of their skill level and refreshes the averages, graphs and reports
+
+        Args:
+            new_replayfiles (list[typing.Tuple[SkillLevel, str]]): skill level and path of the new replay files, see poll(self)
+        """
+        start = time.time()
+        types = {}
+        for type, replayfile in new_replayfiles:
+            analysis = Analysis(replayfile, self.analyses.buckets, self.analyses.metrics)
+            self.analyses.analyses[type].append(analysis)
+            self.analyses.combined_analyses.append(analysis)
+            types[analysis] = type
+            # a failed replay file is retried
+            self.failed_replayfiles.pop(replayfile, None)
+            self.analyses.failures.pop(replayfile, None)
+
+        for analysis in self.analyses.run_analyses(list(types), self.workers, self.cache, self.trace_directory):
+            self.known_replayfiles.add(analysis.replayfile) # only replay files which have been analysed are not polled again
+            if self.report_writer is None:
+                analysis.create_analysis_report()
+            self.analyses.add_analysis(types[analysis], analysis, self.store, self.report_writer)
+        for analysis in types:
+            if analysis.replayfile in self.analyses.failures:
+                self.add_failed_replayfile(analysis.replayfile)
+        if self.store is not None:
+            self.store.flush()
+        if self.report_writer is not None:
+            self.report_writer.flush()
+
+        self.analyses.update_average_results(set(types.values()))
+        self.refresh_graphs()
+        print(f'Ingested {len(new_replayfiles)} replay files in {time.time() - start} seconds')
+
+    def refresh_graphs(self) -> None:
+        if self.graph_directory is not None:
+            self.analyses.output_results(self.graph_directory, self.graph_formats)
+
+    def run(self, poll_interval: float = 5) -> None:
+        """Analyses the replay files already present and ingests new replay files until interrupted
+
+        Args:
+            poll_interval (float, optional): seconds between two polls. Defaults to 5.
+        """
+        self.start()
+        print(f'Watching {", ".join(self.paths_to_segmented_replayfiles.values())} for new replay files')
+        try:
+            while True:
+                new_replayfiles = self.poll()
+                if len(new_replayfiles) > 0:
+                    self.ingest(new_replayfiles)
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.store is not None:
+                self.store.close()
+            if self.report_writer is not None:
+                self.report_writer.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Watches the skill level directories for new replay files and ingests them incrementally, i.e. only new replay files are parsed and the averages, graphs and reports are refreshed.')
+    parser.add_argument('--poll-interval', type=float, default=5, help='seconds between two scans of the skill level directories')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes parsing the replay files')
+    parser.add_argument('--no-cache', action='store_true', help='parse all replay files without using the analysis cache')
+    parser.add_argument('--traces', action='store_true', help='write and analyse trace files, see analysis.py --traces')
+    parser.add_argument('--intervals', type=int, nargs='+', default=[120], help='bucket intervals in seconds the player states are calculated for')
+    parser.add_argument('--slot', type=int, default=60, help='resolution of the recorded action timestamps in seconds')
+    parser.add_argument('--store', default=None, metavar='PATH', help='write the results of all replay files to a SQLite results store at PATH')
+    parser.add_argument('--bulk-report', action='store_true', help='append the reports of new replay files to the consolidated files in output/bulk instead of one CSV folder per replay')
+    parser.add_argument('--report-format', choices=REPORT_FORMATS, default='csv', help='file format of the consolidated reports')
+    parser.add_argument('--graph-formats', nargs='+', default=['png'], help='file formats of the graphs refreshed in output/graphs')
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent
+    file_path = str((base_path / 'replays').resolve())
+    paths = {SkillLevel.PRO: file_path + '/pro', SkillLevel.HIGH: file_path + '/high', SkillLevel.MIDDLE: file_path + '/middle', SkillLevel.LOW: file_path + '/low'}
+    cache = AnalysisCache(str((base_path / 'cache').resolve()), ANALYZER_VERSION) if not args.no_cache else None
+    trace_directory = str((base_path / 'traces').resolve()) if args.traces else None
+    store = ResultsStore(args.store) if args.store is not None else None
+    report_writer = BulkReportWriter(str((base_path / 'output' / 'bulk').resolve()), args.report_format) if args.bulk_report else None
+    watcher = ReplayWatcher(MultipleAnalyses(paths, BucketConfig(args.intervals, args.slot)), paths, args.workers, cache, trace_directory, store, report_writer, str((base_path / 'output' / 'graphs').resolve()), args.graph_formats)
+    watcher.run(args.poll_interval)